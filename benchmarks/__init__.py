@@ -0,0 +1 @@
+"""nornir_ansible benchmarks"""
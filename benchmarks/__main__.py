@@ -0,0 +1,6 @@
+"""nornir_ansible benchmarks entrypoint"""
+
+from benchmarks.run import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""benchmarks.generate"""
+
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import ruamel.yaml
+
+YAML = ruamel.yaml.YAML(typ="safe")
+YAML.default_flow_style = False
+
+
+def _random_vars(rng: random.Random, count: int, prefix: str) -> Dict[str, Any]:
+    """
+    Return `count` realistic looking vars
+
+    Arguments:
+        rng: random generator
+        count: number of vars to generate
+        prefix: prefix of the var names
+
+    """
+    result: Dict[str, Any] = {}
+    for i in range(count):
+        kind = i % 4
+        if kind == 0:
+            result[f"{prefix}_str_{i}"] = f"value-{rng.randint(0, 1_000_000)}"
+        elif kind == 1:
+            result[f"{prefix}_int_{i}"] = rng.randint(0, 65535)
+        elif kind == 2:
+            result[f"{prefix}_list_{i}"] = [f"10.{rng.randint(0, 255)}.0.{n}" for n in range(4)]
+        else:
+            result[f"{prefix}_dict_{i}"] = {"enabled": True, "timeout": rng.randint(1, 60)}
+    return result
+
+
+def _build_groups(depth: int, fanout: int) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Build a group tree, return children by group and the leaf groups
+
+    Arguments:
+        depth: number of group levels below "all"
+        fanout: number of children of every non leaf group
+
+    """
+    children: Dict[str, List[str]] = {"all": []}
+    level = ["all"]
+    for _ in range(depth):
+        next_level = []
+        for parent in level:
+            for i in range(fanout):
+                name = f"g{i}" if parent == "all" else f"{parent}_{i}"
+                children[parent].append(name)
+                children[name] = []
+                next_level.append(name)
+        level = next_level
+    return children, level
+
+
+def generate_inventory(  # pylint: disable=too-many-arguments,too-many-locals
+    path: str,
+    *,
+    hosts: int = 1000,
+    depth: int = 2,
+    fanout: int = 4,
+    shared_groups: int = 2,
+    host_vars_ratio: float = 0.5,
+    group_vars_ratio: float = 1.0,
+    vars_per_file: int = 10,
+    vars_layout: str = "file",
+    inventory_format: str = "yaml",
+    seed: int = 0,
+) -> str:
+    """
+    Generate a synthetic Ansible inventory, return the path of its hosts file
+
+    Hosts are spread over the leaf groups of a `depth` deep tree of groups with `fanout` children
+    each. Every leaf group additionally has `shared_groups` "platform" groups as children (a
+    group shared by many parents, like "ios" or "core" in real inventories), each of them holding
+    a slice of all hosts.
+
+    Arguments:
+        path: directory to generate the inventory in
+        hosts: number of hosts
+        depth: number of group levels below "all"
+        fanout: number of children of every non leaf group
+        shared_groups: number of groups that are children of every leaf group
+        host_vars_ratio: fraction of hosts having host_vars
+        group_vars_ratio: fraction of groups having group_vars
+        vars_per_file: number of vars in every vars file
+        vars_layout: "file" for `group_vars/<group>.yml`, "dir" for `group_vars/<group>/*.yml`
+        inventory_format: "yaml" or "ini"
+        seed: random seed, the same arguments and seed always generate the same inventory
+
+    """
+    if vars_layout not in ("file", "dir"):
+        raise ValueError(f"unknown vars_layout {vars_layout!r}")
+    if inventory_format not in ("yaml", "ini"):
+        raise ValueError(f"unknown inventory_format {inventory_format!r}")
+
+    rng = random.Random(seed)
+    root = Path(path)
+    root.mkdir(parents=True, exist_ok=True)
+
+    children, leaves = _build_groups(depth, fanout)
+    shared = [f"platform{i}" for i in range(shared_groups)]
+    host_names = [f"host{i:06d}" for i in range(hosts)]
+    leaf_hosts: Dict[str, List[str]] = {leaf: [] for leaf in leaves}
+    shared_hosts: Dict[str, List[str]] = {group: [] for group in shared}
+    for i, host in enumerate(host_names):
+        leaf_hosts[leaves[i % len(leaves)]].append(host)
+        if shared:
+            shared_hosts[shared[i % len(shared)]].append(host)
+
+    host_data = {
+        host: {"ansible_host": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"}
+        for i, host in enumerate(host_names)
+    }
+    if inventory_format == "yaml":
+        _write_yaml(root, children, leaf_hosts, shared_hosts, host_data)
+    else:
+        _write_ini(root, children, leaf_hosts, shared_hosts, host_data)
+
+    groups = [group for group in children if group != "all"] + shared
+    for group in ["all"] + groups:
+        if rng.random() < group_vars_ratio:
+            _write_vars(root / "group_vars", group, rng, vars_per_file, vars_layout)
+    for host in host_names:
+        if rng.random() < host_vars_ratio:
+            _write_vars(root / "host_vars", host, rng, vars_per_file, vars_layout)
+
+    return str(root / "hosts")
+
+
+def _write_vars(
+    vars_dir: Path, element: str, rng: random.Random, count: int, vars_layout: str
+) -> None:
+    """
+    Write the vars file(s) of a group/host
+
+    Arguments:
+        vars_dir: group_vars or host_vars directory
+        element: name of the group/host
+        rng: random generator
+        count: number of vars to write
+        vars_layout: "file" or "dir"
+
+    """
+    data = _random_vars(rng, count, element)
+    if vars_layout == "file":
+        vars_dir.mkdir(exist_ok=True)
+        with open(vars_dir / f"{element}.yml", "w", encoding="utf-8") as f:
+            YAML.dump(data, f)
+        return
+
+    element_dir = vars_dir / element
+    element_dir.mkdir(parents=True, exist_ok=True)
+    items = list(data.items())
+    half = len(items) // 2
+    for name, part in (("main.yml", items[:half]), ("extra.yml", items[half:])):
+        with open(element_dir / name, "w", encoding="utf-8") as f:
+            YAML.dump(dict(part), f)
+
+
+def _write_yaml(
+    root: Path,
+    children: Dict[str, List[str]],
+    leaf_hosts: Dict[str, List[str]],
+    shared_hosts: Dict[str, List[str]],
+    host_data: Dict[str, Dict[str, Any]],
+) -> None:
+    """Write a YAML hosts file"""
+
+    def _group(name: str) -> Dict[str, Any]:
+        group: Dict[str, Any] = {}
+        if children[name]:
+            group["children"] = {child: _group(child) for child in children[name]}
+        else:
+            group["hosts"] = {host: host_data[host] for host in leaf_hosts[name]}
+            if shared_hosts:
+                group["children"] = {shared: None for shared in shared_hosts}
+        return group
+
+    inventory = _group("all")
+    inventory.setdefault("children", {}).update(
+        {shared: {"hosts": dict.fromkeys(hosts)} for shared, hosts in shared_hosts.items()}
+    )
+    with open(root / "hosts", "w", encoding="utf-8") as f:
+        YAML.dump({"all": inventory}, f)
+
+
+def _write_ini(
+    root: Path,
+    children: Dict[str, List[str]],
+    leaf_hosts: Dict[str, List[str]],
+    shared_hosts: Dict[str, List[str]],
+    host_data: Dict[str, Dict[str, Any]],
+) -> None:
+    """Write an INI hosts file"""
+    with open(root / "hosts", "w", encoding="utf-8") as f:
+        for group, hosts in leaf_hosts.items():
+            f.write(f"[{group}]\n")
+            for host in hosts:
+                host_vars = " ".join(f"{k}={v}" for k, v in host_data[host].items())
+                f.write(f"{host} {host_vars}\n")
+            if shared_hosts:
+                f.write(f"\n[{group}:children]\n")
+                f.writelines(f"{shared}\n" for shared in shared_hosts)
+            f.write("\n")
+        for group, hosts in shared_hosts.items():
+            f.write(f"[{group}]\n")
+            f.writelines(f"{host}\n" for host in hosts)
+            f.write("\n")
+        for group, group_children in children.items():
+            if group == "all" or not group_children:
+                continue
+            f.write(f"[{group}:children]\n")
+            f.writelines(f"{child}\n" for child in group_children)
+            f.write("\n")
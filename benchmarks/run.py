@@ -0,0 +1,334 @@
+"""benchmarks.run"""
+
+import argparse
+import gc
+import inspect
+import json
+import multiprocessing
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+from benchmarks.generate import generate_inventory
+from nornir_ansible.plugins.inventory import ansible
+
+# name -> generate_inventory arguments
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "small-yaml-file": {"hosts": 1000, "inventory_format": "yaml", "vars_layout": "file"},
+    "small-ini-file": {"hosts": 1000, "inventory_format": "ini", "vars_layout": "file"},
+    "small-yaml-dir": {"hosts": 1000, "inventory_format": "yaml", "vars_layout": "dir"},
+    "medium-yaml-file": {"hosts": 10000, "depth": 3, "inventory_format": "yaml"},
+    "medium-ini-file": {"hosts": 10000, "depth": 3, "inventory_format": "ini"},
+    "deep-yaml-file": {"hosts": 2000, "depth": 5, "fanout": 3, "shared_groups": 8},
+    "large-yaml-file": {"hosts": 50000, "depth": 3, "fanout": 6, "host_vars_ratio": 0.2},
+    "huge-yaml-file": {"hosts": 100000, "depth": 3, "fanout": 6, "host_vars_ratio": 0.1},
+    "medium-yaml-file-compact": {"hosts": 10000, "depth": 3, "inventory_format": "yaml"},
+}
+# name -> AnsibleInventory options of the scenario, over the options of the run
+SCENARIO_OPTIONS: Dict[str, Dict[str, Any]] = {"medium-yaml-file-compact": {"compact": True}}
+DEFAULT_SCENARIOS = [
+    "small-yaml-file",
+    "small-ini-file",
+    "small-yaml-dir",
+    "medium-yaml-file",
+    "medium-yaml-file-compact",
+]
+# memory metrics compared between a "<name>-compact" scenario and "<name>"
+COMPACT_METRICS = ["alloc_peak_bytes", "alloc_retained_bytes", "alloc_plugin_retained_bytes"]
+
+
+def _timed(func: Callable[[], Any]) -> Dict[str, Any]:
+    """
+    Run `func`, return its result with its wall and cpu time
+
+    Arguments:
+        func: callable to time
+
+    """
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = func()
+    return {
+        "result": result,
+        "wall": time.perf_counter() - wall,
+        "cpu": time.process_time() - cpu,
+    }
+
+
+def _run_phases(hostsfile: str, options: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """
+    Time the phases of loading an inventory
+
+    Arguments:
+        hostsfile: hosts file of the inventory
+        options: AnsibleInventory options
+
+    """
+    phases: Dict[str, Dict[str, float]] = {}
+
+    # the parser only takes parsing options, `AnsibleInventory` options such as `compact` are not
+    parser_options = inspect.signature(ansible.AnsibleParser).parameters
+    hosts_file = _timed(
+        lambda: ansible.get_parser(
+            hostsfile, **{key: value for key, value in options.items() if key in parser_options}
+        )
+    )
+    parse = _timed(hosts_file["result"].parse)
+    inventory = _timed(lambda: ansible.AnsibleInventory(hostsfile=hostsfile, **options))
+    load = _timed(inventory["result"].load)
+
+    for name, timing in (
+        ("hosts_file", hosts_file),
+        ("parse", parse),
+        ("init", inventory),
+        ("load", load),
+    ):
+        phases[name] = {"wall": timing["wall"], "cpu": timing["cpu"]}
+    return phases
+
+
+def _max_rss() -> int:
+    """Return the peak RSS of the current process in bytes"""
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, macos bytes
+    return int(max_rss if sys.platform == "darwin" else max_rss * 1024)
+
+
+def run_scenario(hostsfile: str, options: Dict[str, Any], repeat: int) -> Dict[str, Any]:
+    """
+    Benchmark loading an inventory, meant to run in a fresh process so peak RSS is meaningful
+
+    Arguments:
+        hostsfile: hosts file of the inventory
+        options: AnsibleInventory options
+        repeat: number of timed runs, the fastest one is reported along with the median
+
+    """
+    baseline_rss = _max_rss()
+    runs = []
+    for _ in range(repeat):
+        gc.collect()
+        runs.append(_run_phases(hostsfile, options))
+    peak_rss = _max_rss()
+
+    # breakdown of the load by the plugin's own instrumentation, untimed by the runs above
+    instrumented = ansible.AnsibleInventory(hostsfile=hostsfile, **{**options, "stats": True})
+    instrumented.load()
+    load_stats = instrumented.stats.dict()
+    del instrumented
+
+    gc.collect()
+    tracemalloc.start()
+    ansible_inventory = ansible.AnsibleInventory(hostsfile=hostsfile, **options)
+    inventory = ansible_inventory.load()
+    # kept alive i.e. to reload/watch the inventory, the plugin holds the parsed records
+    plugin_retained, _ = tracemalloc.get_traced_memory()
+    del ansible_inventory
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    blocks = sum(stat.count for stat in tracemalloc.take_snapshot().statistics("filename"))
+    tracemalloc.stop()
+
+    phases = {}
+    for phase in runs[0]:
+        walls = [run[phase]["wall"] for run in runs]
+        cpus = [run[phase]["cpu"] for run in runs]
+        phases[phase] = {
+            "wall_min": min(walls),
+            "wall_median": statistics.median(walls),
+            "cpu_min": min(cpus),
+        }
+    return {
+        "hosts": len(inventory.hosts),
+        "groups": len(inventory.groups),
+        "phases": phases,
+        "stats": {"phases": load_stats["phases"], "counters": load_stats["counters"]},
+        "peak_rss_bytes": peak_rss,
+        "baseline_rss_bytes": baseline_rss,
+        "alloc_peak_bytes": peak,
+        "alloc_retained_bytes": current,
+        "alloc_retained_blocks": blocks,
+        "alloc_plugin_retained_bytes": plugin_retained,
+    }
+
+
+def _git_revision() -> Optional[str]:
+    """Return the current git revision, if any"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+    scenarios: List[str], repeat: int = 3, options: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Generate and benchmark the given scenarios, return machine readable results
+
+    Arguments:
+        scenarios: names of SCENARIOS to run
+        repeat: number of timed runs per scenario
+        options: AnsibleInventory options to benchmark with
+
+    """
+    options = options or {}
+    results: Dict[str, Any] = {
+        "revision": _git_revision(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "scenarios": {},
+    }
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in scenarios:
+            params = SCENARIOS[name]
+            scenario_options = {**options, **SCENARIO_OPTIONS.get(name, {})}
+            hostsfile = generate_inventory(f"{tmp_dir}/{name}", **params)
+            with context.Pool(1) as pool:
+                result = pool.apply(run_scenario, (hostsfile, scenario_options, repeat))
+            results["scenarios"][name] = {"params": params, "options": scenario_options, **result}
+            print(_format_scenario(name, result), file=sys.stderr)
+    results["compact"] = compare_compact(results)
+    for name, metrics in results["compact"].items():
+        changes = " ".join(f"{metric}={change:+.1f}%" for metric, change in metrics.items())
+        print(f"{name} vs {name[: -len('-compact')]}: {changes}", file=sys.stderr)
+    return results
+
+
+def compare_compact(results: Dict[str, Any]) -> Dict[str, Dict[str, float]]:
+    """
+    Return the memory change of each "<name>-compact" scenario over the "<name>" one, in percent
+
+    Arguments:
+        results: results of `run`
+
+    """
+    scenarios = results["scenarios"]
+    changes = {}
+    for name, result in scenarios.items():
+        base = scenarios.get(name[: -len("-compact")]) if name.endswith("-compact") else None
+        if base is None:
+            continue
+        changes[name] = {
+            metric: (result[metric] - base[metric]) / base[metric] * 100 if base[metric] else 0.0
+            for metric in COMPACT_METRICS
+        }
+    return changes
+
+
+def _format_scenario(name: str, result: Dict[str, Any]) -> str:
+    """Return a human readable summary of a scenario result"""
+    phases = " ".join(f"{k}={v['wall_min']:.3f}s" for k, v in result["phases"].items())
+    stats = " ".join(
+        f"{k}={v['wall']:.3f}s/{v['cpu']:.3f}s" for k, v in result["stats"]["phases"].items()
+    )
+    return (
+        f"{name}: hosts={result['hosts']} {phases} "
+        f"rss={result['peak_rss_bytes'] / 2**20:.1f}MiB "
+        f"alloc_peak={result['alloc_peak_bytes'] / 2**20:.1f}MiB "
+        f"plugin_retained={result['alloc_plugin_retained_bytes'] / 2**20:.1f}MiB\n"
+        f"  stats (wall/cpu): {stats}"
+    )
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """
+    Compare two results, return a line per scenario/metric with the relative change
+
+    Arguments:
+        baseline: results to compare against
+        current: new results
+
+    """
+    lines = []
+    for name, result in current["scenarios"].items():
+        if name not in baseline["scenarios"]:
+            continue
+        base = baseline["scenarios"][name]
+        metrics = {
+            f"{p}.wall_min": (base["phases"][p]["wall_min"], r["wall_min"])
+            for p, r in result["phases"].items()
+            if p in base["phases"]
+        }
+        for metric in (
+            "peak_rss_bytes",
+            "alloc_peak_bytes",
+            "alloc_retained_bytes",
+            "alloc_plugin_retained_bytes",
+        ):
+            if metric in base:
+                metrics[metric] = (base[metric], result[metric])
+        for metric, (old, new) in metrics.items():
+            change = (new - old) / old * 100 if old else 0.0
+            lines.append(f"{name} {metric}: {old:.4g} -> {new:.4g} ({change:+.1f}%)")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Benchmarks command line entrypoint
+
+    Arguments:
+        argv: command line arguments
+
+    """
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub_parsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub_parsers.add_parser("run", help="run benchmark scenarios")
+    run_parser.add_argument(
+        "scenarios", nargs="*", help=f"scenarios to run, one of {', '.join(SCENARIOS)}"
+    )
+    run_parser.add_argument("--repeat", type=int, default=3)
+    run_parser.add_argument("--output", "-o", help="write json results to this file")
+    run_parser.add_argument(
+        "--option",
+        action="append",
+        default=[],
+        metavar="KEY=JSON",
+        help="AnsibleInventory option, i.e. --option vars_executor='\"thread\"'",
+    )
+
+    compare_parser = sub_parsers.add_parser("compare", help="compare two json results")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    generate_parser = sub_parsers.add_parser("generate", help="generate a scenario inventory")
+    generate_parser.add_argument("scenario", choices=SCENARIOS)
+    generate_parser.add_argument("path")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        unknown = set(args.scenarios) - set(SCENARIOS)
+        if unknown:
+            parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+        options = {}
+        for option in args.option:
+            key, _, value = option.partition("=")
+            options[key] = json.loads(value)
+        results = run(args.scenarios or DEFAULT_SCENARIOS, repeat=args.repeat, options=options)
+        output = json.dumps(results, indent=2)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                f.write(output)
+        else:
+            print(output)
+    elif args.command == "compare":
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+        print("\n".join(compare(baseline, current)))
+    else:
+        print(generate_inventory(args.path, **SCENARIOS[args.scenario]))
@@ -0,0 +1,6 @@
+"""nornir_ansible command line entrypoint"""
+
+from nornir_ansible.cli import main
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""nornir_ansible.cli"""
+
+import argparse
+import logging
+import sys
+from typing import List, Optional
+
+from nornir.core.exceptions import NornirNoValidInventoryError
+
+from nornir_ansible.plugins.inventory.ansible import AnsibleInventory
+from nornir_ansible.plugins.inventory.export import EXPORT_FORMATS
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    nornir_ansible command line entrypoint
+
+    Arguments:
+        argv: command line arguments
+
+    """
+    parser = argparse.ArgumentParser(prog="nornir-ansible")
+    sub_parsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = sub_parsers.add_parser(
+        "export", help="compile an Ansible inventory into a SimpleInventory, json or pickle file"
+    )
+    export_parser.add_argument("hostsfile", nargs="+", help="Ansible inventory files/directories")
+    export_parser.add_argument(
+        "--output", "-o", required=True, help="file to write, or directory for --format simple"
+    )
+    export_parser.add_argument(
+        "--format",
+        choices=EXPORT_FORMATS,
+        help="output format, guessed from the --output extension if not provided: "
+        + ", ".join(f"{name} ({description})" for name, description in EXPORT_FORMATS.items()),
+    )
+    export_parser.add_argument("--limit", help="Ansible limit expression, i.e. 'site1:&ios'")
+    export_parser.add_argument(
+        "--flatten-vars", action="store_true", help="give hosts the merged vars of their groups"
+    )
+    export_parser.add_argument("--cache-dir", help="directory to cache the parsed inventory in")
+    export_parser.add_argument(
+        "--vault-password-file", help="file holding the password of vault encrypted vars"
+    )
+    export_parser.add_argument("--verbose", "-v", action="store_true", help="log debug messages")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING)
+    if args.command == "export":
+        hostsfile = args.hostsfile[0] if len(args.hostsfile) == 1 else args.hostsfile
+        try:
+            inventory = AnsibleInventory(
+                hostsfile=hostsfile,
+                cache_dir=args.cache_dir,
+                limit=args.limit,
+                flatten_vars=args.flatten_vars,
+                vault_password_file=args.vault_password_file,
+            )
+            inventory.export(args.output, args.format)
+        except (NornirNoValidInventoryError, OSError, ValueError) as exc:
+            print(f"nornir-ansible: {exc}", file=sys.stderr)
+            sys.exit(1)
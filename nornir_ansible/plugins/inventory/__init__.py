@@ -1,5 +1,19 @@
 """nornir_ansible.inventory"""
 
 from nornir_ansible.plugins.inventory.ansible import AnsibleInventory
+from nornir_ansible.plugins.inventory.export import CompiledInventory
+from nornir_ansible.plugins.inventory.registry import (
+    INVENTORY_REGISTRY,
+    InventoryRegistry,
+    SharedAnsibleInventory,
+)
+from nornir_ansible.plugins.inventory.vars_files import register_vars_decoder
 
-__all__ = ("AnsibleInventory",)
+__all__ = (
+    "AnsibleInventory",
+    "CompiledInventory",
+    "INVENTORY_REGISTRY",
+    "InventoryRegistry",
+    "SharedAnsibleInventory",
+    "register_vars_decoder",
+)
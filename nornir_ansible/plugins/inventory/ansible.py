@@ -1,592 +1,709 @@
 """nornir_ansible.inventory.ansible"""
 
-import configparser as cp
+import asyncio
+import functools
+import importlib
 import logging
-from collections import defaultdict
-from io import TextIOWrapper
-from pathlib import Path
-from typing import (
-    Any,
-    DefaultDict,
-    Dict,
-    List,
-    MutableMapping,
-    Optional,
-    Tuple,
-    Type,
-    TypedDict,
-    Union,
-    cast,
+import threading
+import warnings
+from concurrent.futures import Executor
+from typing import Any, Callable, Container, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from nornir.core.inventory import Host, Inventory
+
+from nornir_ansible.plugins.inventory.cache import get_fingerprint
+from nornir_ansible.plugins.inventory.elements import (  # pylint: disable=unused-import
+    BuiltHosts,
+    InventoryBuilder,
+    LazyHost,
+    expand_host_ranges,
 )
-
-import ruamel.yaml
-from nornir.core.exceptions import NornirNoValidInventoryError
-from nornir.core.inventory import (
-    ConnectionOptions,
-    Defaults,
-    Group,
-    Host,
-    HostOrGroup,
-    Inventory,
-    ParentGroups,
+from nornir_ansible.plugins.inventory.export import export_inventory, to_plain
+from nornir_ansible.plugins.inventory.flatten import VarsFlattener
+from nornir_ansible.plugins.inventory.models import (
+    Fingerprint,
+    GroupLayers,
+    InventoryTuple,
+    ProgressCallback,
+)
+from nornir_ansible.plugins.inventory.parser import (  # pylint: disable=unused-import
+    AnsibleParser,
+    get_parser,
+)
+from nornir_ansible.plugins.inventory.sources import (
+    InventorySource,
+    get_inventory_files,
+    merge_element,
+    merge_inventories,
+    parse_sources,
+)
+from nornir_ansible.plugins.inventory.stats import LoadStats
+from nornir_ansible.plugins.inventory.templating import TemplateRenderer, strip_templates
+from nornir_ansible.plugins.inventory.vault import Vault
+from nornir_ansible.plugins.inventory.watch import (
+    InventoryDiff,
+    InventoryWatcher,
+    diff_elements,
+    patch_inventory,
 )
-from ruamel.yaml.composer import ComposerError
-from ruamel.yaml.scanner import ScannerError
 
-VARS_FILENAME_EXTENSIONS = ["", ".ini", ".yml", ".yaml"]
-RESERVED_FIELDS = ("hostname", "port", "username", "password", "platform", "connection_options")
-YAML = ruamel.yaml.YAML(typ="safe")
+# max threads reading vars files in `AnsibleInventory.acreate` unless `max_workers` is set
+ASYNC_MAX_WORKERS = 8
+# hosts built between two progress reports of `AnsibleInventory.load`
+PROGRESS_HOSTS_STEP = 1000
 LOG = logging.getLogger(__name__)
+# names that moved out of this module -> (module, name), still importable from it with a
+# DeprecationWarning; "YAML" is the YAML instance of the current thread, see `get_yaml`
+MOVED_NAMES = {
+    "INIParser": ("parser", "INIParser"),
+    "YAMLParser": ("parser", "YAMLParser"),
+    "RESERVED_FIELDS": ("parser", "RESERVED_FIELDS"),
+    "VARS_FILENAME_EXTENSIONS": ("vars_files", "VARS_FILENAME_EXTENSIONS"),
+    "YAML": ("vars_files", "get_yaml"),
+    "_load_yaml": ("vars_files", "_load_vars"),
+    "VarsDict": ("models", "VarsDict"),
+    "AnsibleHostsDict": ("models", "AnsibleHostsDict"),
+    "AnsibleGroupDataDict": ("models", "AnsibleGroupDataDict"),
+    "AnsibleGroupsDict": ("models", "AnsibleGroupsDict"),
+    "_get_connection_options": ("elements", "_get_connection_options"),
+    "_get_defaults": ("elements", "_get_defaults"),
+    "_get_inventory_element": ("elements", "_get_inventory_element"),
+}
+
+
+def __getattr__(name: str) -> Any:
+    """Resolve the deprecated names of `MOVED_NAMES`"""
+    if name not in MOVED_NAMES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attr = MOVED_NAMES[name]
+    module = f"nornir_ansible.plugins.inventory.{module_name}"
+    replacement = f"{module}.{attr}()" if name == "YAML" else f"{module}.{attr}"
+    warnings.warn(
+        f"{__name__}.{name} is deprecated, use {replacement} instead",
+        DeprecationWarning,
+        stacklevel=2,
+    )
+    value = getattr(importlib.import_module(module), attr)
+    return value() if name == "YAML" else value
 
-VarsDict = Dict[str, Any]
-AnsibleHostsDict = Dict[str, Optional[VarsDict]]
-
-AnsibleGroupDataDict = TypedDict(
-    "AnsibleGroupDataDict",
-    {"children": Dict[str, Any], "vars": VarsDict, "hosts": AnsibleHostsDict},
-    total=False,
-)  # bug: https://github.com/python/mypy/issues/5357
 
-AnsibleGroupsDict = Dict[str, AnsibleGroupDataDict]
+def parse(
+    hostsfile: Union[str, List[str]],
+    cache_dir: Optional[str] = None,
+    vars_executor: Optional[Union[str, Executor]] = None,
+    max_workers: Optional[int] = None,
+    limit: Optional[Union[str, List[str]]] = None,
+) -> InventoryTuple:
+    """
+    Parse provided inventory file
 
+    Arguments:
+        hostsfile: string of hostsfile to parse, or list of inventory files and/or directories
+        cache_dir: optional directory to cache the parsed inventory in, see `InventoryCache`
+        vars_executor: optional executor to load vars files concurrently with, see `AnsibleParser`
+        max_workers: max workers of the vars_executor
+        limit: optional Ansible limit expression to only parse matching hosts
 
-class AnsibleParser:
-    def __init__(self, hostsfile: str) -> None:
-        """
-        Parse Ansible inventories for use with Nornir
+    """
+    options = {"vars_executor": vars_executor, "max_workers": max_workers, "limit": limit}
+    sources = [
+        InventorySource(path, vars_path, cache_dir=cache_dir, options=options)
+        for path, vars_path in get_inventory_files(hostsfile)
+    ]
+    parse_sources(sources, LoadStats(enabled=False))
+    inventory = merge_inventories([source.inventory for source in sources])
+    hosts = inventory["hosts"]
+    if inventory["host_ranges"]:
+        hosts = {**hosts, **dict(expand_host_ranges(inventory["host_ranges"]))}
+    return hosts, inventory["groups"], inventory["defaults"]
 
-        Arguments:
-            hostsfile: Path to valid Ansible inventory
 
-        """
-        self.hostsfile = hostsfile
-        self.path = str(Path(hostsfile).absolute().parents[0])
-        self.hosts: Dict[str, Any] = {}
-        self.groups: Dict[str, Any] = {}
-        self.defaults: Dict[str, Any] = {"data": {}}
-        self.original_data: Optional[AnsibleGroupsDict] = None
-        self.load_hosts_file()
-
-    def parse_group(
-        self, group: str, data: AnsibleGroupDataDict, parent: Optional[str] = None
+class AnsibleInventory:
+    def __init__(
+        self,
+        hostsfile: Union[str, List[str]] = "hosts",
+        *,
+        cache_dir: Optional[str] = None,
+        vars_executor: Optional[Union[str, Executor]] = None,
+        max_workers: Optional[int] = None,
+        lazy: bool = False,
+        limit: Optional[Union[str, List[str]]] = None,
+        stats: bool = False,
+        log_stats: bool = False,
+        stats_callback: Optional[Callable[[LoadStats], None]] = None,
+        flatten_vars: bool = False,
+        script_timeout: float = 30.0,
+        script_cache_ttl: Optional[float] = None,
+        compact: bool = False,
+        shard_index: Optional[int] = None,
+        shard_count: int = 1,
+        shard_by: str = "host",
+        progress_callback: Optional[ProgressCallback] = None,
+        render_templates: bool = False,
+        vault_password_file: Optional[str] = None,
+        vault_password_callback: Optional[Callable[[], Union[str, bytes]]] = None,
+        vault_cache: bool = False,
     ) -> None:
         """
-        Parse inventory group data
+        Ansible Inventory plugin supporting ini, yaml and dynamic inventory script sources.
 
         Arguments:
-            group: name of group being parsed
-            data: inventory data for the group
-            parent: optional parent of group
+            hostsfile: Path to valid Ansible inventory, or list of inventory files and/or
+                directories; every file is parsed (concurrently) and cached on its own with the
+                group_vars/host_vars next to it, then they are merged in order, see
+                `merge_inventories`
+            cache_dir: optional directory to cache the parsed inventory in; the cache is reused
+                as long as the hosts file and the vars files/directories did not change
+            vars_executor: optional executor to load vars files concurrently with; either
+                "thread", "process" or an `Executor` instance, i.e. a pool shared with other
+                inventories, which is used as is and never shut down
+            max_workers: max workers of the executor created for "thread"/"process"
+            lazy: defer reading host vars until the data of a host is first accessed, hosts are
+                then loaded as `LazyHost`; a valid `cache_dir` cache is used as is
+            limit: optional Ansible limit expression (i.e. "site1:&ios:!lab"), hosts not matching
+                it and groups they do not belong to are skipped before any vars file is read
+            stats: record phase timings, file reads and the slowest vars files in `self.stats`
+            log_stats: log the stats through the `LOG` logger at info level once loaded, implies
+                `stats`
+            stats_callback: optional callable called with the `LoadStats` once loaded, implies
+                `stats`
+            flatten_vars: give every host the merged vars of all its groups, following Ansible's
+                precedence (group depth, `ansible_group_priority`, name), so that looking up
+                host data never walks the parent groups, see `VarsFlattener`
+            script_timeout: seconds a dynamic inventory script (an executable inventory file) may
+                run, see `ScriptParser`
+            script_cache_ttl: optional seconds the output of dynamic inventory scripts is cached in
+                `cache_dir` for, so that repeated loads do not run them again
+            compact: reduce the memory used by the inventory: parsed records are stored in slotted
+                objects with their groups as shared tuples, repeated strings and equal nested vars
+                are shared (nested values of `Host.data` must then be copied before being
+                modified), and the parsers with their raw data are released once loaded; a reload
+                then parses every changed inventory file from scratch
+            shard_index: optional index of the shard of hosts to load, from 0 to
+                `shard_count - 1`, so that worker processes each load a part of the inventory;
+                only the vars of the shard hosts and of the groups they belong to are read
+            shard_count: number of shards the hosts are split into
+            shard_by: "host" to split hosts by a stable hash of their name, "group" by a hash of
+                the first group they are listed under, keeping hosts of a group together; hosts
+                defined in several inventory files should be split by "host"
+            progress_callback: optional callable called with the phase, items done and total
+                items while parsing ("sources", "groups" and, with `vars_executor`,
+                "vars_files") and loading ("hosts"); it may be called from worker threads
+            render_templates: render the Jinja2 templated vars and connection fields of hosts
+                (i.e. `ansible_host: "{{ inventory_hostname }}.example.com"`) against the vars
+                of the host and its groups; hosts are loaded as `LazyHost` and their values
+                rendered one at a time on first access. Templated connection fields and options
+                of groups are rendered per host, inherited group vars only with `flatten_vars`;
+                requires jinja2, see `TemplateRenderer`
+            vault_password_file: optional file holding the password of Ansible Vault encrypted
+                vars files and `!vault` values, executable files are run to get it; decrypting
+                requires cryptography, see `Vault`. Unless set, `vars_executor` then defaults to
+                "thread" so that encrypted files are decrypted concurrently. Inventories holding
+                vault encrypted data are never cached in `cache_dir`
+            vault_password_callback: optional callable returning the vault password, called on
+                first use, instead of `vault_password_file`
+            vault_cache: memoize the most recently decrypted vault data in memory, up to
+                `VAULT_PLAINTEXT_CACHE_SIZE` plaintexts, so that reloads and other inventories do
+                not decrypt unchanged data again
 
         """
-        data = data or {}
-        if group == "defaults":
-            group_file = "all"
-            dest_group = self.defaults
-        else:
-            self.add(group, self.groups)
-            group_file = group
-            dest_group = self.groups[group]
-
-        if parent and parent != "defaults":
-            dest_group["groups"].append(parent)
-
-        group_data = data.get("vars", {})
-
-        vars_file_data = {}
-        if self._vars_file_exists(f"{self.path}/group_vars/{group_file}"):
-            vars_file_data = self.read_vars_file(
-                element=group_file, path=self.path, is_host=False, is_dir=False
+        vault = None
+        if vault_password_file is not None or vault_password_callback is not None:
+            vault = Vault(vault_password_file, vault_password_callback, cache=vault_cache)
+            if vars_executor is None:
+                vars_executor = "thread"
+        self.hostsfile = hostsfile
+        self.cache_dir = cache_dir
+        self.options: Dict[str, Any] = {
+            "vars_executor": vars_executor,
+            "max_workers": max_workers,
+            "lazy": lazy,
+            "limit": limit,
+            "shard_index": shard_index,
+            "shard_count": shard_count,
+            "shard_by": shard_by,
+            "progress_callback": progress_callback,
+            "vault": vault,
+        }
+        self.stats = LoadStats(enabled=stats or log_stats or stats_callback is not None)
+        self.log_stats = log_stats
+        self.stats_callback = stats_callback
+        self.flatten_vars = flatten_vars
+        self.compact = compact
+        self.renderer = TemplateRenderer() if render_templates else None
+        self.source_options: Dict[str, Any] = {
+            "script_timeout": script_timeout,
+            "script_cache_ttl": script_cache_ttl,
+            "compact": compact,
+        }
+        # serializes reloads with loads, which must not see the records half reloaded
+        self._reload_lock = threading.Lock()
+        # serializes the parser state changes of lazy hosts resolution, reloads and rendering
+        self._resolve_lock = threading.RLock()
+        self.inventory_sources: List[InventorySource] = []
+        # fingerprints of the inventory directories, files added/removed are picked up by reload
+        self.inventory_dirs: Dict[str, Fingerprint] = {}
+        self._update_sources()
+        self._set_inventory()
+
+    def _update_sources(self) -> None:
+        """List the inventory files of `hostsfile`, parse the ones that are not parsed yet"""
+        self.inventory_dirs = {}
+        parsed = {(s.hostsfile, s.vars_path): s for s in self.inventory_sources}
+        self.inventory_sources = [
+            parsed.get((path, vars_path))
+            or InventorySource(
+                path,
+                vars_path,
+                cache_dir=self.cache_dir,
+                options=self.options,
+                **self.source_options,
             )
-        elif Path(f"{self.path}/group_vars/{group_file}").is_dir():
-            for file in self._get_all_files(f"{self.path}/group_vars/{group_file}"):
-                t_vars_file_data = self.read_vars_file(
-                    element=group_file,
-                    path=file,
-                    is_host=False,
-                    is_dir=True,
-                )
-                if isinstance(t_vars_file_data, dict):
-                    vars_file_data = {**t_vars_file_data, **vars_file_data}
-
-        self.normalize_data(dest_group, group_data, vars_file_data)
-        self.map_nornir_vars(dest_group)
-
-        self.parse_hosts(data.get("hosts", {}), parent=group)
-
-        for children, children_data in data.get("children", {}).items():
-            self.parse_group(children, cast(AnsibleGroupDataDict, children_data), parent=group)
-
-    def parse(self) -> None:
-        """Parse inventory entrypoint"""
-        if self.original_data is not None:
-            self.parse_group("defaults", self.original_data["all"])
-        self.sort_groups()
+            for path, vars_path in get_inventory_files(self.hostsfile, self.inventory_dirs)
+        ]
+        if not self.inventory_sources:
+            LOG.warning("AnsibleInventory: no inventory file found in %r", self.hostsfile)
+        new_sources = [source for source in self.inventory_sources if not source.inventory]
+        if new_sources:
+            parse_sources(new_sources, self.stats, self.options["progress_callback"])
+
+    def _set_inventory(self) -> None:
+        inventory = merge_inventories([source.inventory for source in self.inventory_sources])
+        self.hosts: Dict[str, Any] = inventory["hosts"]
+        self.groups: Dict[str, Any] = inventory["groups"]
+        self.defaults: Dict[str, Any] = inventory["defaults"]
+        # compact host range records, only expanded into individual hosts by `load`
+        self.host_ranges: Dict[str, Dict[str, Any]] = inventory["host_ranges"]
+        self.group_priorities: Dict[str, int] = inventory["group_priorities"]
+        self.group_layers: GroupLayers = inventory["group_layers"]
+        self._flattener: Optional[VarsFlattener] = None
+
+    @property
+    def parser(self) -> Optional[AnsibleParser]:
+        """Parser of the inventory file, None if it was loaded from cache or there are several"""
+        if len(self.inventory_sources) != 1:
+            return None
+        return self.inventory_sources[0].parser
+
+    @property
+    def sources(self) -> Dict[str, Fingerprint]:
+        """Fingerprints of the parsed sources, host vars of lazy hosts are added once loaded"""
+        sources = dict(self.inventory_dirs)
+        for source in self.inventory_sources:
+            sources.update(source.fingerprints)
+        return sources
+
+    @property
+    def lazy_hosts(self) -> Container[str]:
+        """Names of the hosts deferred in lazy mode whose vars are not loaded yet"""
+        if len(self.inventory_sources) == 1:
+            parser = self.inventory_sources[0].parser
+            return parser.lazy_hosts if parser is not None else {}
+        return {
+            name
+            for source in self.inventory_sources
+            if source.parser is not None
+            for name in source.parser.lazy_hosts
+        }
 
-    def parse_hosts(self, hosts: AnsibleHostsDict, parent: Optional[str] = None) -> None:
+    def get_host_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Parse inventory hosts
+        Return the data a nornir host is built from, flattened if `flatten_vars` is set
 
         Arguments:
-            hosts: dict containing hosts; {host: data}
-            parent: optional parent of host
+            data: parsed host
 
         """
-        for host, data in hosts.items():
-            data = data or {}
-            self.add(host, self.hosts)
-            if parent and parent != "defaults":
-                self.hosts[host]["groups"].append(parent)
+        if not self.flatten_vars:
+            return data
+        return self._get_flattener().flatten(data)
 
-            vars_file_data = {}
-            if self._vars_file_exists(f"{self.path}/host_vars/{host}"):
-                vars_file_data = self.read_vars_file(
-                    element=host, path=self.path, is_host=True, is_dir=False
-                )
-
-            elif Path(f"{self.path}/host_vars/{host}").is_dir():
-                vars_file_data = {}
-                for file in self._get_all_files(f"{self.path}/host_vars/{host}"):
-                    t_vars_file_data = self.read_vars_file(
-                        element=host,
-                        path=file,
-                        is_host=True,
-                        is_dir=True,
-                    )
-                    if isinstance(t_vars_file_data, dict):
-                        vars_file_data = {**t_vars_file_data, **vars_file_data}
-
-            self.normalize_data(self.hosts[host], data, vars_file_data, host)
-            self.map_nornir_vars(self.hosts[host])
-
-    @staticmethod
-    def _get_all_files(path: str) -> List[str]:
+    def get_group_data(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Get all files with VARS_FILENAME_EXTENSIONS, contains in path/ and subdirectories
+        Return the data a nornir group or the defaults are built from, without their templated
+        connection fields and options if `render_templates` is set as hosts get them rendered
 
-        Args:
-            path: Path to directory
+        Arguments:
+            data: parsed group or defaults
 
-        Returns:
-            files_lst: List of files that are in this directory and subdirectories
+        """
+        if self.renderer is None:
+            return data
+        return strip_templates(data)
+
+    def _get_flattener(self) -> VarsFlattener:
+        if self._flattener is None:
+            self._flattener = VarsFlattener(
+                self.groups, self.defaults, self.group_priorities, self.group_layers
+            )
+        return self._flattener
 
+    def render_host(self, data: Dict[str, Any], name: str) -> Dict[str, Any]:
         """
-        files_list = [
-            str(file)
-            for file in Path(path).rglob("*")
-            if Path(file).suffix in VARS_FILENAME_EXTENSIONS and Path(file).is_file()
-        ]
+        Return the data a nornir host is built from with its templates rendered if
+        `render_templates` is set
 
-        return files_list
+        Arguments:
+            data: parsed host
+            name: name of the host
 
-    @staticmethod
-    def _vars_file_exists(path: str) -> bool:
         """
-        With VARS_FILENAME_EXTENSIONS, check if the file given in parameter exists.
-
-        Args:
-            path: Path to file (without extension)
+        with self._resolve_lock:
+            host = self.get_host_data(data)
+            if self.renderer is None:
+                return host
+            variables = host if self.flatten_vars else self._get_flattener().flatten(data)
+            return self.renderer.render_host(name, host, variables)
+
+    def get_host_loader(
+        self, name: str, data: Dict[str, Any], lazy_hosts: Container[str]
+    ) -> Optional[Callable[[str], Dict[str, Any]]]:
+        """
+        Return the loader of a host to build as `LazyHost`, None if it is built right away
 
-        Returns:
-            bool: True if a file exists with of of the extension
+        Arguments:
+            name: name of the host
+            data: parsed host
+            lazy_hosts: hosts deferred in lazy mode, see `lazy_hosts`
 
         """
-        for ext in VARS_FILENAME_EXTENSIONS:
-            if Path(f"{path}{ext}").is_file():
-                return True
-        return False
+        if name in lazy_hosts:
+            return self.resolve_host
+        if self.renderer is not None:
+            return functools.partial(self.render_host, data)
+        return None
 
-    def normalize_data(
+    def build_host(
         self,
-        host_or_group: Dict[str, Any],
+        builder: InventoryBuilder,
+        name: str,
         data: Dict[str, Any],
-        vars_data: Dict[str, Any],
-        hostname: Optional[str] = None,
-    ) -> None:
+        lazy_hosts: Container[str],
+    ) -> Host:
         """
-        Parse inventory hosts
-
-        data and vars_data come from the inventory file(s) and are generally global/host/group vars
-        depending on which section of the inventory file is being currently parsed
+        Build the nornir host of a parsed host, loaded on first access if it has a loader
 
         Arguments:
-            host_or_group: dict of host or group data
-            data: dict of vars to parse
-            vars_data: dict of vars to parse
+            builder: builder of the nornir inventory, see `load`
+            name: name of the host
+            data: parsed host
+            lazy_hosts: hosts deferred in lazy mode, see `lazy_hosts`
 
         """
-        self.map_nornir_vars(data)
-        for k, v in data.items():
-            if k in RESERVED_FIELDS:
-                host_or_group[k] = v
-            else:
-                host_or_group["data"][k] = v
-        self.map_nornir_vars(vars_data)
-        for k, v in vars_data.items():
-            if k in RESERVED_FIELDS:
-                host_or_group[k] = v
-            else:
-                host_or_group["data"][k] = v
-        for field in RESERVED_FIELDS:
-            if field not in host_or_group:
-                if field == "connection_options":
-                    host_or_group[field] = {}
-                elif field == "hostname" and hostname is not None:
-                    host_or_group[field] = hostname
-                else:
-                    host_or_group[field] = None
-
-    def sort_groups(self) -> None:
-        """Sort group data"""
-        for host in self.hosts.values():
-            host["groups"].sort()
-
-        for name, group in self.groups.items():
-            if name == "defaults":
-                continue
+        loader = self.get_host_loader(name, data, lazy_hosts)
+        if loader is not None:
+            return builder.build_lazy_host(name, data["groups"], loader)
+        return builder.build_host(name, self.get_host_data(data))
 
-            group["groups"].sort()
-
-    @staticmethod
-    def read_vars_file(
-        element: str, path: str, is_host: bool = True, is_dir: bool = False
-    ) -> VarsDict:
+    def resolve_host(self, name: str) -> Dict[str, Any]:
         """
-        Read vars file data, return `VarsDict`
+        Load a host deferred in lazy mode, return the data its nornir host is built from
 
-        Arguments:
-            element: inventory element being parsed, i.e. name of host or group being parsed
-            path: parent directory of inventory file
-            is_host: bool indicating if reading a host vars file or if false a group vars file
-            is_dir: bool indicating if variables are defined in a directory
-
-        """
-        sub_dir = "host_vars" if is_host else "group_vars"
-        vars_dir = Path(path) / sub_dir
-
-        if is_dir:
-            with open(path, "r", encoding="utf-8") as f:
-                for ext in VARS_FILENAME_EXTENSIONS:
-                    if Path(f"{path}{ext}").is_file():
-                        LOG.debug("AnsibleInventory: is_dir reading var file %r", path)
-                        return _load_yaml(f)
-
-        elif vars_dir.is_dir():
-            vars_file_base = vars_dir / element
-            for extension in VARS_FILENAME_EXTENSIONS:
-                vars_file = vars_file_base.with_suffix(vars_file_base.suffix + extension)
-                if vars_file.is_file():
-                    with open(vars_file, "r", encoding="utf-8") as f:
-                        LOG.debug("AnsibleInventory: reading var file %r", vars_file)
-                        return _load_yaml(f)
-            LOG.debug(
-                "AnsibleInventory: no vars file was found with the path %r "
-                "and one of the supported extensions: %s",
-                vars_file_base,
-                VARS_FILENAME_EXTENSIONS,
-            )
-        return {}
-
-    @staticmethod
-    def map_nornir_vars(obj: VarsDict) -> None:
-        """
-        Map ansible-specific variables such as host to nornir equivalent
+        Hosts of an inventory are resolved one at a time as parsers are not thread safe, hosts of
+        different inventories are resolved concurrently.
 
         Arguments:
-            obj: dict of variables being parsed to determine if any of them should be mapped to
-                nornir's "core" vars such as username/port
+            name: name of the host
 
         """
-        mappings = {
-            "ansible_host": "hostname",
-            "ansible_port": "port",
-            "ansible_user": "username",
-            "ansible_password": "password",
-        }
-        for ansible_var, nornir_var in mappings.items():
-            if ansible_var in obj:
-                obj[nornir_var] = obj.pop(ansible_var)
-
-    @staticmethod
-    def add(element: str, element_dict: Dict[str, VarsDict]) -> None:
+        with self._resolve_lock:
+            records = [
+                record
+                for record in (source.resolve_host(name) for source in self.inventory_sources)
+                if record is not None
+            ]
+            if len(records) == 1:
+                return self.render_host(records[0], name)
+            host: Dict[str, Any] = {}
+            for record in records:
+                merge_element(host, record)
+            return self.render_host(host, name)
+
+    def iter_hosts(self, names: Optional[Set[str]] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
         """
-        Determine if host/group is already in vars dict, if not add the host/group
+        Yield the name and parsed data of every host, hosts of host ranges included
 
         Arguments:
-            element: host or group being parsed
-            element_dict: dictionary representing host/group: vars mapping
+            names: optional names of the hosts to yield, all hosts if not provided
 
         """
-        if element not in element_dict:
-            element_dict[element] = {"groups": [], "data": {}}
-
-    def load_hosts_file(self) -> None:
-        """Parse host specific inventory files"""
-        raise NotImplementedError
-
-
-class INIParser(AnsibleParser):
-    @staticmethod
-    def normalize_value(value: str) -> Union[str, int]:
+        for name, data in self.hosts.items():
+            if names is None or name in names:
+                yield name, data
+        yield from expand_host_ranges(self.host_ranges, names)
+
+    def get_changed_sources(self) -> List[str]:
+        """Return the sources (hosts files, vars files and directories) changed since the parse"""
+        changed = [path for path, fp in self.inventory_dirs.items() if get_fingerprint(path) != fp]
+        for source in self.inventory_sources:
+            changed.extend(source.get_changed_sources())
+        return changed
+
+    def reload(self, inventory: Optional[Inventory] = None) -> InventoryDiff:
         """
-        Convert integers as strings to actual integers, otherwise return original string
+        Parse the sources that changed since the inventory was parsed, return what changed
+
+        Only the inventory files whose sources changed are parsed again, and if only vars files
+        changed, only the groups/hosts they belong to. Vars files that did not change are not read
+        again either. Inventory files added to/removed from inventory directories are picked up.
 
         Arguments:
-            value: value to try to cast to int
+            inventory: optional nornir inventory returned by `load`, updated in place with the
+                changes, see `patch_inventory`
 
         """
-        try:
-            return int(value)
-
-        except (ValueError, TypeError):
-            return value
-
-    @staticmethod
-    def normalize_content(content: str) -> VarsDict:
+        diff = InventoryDiff()
+        with self._reload_lock, self._resolve_lock, self.stats.phase("reload"):
+            changed = self.get_changed_sources()
+            if not changed:
+                return diff
+            LOG.debug("AnsibleInventory: reloading, changed sources: %s", changed)
+
+            old_hosts, old_groups = dict(self.hosts), dict(self.groups)
+            old_defaults, old_host_ranges = dict(self.defaults), self.host_ranges
+            old_deferred, old_layers = self._get_deferred_vars(), dict(self.group_layers)
+            if any(get_fingerprint(path) != fp for path, fp in self.inventory_dirs.items()):
+                self._update_sources()
+            # host vars of lazy hosts are not part of their records, track them separately
+            lazy_changed: Set[str] = set()
+            for source in self.inventory_sources:
+                if source.get_changed_sources():
+                    elements = source.reload(self.stats)
+                    if elements is not None and self.options["lazy"]:
+                        lazy_changed.update(elements["host_vars"])
+            self._set_inventory()
+            lazy_changed.update(self._resolve_reparsed_hosts(old_hosts, old_deferred))
+
+            if self.host_ranges is old_host_ranges:
+                hosts_diff = diff_elements(old_hosts, self.hosts)
+            else:
+                hosts_diff = diff_elements(
+                    {**old_hosts, **dict(expand_host_ranges(old_host_ranges))},
+                    dict(self.iter_hosts()),
+                )
+            diff.added_hosts, diff.removed_hosts, diff.changed_hosts = hosts_diff
+            diff.changed_hosts.update(
+                host for host in lazy_changed if host in old_hosts and host in self.hosts
+            )
+            diff.added_groups, diff.removed_groups, diff.changed_groups = diff_elements(
+                old_groups, self.groups
+            )
+            diff.defaults_changed = old_defaults != self.defaults
+            if self.flatten_vars:
+                self._diff_group_layers(diff, old_layers)
+            if self.flatten_vars or self.renderer is not None:
+                # flattened and rendered hosts hold the vars of their groups and defaults
+                diff.changed_hosts.update(self._get_inheriting_hosts(diff) - diff.added_hosts)
+
+            if inventory is not None and diff:
+                patch_inventory(inventory, self, diff)
+        LOG.info("AnsibleInventory: reloaded, %r", diff)
+        return diff
+
+    def _get_deferred_vars(self) -> Dict[str, List[Any]]:
+        """Return the inline vars of the hosts deferred in lazy mode, not in their records yet"""
+        deferred: Dict[str, List[Any]] = {}
+        for source in self.inventory_sources:
+            if source.parser is not None:
+                for name, sources in source.parser.lazy_hosts.items():
+                    deferred.setdefault(name, []).extend(sources)
+        return deferred
+
+    def _resolve_reparsed_hosts(
+        self, old_hosts: Dict[str, Any], old_deferred: Dict[str, List[Any]]
+    ) -> Set[str]:
         """
-        Normalize INI data into a `VarsDict`
+        Resolve the re-parsed hosts that were resolved before a reload so that their old and new
+        records compare alike, return the hosts deferred on both sides whose inline vars changed
 
         Arguments:
-            content: string row from ini inventory file to parse
+            old_hosts: parsed hosts before the reload
+            old_deferred: inline vars of the hosts deferred before the reload
 
         """
-        result: VarsDict = {}
-
-        if not content:
-            return result
-
-        for option in content.split():
-            key, value = option.split("=")
-            result[key] = INIParser.normalize_value(value)
-        return result
-
-    @staticmethod
-    def process_meta(meta: Optional[str], section: MutableMapping[str, str]) -> Dict[str, Any]:
+        deferred = self._get_deferred_vars()
+        changed = set()
+        for name in deferred.keys() & old_hosts.keys():
+            if name not in old_deferred:
+                for source in self.inventory_sources:
+                    source.resolve_host(name)
+            elif deferred[name] != old_deferred[name]:
+                changed.add(name)
+        return changed
+
+    def _diff_group_layers(self, diff: InventoryDiff, old_layers: GroupLayers) -> None:
         """
-        Process ini inventory meta sections such as "children" and "vars"
+        Flag the groups and defaults whose inline vars or group_vars changed as changed, vars
+        moving from one to the other change the flattened hosts but not their records
 
         Arguments:
-            meta: string name of meta; i.e. "children" or "vars"
-            section: configparser section to process
+            diff: diff of the reload
+            old_layers: `group_layers` before the reload
 
         """
-        if meta == "vars":
-            return {key: INIParser.normalize_value(value) for key, value in section.items()}
-
-        if meta == "children":
-            return {group_name: {} for group_name in section}
-
-        raise ValueError(f"Unknown tag {meta}")
+        for name in old_layers.keys() | self.group_layers.keys():
+            if old_layers.get(name) == self.group_layers.get(name):
+                continue
+            if name == "all":
+                diff.defaults_changed = True
+            elif name in self.groups and name not in diff.added_groups:
+                diff.changed_groups.add(name)
 
-    def normalize(self, data: cp.ConfigParser) -> Dict[str, AnsibleGroupDataDict]:
+    def _get_inheriting_hosts(self, diff: InventoryDiff) -> Set[str]:
         """
-        Parent method to normalize INI vars file into Nornir friendly structure
+        Return the hosts inheriting vars from the groups or defaults changed by a reload
 
         Arguments:
-            data: configparser parsed ini file data
+            diff: diff of the reload
 
         """
-        groups: DefaultDict[str, Dict[str, Any]] = defaultdict(dict)
-        # Dict[str, AnsibleGroupDataDict] does not work because of
-        # https://github.com/python/mypy/issues/5359
-        result: Dict[str, Dict[str, Dict[str, Dict[str, Any]]]] = {"all": {"children": groups}}
-
-        for section_name, section in data.items():
-            if section_name == "DEFAULT":
-                continue
-
-            if ":" in section_name:
-                group_name, meta = section_name.split(":")
-                subsection = self.process_meta(meta, section)
-                if group_name == "all":
-                    result["all"][meta] = subsection
-                else:
-                    groups[group_name][meta] = subsection
-            else:
-                groups[section_name]["hosts"] = {
-                    host: self.normalize_content(host_vars) for host, host_vars in section.items()
-                }
-        return cast(AnsibleGroupsDict, result)
-
-    def load_hosts_file(self) -> None:
-        """Parse host specific inventory files"""
-        original_data = cp.ConfigParser(interpolation=None, allow_no_value=True, delimiters=" =")
-        original_data.read(self.hostsfile)
-        self.original_data = self.normalize(original_data)
-
+        if diff.defaults_changed:
+            return {name for name, _ in self.iter_hosts()}
+        groups = diff.changed_groups | diff.added_groups
+        if not groups:
+            return set()
+        flattener = VarsFlattener(self.groups, self.defaults, self.group_priorities)
+        return {
+            name
+            for name, data in self.iter_hosts()
+            if any(groups & flattener.get_ancestors(group) for group in data["groups"])
+        }
 
-class YAMLParser(AnsibleParser):
-    def load_hosts_file(self) -> None:
-        """Parse host specific inventory files"""
-        with open(self.hostsfile, "r", encoding="utf-8") as f:
-            self.original_data = cast(AnsibleGroupsDict, YAML.load(f))
+    def watch(
+        self,
+        interval: float = 5.0,
+        inventory: Optional[Inventory] = None,
+        callback: Optional[Callable[[InventoryDiff], None]] = None,
+    ) -> InventoryWatcher:
+        """
+        Start a daemon thread reloading the inventory whenever its sources change
 
+        Arguments:
+            interval: seconds between two checks of the sources
+            inventory: optional nornir inventory returned by `load`, updated in place on changes
+            callback: optional callable called with the diff of every reload that changed anything
 
-def parse(hostsfile: str) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
-    """
-    Parse provided inventory file
+        Returns:
+            InventoryWatcher: the started watcher, call its `stop` method to stop watching
 
-    Arguments:
-        hostsfile: string of hostsfile to parse
+        """
+        watcher = InventoryWatcher(self, interval=interval, inventory=inventory, callback=callback)
+        watcher.start()
+        return watcher
 
-    """
-    try:
-        parser: AnsibleParser = INIParser(hostsfile)
-    except cp.Error:
-        try:
-            parser = YAMLParser(hostsfile)
-        except (ScannerError, ComposerError) as exc:
-            LOG.error("AnsibleInventory: file %r is not INI or YAML file", hostsfile)
-            raise NornirNoValidInventoryError(
-                f"AnsibleInventory: no valid inventory source(s) to parse. Tried: {hostsfile}"
-            ) from exc
-    parser.parse()
-    return parser.hosts, parser.groups, parser.defaults
-
-
-def _get_connection_options(data: Dict[str, Any]) -> Dict[str, ConnectionOptions]:
-    """
-    Get connection option information for a given host/group
+    def load(self, copy_data: bool = False) -> Inventory:
+        """
+        Return nornir Inventory object.
 
-    Arguments:
-        data: dictionary of connection options for host/group
+        Arguments:
+            copy_data: give hosts, groups and defaults a copy of their top level vars instead of
+                the parsed dicts, so that several nornir inventories loaded from this one do not
+                see each other's changes to `data`, see `InventoryBuilder`
 
-    """
-    connection_options = {}
-    for connection_name, connection_data in data.items():
-        connection_options[connection_name] = ConnectionOptions(
-            hostname=connection_data.get("hostname"),
-            port=connection_data.get("port"),
-            username=connection_data.get("username"),
-            password=connection_data.get("password"),
-            platform=connection_data.get("platform"),
-            extras=connection_data.get("extras"),
+        """
+        with self._reload_lock, self.stats.phase("load"):
+            inventory = self._load(copy_data)
+        if self.compact:
+            for source in self.inventory_sources:
+                source.release()
+            self._flattener = None
+        if self.log_stats:
+            LOG.info("AnsibleInventory: load stats: %s", self.stats)
+        if self.stats_callback is not None:
+            self.stats_callback(self.stats)
+        return inventory
+
+    def _load(self, copy_data: bool) -> Inventory:
+        builder = InventoryBuilder(self.get_group_data(self.defaults), copy_data)
+        groups = builder.build_groups(
+            {name: self.get_group_data(data) for name, data in self.groups.items()}
         )
-    return connection_options
+        progress_callback = self.options["progress_callback"]
+        total = len(self.hosts) + sum(len(r["hosts"]) for r in self.host_ranges.values())
+
+        lazy_hosts = self.lazy_hosts
+        hosts = BuiltHosts(builder)
+        for host_name, host_data in self.iter_hosts():
+            hosts[host_name] = self.build_host(builder, host_name, host_data, lazy_hosts)
+            if progress_callback is not None and (
+                len(hosts) % PROGRESS_HOSTS_STEP == 0 or len(hosts) == total
+            ):
+                progress_callback("hosts", len(hosts), total)
 
+        return Inventory(
+            hosts=hosts,
+            groups=groups,  # type: ignore
+            defaults=builder.defaults,
+        )
 
-def _get_defaults(data: Dict[str, Any]) -> Defaults:
-    """
-    Get defaults information for a given host/group
-
-    Arguments:
-        data: dictionary of defaults data
-
-    """
-    return Defaults(
-        hostname=data.get("hostname"),
-        port=data.get("port"),
-        username=data.get("username"),
-        password=data.get("password"),
-        platform=data.get("platform"),
-        data=data.get("data"),
-        connection_options=_get_connection_options(data.get("connection_options", {})),
-    )
-
-
-def _load_yaml(file_stream: TextIOWrapper) -> VarsDict:
-    """
-    Read vars YAML file data, return `VarsDict`
-
-    Arguments:
-        file_stream: opend file stream
+    @classmethod
+    async def acreate(
+        cls, hostsfile: Union[str, List[str]] = "hosts", **kwargs: Any
+    ) -> "AnsibleInventory":
+        """
+        Parse an inventory without blocking the running event loop
 
-    """
-    try:
-        data = YAML.load(file_stream)
-    except (ScannerError, ComposerError) as exc:
-        LOG.error("AnsibleInventory: file %r is not a valid YAML file", file_stream.name)
-        raise NornirNoValidInventoryError(
-            f"AnsibleInventory: no valid YAML file. Tried: {file_stream.name}"
-        ) from exc
-
-    if isinstance(data, dict):
-        return data
-    if data is None:
-        LOG.warning("AnsibleInventory: file %r is empty", file_stream.name)
-        return {}
-    LOG.error(
-        "AnsibleInventory: file %r does not return a dictionary. Got: %s",
-        file_stream.name,
-        type(data),
-    )
-    raise NornirNoValidInventoryError(
-        f"AnsibleInventory: file {file_stream.name} does not return a dictionary. Got: {type(data)}"
-    )
+        The inventory is parsed in the default executor of the loop, with its vars files read and
+        decoded concurrently by a bounded thread pool: `vars_executor` defaults to "thread" and
+        `max_workers` to `ASYNC_MAX_WORKERS`. `progress_callback` is called in the event loop
+        thread instead of the worker threads.
 
+        Arguments:
+            hostsfile: Path to valid Ansible inventory, or list of inventory files and/or
+                directories
+            kwargs: `AnsibleInventory` options
 
-def _get_inventory_element(
-    typ: Type[HostOrGroup], data: Dict[str, Any], name: str, defaults: Defaults
-) -> HostOrGroup:
-    """
-    Get inventory information for a given host/group
+        """
+        loop = asyncio.get_running_loop()
+        progress_callback = kwargs.get("progress_callback")
+        if progress_callback is not None:
 
-    Arguments:
-        data: dictionary of host or group data to serialize
+            def report(phase: str, done: int, total: int) -> None:
+                if not loop.is_closed():
+                    loop.call_soon_threadsafe(progress_callback, phase, done, total)
 
-    """
-    return typ(
-        name=name,
-        hostname=data.get("hostname"),
-        port=data.get("port"),
-        username=data.get("username"),
-        password=data.get("password"),
-        platform=data.get("platform"),
-        data=data.get("data"),
-        groups=data.get("groups"),
-        defaults=defaults,
-        connection_options=_get_connection_options(data.get("connection_options", {})),
-    )
+            kwargs["progress_callback"] = report
+        kwargs.setdefault("vars_executor", "thread")
+        kwargs.setdefault("max_workers", ASYNC_MAX_WORKERS)
+        return await loop.run_in_executor(None, functools.partial(cls, hostsfile, **kwargs))
 
+    async def aload(self) -> Inventory:
+        """Return nornir Inventory object, built without blocking the running event loop"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.load)
 
-class AnsibleInventory:
-    def __init__(
-        self,
-        hostsfile: str = "hosts",
-    ) -> None:
+    def dict(self) -> Dict[str, Any]:
         """
-        Ansible Inventory plugin supporting ini and yaml inventory sources.
+        Return the compiled inventory as plain dicts, in the format of nornir's SimpleInventory
 
-        Arguments:
-            hostsfile: Path to valid Ansible inventory
+        Hosts hold the data `load` builds them from: hosts of host ranges are expanded, hosts
+        deferred in lazy mode are loaded, vars are flattened if `flatten_vars` is set and
+        templates rendered if `render_templates` is set.
 
         """
-        self.hosts, self.groups, self.defaults = parse(hostsfile)
-
-    def load(self) -> Inventory:
-        """Return nornir Inventory object."""
-        serialized_defaults = _get_defaults(self.defaults)
-
-        serialized_hosts = {}
-        for host_name, host_data in self.hosts.items():
-            serialized_hosts[host_name] = _get_inventory_element(
-                Host, host_data, host_name, serialized_defaults
-            )
-
-        serialized_groups = {}
-        for group_name, group_data in self.groups.items():
-            serialized_groups[group_name] = _get_inventory_element(
-                Group, group_data, group_name, serialized_defaults
+        lazy_hosts = self.lazy_hosts
+        hosts = {
+            name: to_plain(
+                self.resolve_host(name) if name in lazy_hosts else self.render_host(data, name)
             )
+            for name, data in self.iter_hosts()
+        }
+        return {
+            "hosts": hosts,
+            "groups": {
+                name: to_plain(self.get_group_data(data)) for name, data in self.groups.items()
+            },
+            "defaults": to_plain(self.get_group_data(self.defaults)),
+        }
 
-        for h in serialized_hosts.values():
-            h.groups = ParentGroups([serialized_groups[g] for g in h.groups])  # type: ignore
-
-        for g in serialized_groups.values():
-            g.groups = ParentGroups([serialized_groups[g] for g in g.groups])  # type: ignore
+    def export(self, path: str, export_format: Optional[str] = None) -> None:
+        """
+        Write the compiled inventory, to load it back with `CompiledInventory` or SimpleInventory
 
-        return Inventory(
-            hosts=serialized_hosts,  # type: ignore
-            groups=serialized_groups,  # type: ignore
-            defaults=serialized_defaults,
-        )
+        Arguments:
+            path: file to write, or directory for the "simple" format
+            export_format: "simple" (SimpleInventory hosts/groups/defaults files), "json" or
+                "pickle", guessed from the extension of `path` if not provided, see
+                `export_inventory`
 
-    def dict(self) -> Dict[str, Any]:
-        """
-        Return serialized dictionary of inventory
         """
-        return {
-            "hosts": {n: h.dict() for n, h in self.hosts.items()},
-            "groups": {n: g.dict() for n, g in self.groups.items()},
-            "defaults": self.defaults,
-        }
+        export_inventory(self.dict(), path, export_format)
@@ -0,0 +1,147 @@
+"""nornir_ansible.inventory.cache"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from nornir_ansible.plugins.inventory.models import Fingerprint
+
+CACHE_VERSION = 6
+LOG = logging.getLogger(__name__)
+
+
+def get_fingerprint(path: Union[str, Path]) -> Fingerprint:
+    """
+    Return the fingerprint of an inventory source used to validate cached inventories
+
+    Arguments:
+        path: path to the file or directory
+
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def write_cache_file(path: Path, content: bytes) -> None:
+    """
+    Write a cache file atomically, errors are logged and ignored
+
+    The content is written to a temporary file first, so concurrent readers never see a partial
+    cache file.
+
+    Arguments:
+        path: path of the cache file, its directory is created if needed
+        content: content of the cache file
+
+    """
+    tmp_path = None
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except OSError as exc:
+        LOG.warning("AnsibleInventory: unable to write cache file %r: %s", str(path), exc)
+        if tmp_path is not None:
+            Path(tmp_path).unlink(missing_ok=True)
+
+
+class InventoryCache:
+    def __init__(
+        self,
+        hostsfile: str,
+        cache_dir: str,
+        limit: Optional[Union[str, List[str]]] = None,
+        vars_path: Optional[str] = None,
+        shard: Optional[Tuple[int, int, str]] = None,
+    ) -> None:
+        """
+        On-disk cache of parsed inventories
+
+        The parsed hosts/groups/defaults are pickled to `cache_dir` together with the fingerprints
+        (mtime and size) of the hosts file and every vars directory/file consumed while parsing.
+        A cached inventory is only used if none of those sources changed. As the cache is a pickle
+        file, `cache_dir` must only be writable by trusted users.
+
+        Arguments:
+            hostsfile: Path to valid Ansible inventory
+            cache_dir: directory to store the cache file in
+            limit: limit the inventory was parsed with, each limit has its own cache entry
+            vars_path: vars directory the inventory was parsed with, see `AnsibleParser`
+            shard: (shard_index, shard_count, shard_by) the inventory was parsed with, each shard
+                has its own cache entry
+
+        """
+        self.hostsfile = str(Path(hostsfile).absolute())
+        self.limit = limit
+        self.vars_path = str(Path(vars_path).absolute()) if vars_path is not None else None
+        self.shard = shard
+        key = f"{self.hostsfile}\0{limit!r}" if limit is not None else self.hostsfile
+        if self.vars_path is not None:
+            key = f"{key}\0{self.vars_path}"
+        if self.shard is not None:
+            key = f"{key}\0{self.shard!r}"
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()  # nosec
+        self.path = Path(cache_dir) / f"nornir_ansible_{digest}.pickle"
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """
+        Return the cached inventory, or None if there is no valid cache entry
+
+        Returns:
+            dict: parsed "hosts", "groups", "defaults", "host_ranges", "group_priorities" and
+                "group_layers"
+
+        """
+        try:
+            with open(self.path, "rb") as f:
+                cached = pickle.load(f)  # nosec
+        except FileNotFoundError:
+            return None
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError) as exc:
+            LOG.warning("AnsibleInventory: ignoring unreadable cache file %r: %s", self.path, exc)
+            return None
+
+        if (
+            cached.get("version") != CACHE_VERSION
+            or cached.get("hostsfile") != self.hostsfile
+            or cached.get("limit") != self.limit
+            or cached.get("vars_path") != self.vars_path
+            or cached.get("shard") != self.shard
+        ):
+            return None
+        for source, fingerprint in cached["sources"].items():
+            if get_fingerprint(source) != fingerprint:
+                LOG.debug("AnsibleInventory: cache invalidated, source %r changed", source)
+                return None
+        LOG.debug("AnsibleInventory: using cached inventory %r", self.path)
+        return cached
+
+    def dump(self, inventory: Dict[str, Any], sources: Dict[str, Fingerprint]) -> None:
+        """
+        Store a parsed inventory
+
+        Arguments:
+            inventory: parsed "hosts", "groups", "defaults", "host_ranges", "group_priorities"
+                and "group_layers"
+            sources: fingerprints of the sources the inventory was parsed from
+
+        """
+        cached = {
+            "version": CACHE_VERSION,
+            "hostsfile": self.hostsfile,
+            "limit": self.limit,
+            "vars_path": self.vars_path,
+            "shard": self.shard,
+            "sources": sources,
+            **inventory,
+        }
+        write_cache_file(self.path, pickle.dumps(cached, protocol=pickle.HIGHEST_PROTOCOL))
@@ -0,0 +1,184 @@
+"""nornir_ansible.inventory.compact"""
+
+from typing import Any, Dict, Hashable, Iterator, List, MutableMapping, Optional, Tuple
+
+from nornir_ansible.plugins.inventory.flatten import CONNECTION_FIELDS
+
+# keys of parsed host/group records, see `AnsibleParser.normalize_data`
+RECORD_FIELDS = ("groups", "data", *CONNECTION_FIELDS, "connection_options")
+
+
+class Record(MutableMapping[str, Any]):
+    __slots__ = RECORD_FIELDS
+
+    def __init__(self, **fields: Any) -> None:
+        """
+        Parsed host/group record storing its fields in slots instead of a dict
+
+        Behaves like the dict records the parser builds, but only accepts `RECORD_FIELDS` keys.
+
+        Arguments:
+            fields: fields of the record
+
+        """
+        for key, value in fields.items():
+            self[key] = value
+
+    def __getitem__(self, key: str) -> Any:
+        if key in RECORD_FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if key not in RECORD_FIELDS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if key in RECORD_FIELDS:
+            try:
+                delattr(self, key)
+                return
+            except AttributeError:
+                pass
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return (key for key in RECORD_FIELDS if hasattr(self, key))
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Record({dict(self)!r})"
+
+    def __getstate__(self) -> Dict[str, Any]:
+        return dict(self)
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        for key, value in state.items():
+            self[key] = value
+
+
+class Compactor:
+    def __init__(self) -> None:
+        """
+        Deduplicate the strings and vars of parsed records
+
+        Equal strings are replaced by a single instance, and equal nested dicts/lists of vars by a
+        single shared object; vars are compared by content, so deduplication is linear in the
+        size of the vars. The top level `data` dict of every record stays its own, as nornir
+        hosts expose it as `Host.data`, nested values must be copied before being modified
+        though. Pools only live as long as the compactor.
+
+        """
+        self.strings: Dict[str, str] = {}
+        self.values: Dict[Hashable, Any] = {}
+        self.groups: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+
+    def string(self, value: str) -> str:
+        """
+        Return the pooled instance of a string
+
+        Arguments:
+            value: string to deduplicate
+
+        """
+        return self.strings.setdefault(value, value)
+
+    def value(self, value: Any) -> Any:
+        """
+        Return the pooled instance of a var value, nested values included
+
+        Arguments:
+            value: var value to deduplicate
+
+        """
+        if isinstance(value, str):
+            return self.string(value)
+        items: Optional[List[Tuple[Any, Any]]] = None
+        if isinstance(value, dict):
+            items = [
+                (self.string(k) if isinstance(k, str) else k, self.value(v))
+                for k, v in value.items()
+            ]
+            value = dict(items)
+        elif isinstance(value, list):
+            value = [self.value(v) for v in value]
+            items = list(enumerate(value))
+        else:
+            return value
+
+        key = self._get_key(type(value), items)
+        if key is None:
+            return value
+        return self.values.setdefault(key, value)
+
+    @staticmethod
+    def _get_key(typ: type, items: List[Tuple[Any, Any]]) -> Optional[Hashable]:
+        """
+        Return the pool key of a dict/list whose values are already pooled, None if unhashable
+
+        Pooled dicts/lists are keyed by identity, equal ones being the same object, other values
+        by type and value so that i.e. `1`, `1.0` and `True` are not mixed up.
+
+        """
+        key: List[Hashable] = [typ]
+        for k, v in items:
+            if isinstance(v, (dict, list)):
+                key.append((k, id(v)))
+                continue
+            try:
+                hash(v)
+            except TypeError:
+                return None
+            key.append((k, type(v), v))
+        return tuple(key)
+
+    def record(self, record: MutableMapping[str, Any]) -> Record:
+        """
+        Return a compact copy of a parsed host/group record
+
+        Arguments:
+            record: parsed host/group
+
+        """
+        compact = Record()
+        for key, value in record.items():
+            if key == "groups":
+                groups = tuple(self.string(group) for group in value)
+                compact[key] = self.groups.setdefault(groups, groups)
+            elif key == "data":
+                compact[key] = {self.string(k): self.value(v) for k, v in value.items()}
+            else:
+                compact[key] = self.value(value)
+        return compact
+
+
+def compact_inventory(inventory: Dict[str, Any]) -> None:
+    """
+    Replace the records of a parsed inventory by compact ones in place, see `Compactor`
+
+    Records that are already compact are kept as is, so compacting an inventory after some of its
+    records were parsed again only compacts those.
+
+    Arguments:
+        inventory: parsed "hosts", "groups", "defaults" and "host_ranges"
+
+    """
+    compactor = Compactor()
+    for kind in ("hosts", "groups"):
+        records = inventory[kind]
+        for name, record in records.items():
+            if not isinstance(record, Record):
+                records[name] = compactor.record(record)
+    # defaults and host ranges stay dicts, they are few and updated in place by the parser
+    for record in (inventory["defaults"], *inventory["host_ranges"].values()):
+        for key, value in record.items():
+            if key == "data":
+                record[key] = {compactor.string(k): compactor.value(v) for k, v in value.items()}
+            elif key not in ("groups", "hosts"):
+                record[key] = compactor.value(value)
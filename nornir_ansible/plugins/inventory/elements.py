@@ -0,0 +1,425 @@
+"""nornir_ansible.inventory.elements"""
+
+import functools
+import threading
+from typing import Any, Callable, Container, Dict, Hashable, Iterator, List, Optional, Tuple, Type
+
+from nornir.core.inventory import (
+    ConnectionOptions,
+    Defaults,
+    Group,
+    Host,
+    HostOrGroup,
+    Hosts,
+    ParentGroups,
+)
+
+# Host attributes triggering the load of a `LazyHost`
+LAZY_HOST_FIELDS = frozenset(
+    ("hostname", "port", "username", "password", "platform", "data", "connection_options")
+)
+HOST_FIELDS = ("hostname", "port", "username", "password", "platform")
+
+
+def expand_host_ranges(
+    host_ranges: Dict[str, Dict[str, Any]], names: Optional[Container[str]] = None
+) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """
+    Materialize the hosts of compact host range records, see `AnsibleParser.parse_host_range`
+
+    Every host gets its own copy of the shared groups/vars, and defaults its hostname to its name.
+
+    Arguments:
+        host_ranges: host range records by pattern
+        names: optional names of the hosts to materialize, all hosts if not provided
+
+    """
+    for host_range in host_ranges.values():
+        for host in host_range["hosts"]:
+            if names is not None and host not in names:
+                continue
+            data = {k: v for k, v in host_range.items() if k != "hosts"}
+            data["groups"] = list(host_range["groups"])
+            data["data"] = dict(host_range["data"])
+            data["connection_options"] = dict(host_range.get("connection_options") or {})
+            if data.get("hostname") is None:
+                data["hostname"] = host
+            yield host, data
+
+
+def freeze(value: Any) -> Hashable:
+    """
+    Return a hashable key of a (nested) value, values of different types never share a key
+
+    Raises:
+        TypeError: if the value holds an unhashable value that is not a dict or a list
+
+    """
+    if isinstance(value, dict):
+        return (dict, tuple((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return (list, tuple(freeze(v) for v in value))
+    hash(value)
+    return (type(value), value)
+
+
+def _get_connection_options(
+    data: Dict[str, Any], cache: Optional[Dict[Hashable, ConnectionOptions]] = None
+) -> Dict[str, ConnectionOptions]:
+    """
+    Get connection option information for a given host/group
+
+    Arguments:
+        data: dictionary of connection options for host/group
+        cache: optional `ConnectionOptions` by content, elements with identical connection options
+            then share the same `ConnectionOptions` objects
+
+    """
+    connection_options = {}
+    for connection_name, connection_data in data.items():
+        key: Optional[Hashable] = None
+        if cache is not None:
+            try:
+                key = freeze(connection_data)
+            except TypeError:
+                key = None
+            if key is not None and key in cache:
+                connection_options[connection_name] = cache[key]
+                continue
+        options = ConnectionOptions(
+            hostname=connection_data.get("hostname"),
+            port=connection_data.get("port"),
+            username=connection_data.get("username"),
+            password=connection_data.get("password"),
+            platform=connection_data.get("platform"),
+            extras=connection_data.get("extras"),
+        )
+        if key is not None and cache is not None:
+            cache[key] = options
+        connection_options[connection_name] = options
+    return connection_options
+
+
+def _get_defaults(data: Dict[str, Any]) -> Defaults:
+    """
+    Get defaults information for a given host/group
+
+    Arguments:
+        data: dictionary of defaults data
+
+    """
+    return Defaults(
+        hostname=data.get("hostname"),
+        port=data.get("port"),
+        username=data.get("username"),
+        password=data.get("password"),
+        platform=data.get("platform"),
+        data=data.get("data"),
+        connection_options=_get_connection_options(data.get("connection_options", {})),
+    )
+
+
+def _get_inventory_element(
+    typ: Type[HostOrGroup], data: Dict[str, Any], name: str, defaults: Defaults
+) -> HostOrGroup:
+    """
+    Get inventory information for a given host/group
+
+    Arguments:
+        data: dictionary of host or group data to serialize
+
+    """
+    return typ(
+        name=name,
+        hostname=data.get("hostname"),
+        port=data.get("port"),
+        username=data.get("username"),
+        password=data.get("password"),
+        platform=data.get("platform"),
+        data=data.get("data"),
+        groups=data.get("groups"),
+        defaults=defaults,
+        connection_options=_get_connection_options(data.get("connection_options", {})),
+    )
+
+
+class DeferredValue:
+    __slots__ = ("get",)
+
+    def __init__(self, get: Callable[[], Any]) -> None:
+        """
+        Connection field or connection options of a `LazyHost` computed on first access of that
+        field only, i.e. a rendered template, see `TemplateRenderer.render_host`
+
+        Arguments:
+            get: callable returning the value, called again on next access if it raises
+
+        """
+        self.get = get
+
+
+class LazyHost(Host):
+    __slots__ = ("_loader", "_lock", "_deferred", "_options_cache")
+
+    def __init__(
+        self,
+        name: str,
+        loader: Callable[[str], Dict[str, Any]],
+        groups: Optional[ParentGroups] = None,
+        defaults: Optional[Defaults] = None,
+        options_cache: Optional[Dict[Hashable, ConnectionOptions]] = None,
+    ) -> None:
+        """
+        Nornir Host whose data/connection fields are loaded on first access
+
+        Every host has its own lock, so hosts are loaded concurrently unless their loader
+        serializes them, see `AnsibleInventory.resolve_host`. Fields the loader returns as
+        `DeferredValue` are only computed once that field is accessed.
+
+        Arguments:
+            name: name of the host
+            loader: callable returning the parsed host data, i.e. `AnsibleParser.resolve_host`
+            groups: parent groups of the host
+            defaults: inventory defaults
+            options_cache: optional `ConnectionOptions` by content to share identical connection
+                options with, see `InventoryBuilder`
+
+        """
+        self._loader: Optional[Callable[[str], Dict[str, Any]]] = loader
+        self._lock = threading.RLock()
+        self._deferred: Dict[str, Callable[[], Any]] = {}
+        self._options_cache = options_cache
+        super().__init__(name=name, groups=groups, defaults=defaults)
+
+    def __getattribute__(self, name: str) -> Any:
+        if name in LAZY_HOST_FIELDS:
+            if object.__getattribute__(self, "_loader") is not None:
+                object.__getattribute__(self, "_load")()
+            if name in object.__getattribute__(self, "_deferred"):
+                object.__getattribute__(self, "_compute")(name)
+        return super().__getattribute__(name)
+
+    def dict(self) -> Dict[str, Any]:
+        for field in LAZY_HOST_FIELDS:
+            getattr(self, field)
+        return super().dict()
+
+    def _load(self) -> None:
+        """Load the host data, hosts may be accessed from several nornir threads at once"""
+        with object.__getattribute__(self, "_lock"):
+            loader = object.__getattribute__(self, "_loader")
+            if loader is None:
+                return
+            data = loader(object.__getattribute__(self, "name"))
+            deferred = {}
+            for field in HOST_FIELDS:
+                value = data.get(field)
+                if isinstance(value, DeferredValue):
+                    deferred[field], value = value.get, None
+                object.__setattr__(self, field, value)
+            object.__setattr__(self, "data", data.get("data") or {})
+            connection_options = data.get("connection_options") or {}
+            cache = object.__getattribute__(self, "_options_cache")
+            if isinstance(connection_options, DeferredValue):
+                get = connection_options.get
+                deferred["connection_options"] = lambda: _get_connection_options(get(), cache)
+                connection_options = {}
+            object.__setattr__(
+                self, "connection_options", _get_connection_options(connection_options, cache)
+            )
+            object.__setattr__(self, "_deferred", deferred)
+            object.__setattr__(self, "_loader", None)
+
+    def _compute(self, field: str) -> None:
+        """
+        Compute a field the loader deferred, see `DeferredValue`
+
+        Arguments:
+            field: name of the field
+
+        """
+        with object.__getattribute__(self, "_lock"):
+            deferred = object.__getattribute__(self, "_deferred")
+            if field in deferred:
+                object.__setattr__(self, field, deferred[field]())
+                del deferred[field]
+
+
+def copy_host_data(loader: Callable[[str], Dict[str, Any]], name: str) -> Dict[str, Any]:
+    """
+    Load the data of a `LazyHost` with a copy of its top level vars, see `InventoryBuilder`
+
+    Arguments:
+        loader: loader of the host
+        name: name of the host
+
+    """
+    data = loader(name)
+    return {**data, "data": (data.get("data") or {}).copy()}
+
+
+class InventoryBuilder:
+    def __init__(self, defaults: Dict[str, Any], copy_data: bool = False) -> None:
+        """
+        Build the nornir defaults, groups and hosts of an inventory in a single pass
+
+        Groups are built first and indexed by name, so hosts are created with their parent groups
+        instead of resolving them afterwards. Identical connection options (i.e. inherited from
+        the same group_vars by flattened hosts) share the same `ConnectionOptions` objects, which
+        must then be replaced rather than modified in place.
+
+        Arguments:
+            defaults: parsed defaults
+            copy_data: give the built elements a copy of the top level vars of their parsed data
+                instead of the parsed dict itself, so that inventories built from the same parsed
+                data do not see each other's changes to `data`; nested values are still shared
+
+        """
+        self.copy_data = copy_data
+        self.connection_options: Dict[Hashable, ConnectionOptions] = {}
+        self.defaults = self.build_defaults(defaults)
+        self.groups: Dict[str, Group] = {}
+
+    def build_defaults(self, defaults: Dict[str, Any]) -> Defaults:
+        """
+        Build nornir defaults, i.e. to update the defaults of a built inventory with
+
+        Arguments:
+            defaults: parsed defaults
+
+        """
+        return Defaults(
+            hostname=defaults.get("hostname"),
+            port=defaults.get("port"),
+            username=defaults.get("username"),
+            password=defaults.get("password"),
+            platform=defaults.get("platform"),
+            data=self.get_data(defaults),
+            connection_options=self.get_connection_options(defaults),
+        )
+
+    def get_connection_options(self, data: Dict[str, Any]) -> Dict[str, ConnectionOptions]:
+        """
+        Return the connection options of a parsed element, sharing identical ones
+
+        Arguments:
+            data: parsed host, group or defaults
+
+        """
+        return _get_connection_options(
+            data.get("connection_options") or {}, self.connection_options
+        )
+
+    def get_data(self, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Return the vars of a parsed element, copied if `copy_data` is set
+
+        Arguments:
+            data: parsed host, group or defaults
+
+        """
+        if self.copy_data:
+            return dict(data.get("data") or {})
+        return data.get("data")
+
+    def get_parents(self, groups: List[str]) -> ParentGroups:
+        """
+        Return the parent groups of an element from the index of built groups
+
+        Arguments:
+            groups: names of the parent groups
+
+        """
+        return ParentGroups([self.groups[group] for group in groups])
+
+    def build_groups(self, groups: Dict[str, Dict[str, Any]]) -> Dict[str, Group]:
+        """
+        Build all nornir groups, then link every group to its parents
+
+        Arguments:
+            groups: parsed groups by name
+
+        """
+        self.groups = {name: self.build(Group, data, name) for name, data in groups.items()}
+        for name, group in self.groups.items():
+            group.groups = self.get_parents(groups[name].get("groups") or [])
+        return self.groups
+
+    def build(
+        self,
+        typ: Type[HostOrGroup],
+        data: Dict[str, Any],
+        name: str,
+        groups: Optional[ParentGroups] = None,
+    ) -> HostOrGroup:
+        """
+        Build a nornir host or group
+
+        Arguments:
+            typ: `Host` or `Group`
+            data: parsed host/group
+            name: name of the host/group
+            groups: optional parent groups, see `get_parents`
+
+        """
+        return typ(
+            name=name,
+            hostname=data.get("hostname"),
+            port=data.get("port"),
+            username=data.get("username"),
+            password=data.get("password"),
+            platform=data.get("platform"),
+            data=self.get_data(data),
+            groups=groups,
+            defaults=self.defaults,
+            connection_options=self.get_connection_options(data),
+        )
+
+    def build_host(self, name: str, data: Dict[str, Any]) -> Host:
+        """
+        Build a nornir host linked to its parent groups, `build_groups` must be called first
+
+        Arguments:
+            name: name of the host
+            data: parsed host
+
+        """
+        return self.build(Host, data, name, self.get_parents(data.get("groups") or []))
+
+    def build_lazy_host(
+        self, name: str, groups: List[str], loader: Callable[[str], Dict[str, Any]]
+    ) -> LazyHost:
+        """
+        Build a nornir host loaded on first access linked to its parent groups, see `LazyHost`
+
+        Arguments:
+            name: name of the host
+            groups: names of the parent groups
+            loader: loader of the host, its vars are copied if `copy_data` is set
+
+        """
+        if self.copy_data:
+            loader = functools.partial(copy_host_data, loader)
+        return LazyHost(
+            name=name,
+            groups=self.get_parents(groups),
+            defaults=self.defaults,
+            loader=loader,
+            options_cache=self.connection_options,
+        )
+
+
+class BuiltHosts(Hosts):
+    __slots__ = ("builder",)
+
+    def __init__(self, builder: InventoryBuilder) -> None:
+        """
+        Hosts of a nornir inventory keeping the `InventoryBuilder` that built it, elements added
+        to the inventory afterwards are built by it as well, see `patch_inventory`
+
+        Arguments:
+            builder: builder of the inventory
+
+        """
+        super().__init__()
+        self.builder = builder
@@ -0,0 +1,186 @@
+"""nornir_ansible.inventory.export"""
+
+import datetime
+import json
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from nornir.core.exceptions import NornirNoValidInventoryError
+from nornir.core.inventory import Inventory
+
+from nornir_ansible.plugins.inventory.elements import DeferredValue, InventoryBuilder
+from nornir_ansible.plugins.inventory.vars_files import get_yaml
+
+EXPORT_VERSION = 1
+# format -> description; "simple" is a directory of SimpleInventory hosts/groups/defaults files
+EXPORT_FORMATS = {
+    "simple": "SimpleInventory hosts.yaml/groups.yaml/defaults.yaml directory",
+    "json": "single JSON file",
+    "pickle": "single pickle file, the fastest to load back",
+}
+SIMPLE_INVENTORY_FILES = ("hosts", "groups", "defaults")
+LOG = logging.getLogger(__name__)
+
+
+def to_plain(value: Any) -> Any:
+    """
+    Return a deep copy of parsed inventory data made of plain dicts and lists only
+
+    Compact records (see `Record`) become dicts, group tuples become lists and deferred values
+    (see `DeferredValue`) are computed, so the data can be serialized to any format.
+
+    Arguments:
+        value: parsed inventory data
+
+    """
+    if isinstance(value, Mapping):
+        return {k: to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    if isinstance(value, DeferredValue):
+        return to_plain(value.get())
+    return value
+
+
+def to_json(value: Any) -> Any:
+    """
+    Return a JSON serializable version of a value `json` can not serialize on its own
+
+    Dates and times, which YAML vars files load as such, become ISO 8601 strings, any other value
+    its string representation; they are read back as strings.
+
+    Arguments:
+        value: value to serialize
+
+    """
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def get_export_format(path: str, export_format: Optional[str] = None) -> str:
+    """
+    Return the format of an exported inventory, guessed from its path if not provided
+
+    Arguments:
+        path: path of the exported inventory
+        export_format: optional format, one of `EXPORT_FORMATS`
+
+    """
+    if export_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        export_format = {".json": "json", ".pickle": "pickle", ".pkl": "pickle"}.get(
+            extension, "simple"
+        )
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(
+            f"AnsibleInventory: unknown export format {export_format!r}, "
+            f"expected one of {sorted(EXPORT_FORMATS)}"
+        )
+    return export_format
+
+
+def export_inventory(
+    inventory: Dict[str, Any], path: str, export_format: Optional[str] = None
+) -> None:
+    """
+    Write a compiled inventory, see `AnsibleInventory.dict`
+
+    Arguments:
+        inventory: "hosts", "groups" and "defaults" in SimpleInventory format
+        path: file to write, or directory for the "simple" format
+        export_format: optional format, guessed from `path` if not provided: ".json" and
+            ".pickle"/".pkl" files, a SimpleInventory directory otherwise; values JSON can not
+            represent are exported as strings, see `to_json`
+
+    """
+    export_format = get_export_format(path, export_format)
+    if export_format == "simple":
+        os.makedirs(path, exist_ok=True)
+        yaml = get_yaml()
+        for name in SIMPLE_INVENTORY_FILES:
+            with open(os.path.join(path, f"{name}.yaml"), "w", encoding="utf-8") as f:
+                yaml.dump(inventory[name], f)
+    elif export_format == "json":
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {name: inventory[name] for name in SIMPLE_INVENTORY_FILES}, f, default=to_json
+            )
+    else:
+        content = {"version": EXPORT_VERSION, **inventory}
+        with open(path, "wb") as f:
+            pickle.dump(content, f, protocol=pickle.HIGHEST_PROTOCOL)
+    LOG.debug("AnsibleInventory: exported inventory to %r (%s)", path, export_format)
+
+
+def read_export(path: str, export_format: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read a compiled inventory written by `export_inventory`
+
+    As pickle files can run arbitrary code when loaded, only read pickle exports from trusted
+    locations.
+
+    Arguments:
+        path: file to read, or directory for the "simple" format
+        export_format: optional format, guessed from `path` if not provided
+
+    Returns:
+        dict: "hosts", "groups" and "defaults" in SimpleInventory format
+
+    """
+    export_format = get_export_format(path, export_format)
+    try:
+        if export_format == "simple":
+            inventory = {}
+            yaml = get_yaml()
+            for name in SIMPLE_INVENTORY_FILES:
+                with open(os.path.join(path, f"{name}.yaml"), "r", encoding="utf-8") as f:
+                    inventory[name] = yaml.load(f) or {}
+        elif export_format == "json":
+            with open(path, "r", encoding="utf-8") as f:
+                inventory = json.load(f)
+        else:
+            with open(path, "rb") as f:
+                inventory = pickle.load(f)  # nosec
+    except (OSError, ValueError, pickle.UnpicklingError, EOFError) as exc:
+        LOG.error("AnsibleInventory: unable to read exported inventory %r: %s", path, exc)
+        raise NornirNoValidInventoryError(
+            f"AnsibleInventory: unable to read exported inventory {path}: {exc}"
+        ) from exc
+
+    if export_format == "pickle" and inventory.get("version") != EXPORT_VERSION:
+        LOG.error("AnsibleInventory: exported inventory %r has an unsupported version", path)
+        raise NornirNoValidInventoryError(
+            f"AnsibleInventory: exported inventory {path} has an unsupported version "
+            f"{inventory.get('version')!r}, export it again"
+        )
+    return inventory
+
+
+class CompiledInventory:
+    def __init__(self, path: str, export_format: Optional[str] = None) -> None:
+        """
+        Inventory plugin loading an inventory exported by `AnsibleInventory.export`
+
+        No Ansible source is read: the compiled hosts, groups and defaults are loaded as they were
+        exported, which is much faster than parsing the inventory again.
+
+        Arguments:
+            path: exported inventory file, or directory for the "simple" format
+            export_format: optional format, guessed from `path` if not provided, see
+                `export_inventory`
+
+        """
+        self.path = str(Path(path))
+        self.export_format = get_export_format(self.path, export_format)
+
+    def load(self) -> Inventory:
+        """Return nornir Inventory object."""
+        inventory = read_export(self.path, self.export_format)
+        builder = InventoryBuilder(inventory["defaults"])
+        groups = builder.build_groups(inventory["groups"])
+        hosts = {name: builder.build_host(name, data) for name, data in inventory["hosts"].items()}
+        return Inventory(hosts=hosts, groups=groups, defaults=builder.defaults)  # type: ignore
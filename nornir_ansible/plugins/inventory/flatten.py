@@ -0,0 +1,185 @@
+"""nornir_ansible.inventory.flatten"""
+
+from typing import Any, Dict, FrozenSet, Iterator, Optional, Sequence, Set, Tuple
+
+from nornir_ansible.plugins.inventory.models import GroupLayers
+
+# group var setting the precedence of a group among groups of the same depth, only honored when
+# set in the hosts file like Ansible does
+GROUP_PRIORITY_VAR = "ansible_group_priority"
+DEFAULT_GROUP_PRIORITY = 1
+CONNECTION_FIELDS = ("hostname", "port", "username", "password", "platform")
+
+
+class VarsFlattener:
+    def __init__(
+        self,
+        groups: Dict[str, Dict[str, Any]],
+        defaults: Dict[str, Any],
+        priorities: Optional[Dict[str, int]] = None,
+        layers: Optional[GroupLayers] = None,
+    ) -> None:
+        """
+        Merge the vars of hosts with the vars of all their groups, following Ansible's precedence
+
+        Vars are merged from the inline vars of the defaults ("all" group), then of every (direct
+        or indirect) group of the host sorted by depth, `ansible_group_priority` and name, then
+        from the group_vars files of the defaults and of the groups in the same order, then the
+        host itself; later sources win. Connection fields (hostname, port...) and connection
+        options are resolved in the same order. Hosts sharing the same groups share one merged
+        view of the groups vars, computed on first use.
+
+        Arguments:
+            groups: parsed groups
+            defaults: parsed defaults
+            priorities: `ansible_group_priority` of groups, groups not listed have priority 1
+            layers: inline vars and group_vars of the groups having group_vars, the record of
+                groups not listed holds their inline vars only, see `AnsibleParser.group_layers`
+
+        """
+        self.groups = groups
+        self.defaults = defaults
+        self.priorities = priorities or {}
+        self.layers = layers or {}
+        self._depths: Dict[str, int] = {}
+        self._ancestors: Dict[str, FrozenSet[str]] = {}
+        self._chains: Dict[Tuple[str, ...], Tuple[str, ...]] = {}
+        self._views: Dict[Tuple[str, ...], Dict[str, Any]] = {}
+
+    def get_depth(self, group: str) -> int:
+        """
+        Return the depth of a group: 1 for children of "all", the deepest parent depth + 1 otherwise
+
+        Arguments:
+            group: name of the group
+
+        """
+        if group in self._depths:
+            return self._depths[group]
+        stack = [group]
+        while stack:
+            current = stack[-1]
+            pending = [
+                parent for parent in self.groups[current]["groups"] if parent not in self._depths
+            ]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            self._depths[current] = 1 + max(
+                (self._depths[parent] for parent in self.groups[current]["groups"]), default=0
+            )
+        return self._depths[group]
+
+    def get_ancestors(self, group: str) -> FrozenSet[str]:
+        """
+        Return a group and all its (direct or indirect) parents
+
+        Arguments:
+            group: name of the group
+
+        """
+        if group not in self._ancestors:
+            ancestors = {group}
+            stack = [group]
+            while stack:
+                for parent in self.groups[stack.pop()]["groups"]:
+                    if parent in self._ancestors:
+                        ancestors.update(self._ancestors[parent])
+                    elif parent not in ancestors:
+                        ancestors.add(parent)
+                        stack.append(parent)
+            self._ancestors[group] = frozenset(ancestors)
+        return self._ancestors[group]
+
+    def get_group_chain(self, groups: Sequence[str]) -> Tuple[str, ...]:
+        """
+        Return all groups a host with the given parent groups belongs to, in precedence order
+
+        Chains are memoized by parent groups, hosts sharing the same groups share one chain.
+
+        Arguments:
+            groups: parent groups of the host
+
+        """
+        key = tuple(groups)
+        if key not in self._chains:
+            members: Set[str] = set()
+            for group in groups:
+                members.update(self.get_ancestors(group))
+            self._chains[key] = tuple(
+                sorted(
+                    members,
+                    key=lambda group: (
+                        self.get_depth(group),
+                        self.priorities.get(group, DEFAULT_GROUP_PRIORITY),
+                        group,
+                    ),
+                )
+            )
+        return self._chains[key]
+
+    def get_view(self, chain: Tuple[str, ...]) -> Dict[str, Any]:
+        """
+        Return the merged defaults and groups vars of a group chain, memoized
+
+        Arguments:
+            chain: groups in precedence order, see `get_group_chain`
+
+        """
+        if chain not in self._views:
+            view: Dict[str, Any] = {"data": {}, "connection_options": {}}
+            for source in self._iter_layers(("all", *chain)):
+                self._merge(view, source)
+            view["data"].pop(GROUP_PRIORITY_VAR, None)
+            self._views[chain] = view
+        return self._views[chain]
+
+    def _iter_layers(self, chain: Tuple[str, ...]) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the inline vars of every group of a chain, then their group_vars
+
+        Arguments:
+            chain: "all" then groups in precedence order
+
+        """
+        group_vars = []
+        for group in chain:
+            if group in self.layers:
+                inline, vars_file = self.layers[group]
+                group_vars.append(vars_file)
+                yield inline
+            else:
+                yield self.defaults if group == "all" else self.groups[group]
+        yield from group_vars
+
+    def flatten(self, host: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Return a copy of a parsed host holding all the vars it inherits
+
+        Arguments:
+            host: parsed host
+
+        """
+        flat = dict(self.get_view(self.get_group_chain(host["groups"])))
+        flat["data"] = dict(flat["data"])
+        flat["connection_options"] = dict(flat["connection_options"])
+        self._merge(flat, host)
+        flat["groups"] = host["groups"]
+        return flat
+
+    @staticmethod
+    def _merge(dest: Dict[str, Any], source: Dict[str, Any]) -> None:
+        """
+        Merge the vars, connection fields and connection options of `source` into `dest`
+
+        Arguments:
+            dest: flattened element to update
+            source: parsed host, group or defaults
+
+        """
+        dest["data"].update(source.get("data") or {})
+        dest["connection_options"].update(source.get("connection_options") or {})
+        for field in CONNECTION_FIELDS:
+            if source.get(field) is not None:
+                dest[field] = source[field]
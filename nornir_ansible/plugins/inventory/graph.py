@@ -0,0 +1,337 @@
+"""nornir_ansible.inventory.graph"""
+
+import fnmatch
+import logging
+import re
+import string
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union, cast
+
+from nornir.core.exceptions import NornirNoValidInventoryError
+
+from nornir_ansible.plugins.inventory.models import AnsibleGroupDataDict, AnsibleGroupsDict
+
+# first "[beg:end]" or "[beg:end:step]" host range of a host pattern, i.e. "leaf[001:512]"
+HOST_RANGE_PATTERN = re.compile(r"\[([^\[\]:]*):([^\[\]:]*)(?::([^\[\]:]*))?\]")
+# what hosts are split into shards by, see `InventoryGraph.select_shard`
+SHARD_BY = ("host", "group")
+LOG = logging.getLogger(__name__)
+
+
+def is_host_range(host: str) -> bool:
+    """
+    Return True if the host is a host range pattern such as "web[01:99].example.com"
+
+    Arguments:
+        host: host name as found in the inventory
+
+    """
+    return "[" in host and HOST_RANGE_PATTERN.search(host) is not None
+
+
+def expand_hostname_range(pattern: str) -> Iterator[str]:
+    """
+    Lazily expand an Ansible host range pattern into host names
+
+    Numeric ranges keep the zero padding of their begin value ("[01:10]"), alphabetic ranges are
+    single letters ("[a:f]"), an optional third value is the step ("[0:10:2]"). Several ranges in
+    one pattern are expanded left to right.
+
+    Arguments:
+        pattern: host range pattern, i.e. "leaf[001:512]"
+
+    Raises:
+        ValueError: if the range is not valid
+
+    """
+    match = HOST_RANGE_PATTERN.search(pattern)
+    if match is None:
+        yield pattern
+        return
+
+    head, tail = pattern[: match.start()], pattern[match.end() :]
+    beg, end, step = match.group(1) or "0", match.group(2), int(match.group(3) or 1)
+    if not end:
+        raise ValueError(f"host range {pattern!r} must specify an end value")
+
+    if beg.isdigit() and end.isdigit():
+        width = len(beg) if beg[0] == "0" and len(beg) > 1 else 0
+        if width and len(end) != width:
+            raise ValueError(f"host range {pattern!r} must use equal-length begin and end values")
+        items = [str(i).zfill(width) for i in range(int(beg), int(end) + 1, step)]
+    elif len(beg) == len(end) == 1 and beg in string.ascii_letters and end in string.ascii_letters:
+        letters = string.ascii_letters
+        items = list(letters[letters.index(beg) : letters.index(end) + 1 : step])
+    else:
+        raise ValueError(f"host range {pattern!r} mixes numeric and alphabetic values")
+
+    tails = list(expand_hostname_range(tail))
+    for item in items:
+        for expanded_tail in tails:
+            yield f"{head}{item}{expanded_tail}"
+
+
+def get_shard(name: str, shard_count: int) -> int:
+    """
+    Return the shard of a host/group name, stable across processes, hosts and Python versions
+
+    Arguments:
+        name: host or group name
+        shard_count: number of shards
+
+    """
+    return zlib.crc32(name.encode("utf-8")) % shard_count
+
+
+class InventoryGraph:
+    def __init__(self, original_data: AnsibleGroupsDict) -> None:
+        """
+        Group/host graph of an inventory, built from the hosts file data without reading any vars
+
+        The hosts file data is walked iteratively and every occurrence of a group is visited once,
+        even when YAML aliases share it between parents or nest it into itself. Groups are indexed
+        in depth-first order of their first occurrence, which is the order they are parsed in.
+
+        Arguments:
+            original_data: data loaded from the hosts file
+
+        Raises:
+            NornirNoValidInventoryError: if a group is (indirectly) a child of itself
+
+        """
+        # dicts are used as insertion ordered sets
+        self.group_data: Dict[str, List[AnsibleGroupDataDict]] = {}
+        self.children: Dict[str, Dict[str, None]] = {}
+        self.hosts: Dict[str, Dict[str, None]] = {}
+        self.group_parents: Dict[str, Dict[str, None]] = {}
+        self.host_parents: Dict[str, Dict[str, None]] = {}
+        # hosts that are part of a host range and also defined on their own or in another range
+        self.range_conflicts: Set[str] = set()
+        range_owners: Dict[str, str] = {}
+        visited: Set[Tuple[str, int]] = set()
+
+        stack: List[Tuple[str, Optional[AnsibleGroupDataDict]]] = [("all", original_data["all"])]
+        while stack:
+            group, data = stack.pop()
+            occurrences = self.group_data.setdefault(group, [])
+            self.children.setdefault(group, {})
+            self.hosts.setdefault(group, {})
+            if not data or (group, id(data)) in visited:
+                continue
+            visited.add((group, id(data)))
+            occurrences.append(data)
+            for host_or_range in data.get("hosts") or {}:
+                for host in self._expand(host_or_range):
+                    if range_owners.setdefault(host, host_or_range) != host_or_range:
+                        self.range_conflicts.add(host)
+                    self.hosts[group][host] = None
+                    self.host_parents.setdefault(host, {})[group] = None
+            children = data.get("children") or {}
+            for child in children:
+                self.children[group][child] = None
+                self.group_parents.setdefault(child, {})[group] = None
+            # reversed so that children are popped, and indexed, in inventory order
+            stack.extend(
+                (child, cast(AnsibleGroupDataDict, child_data))
+                for child, child_data in reversed(children.items())
+            )
+
+        # position of each group in `group_data`, i.e. in parse order
+        self.group_positions = {group: i for i, group in enumerate(self.group_data)}
+        self.check_cycles()
+
+    def check_cycles(self) -> None:
+        """
+        Raise an error if a group is (indirectly) a child of itself
+
+        Raises:
+            NornirNoValidInventoryError: naming the groups of the first cycle found
+
+        """
+        # group -> False while it is on the current path, True once all its descendants are done
+        done: Dict[str, bool] = {}
+        for root, children in self.children.items():
+            if root in done:
+                continue
+            done[root] = False
+            path, iterators = [root], [iter(children)]
+            while iterators:
+                child = next(iterators[-1], None)
+                if child is None:
+                    done[path.pop()] = True
+                    iterators.pop()
+                elif child not in done:
+                    done[child] = False
+                    path.append(child)
+                    iterators.append(iter(self.children.get(child, {})))
+                elif not done[child]:
+                    cycle = " -> ".join(path[path.index(child) :] + [child])
+                    LOG.error("AnsibleInventory: group cycle detected: %s", cycle)
+                    raise NornirNoValidInventoryError(
+                        f"AnsibleInventory: group cycle detected: {cycle}"
+                    )
+
+    @staticmethod
+    def _expand(host: str) -> Iterator[str]:
+        """
+        Return the host names of a host or host range pattern
+
+        Arguments:
+            host: host name or host range pattern
+
+        """
+        if not is_host_range(host):
+            return iter((host,))
+        try:
+            return iter(list(expand_hostname_range(host)))
+        except ValueError as exc:
+            LOG.error("AnsibleInventory: %s", exc)
+            raise NornirNoValidInventoryError(
+                f"AnsibleInventory: invalid host range {host!r}: {exc}"
+            ) from exc
+
+    def get_group_hosts(self, group: str) -> Set[str]:
+        """
+        Return all hosts of a group, including the hosts of its children
+
+        Arguments:
+            group: name of the group
+
+        """
+        hosts: Set[str] = set()
+        seen = {group}
+        stack = [group]
+        while stack:
+            current = stack.pop()
+            hosts.update(self.hosts.get(current, {}))
+            for child in self.children.get(current, {}):
+                if child not in seen:
+                    seen.add(child)
+                    stack.append(child)
+        return hosts
+
+    def get_ancestors(self, hosts: Iterable[str]) -> Set[str]:
+        """
+        Return all groups that are (direct or indirect) parents of any of the given hosts
+
+        Arguments:
+            hosts: names of the hosts
+
+        """
+        groups: Set[str] = set()
+        stack = [group for host in hosts for group in self.host_parents.get(host, {})]
+        while stack:
+            group = stack.pop()
+            if group not in groups:
+                groups.add(group)
+                stack.extend(self.group_parents.get(group, {}))
+        return groups
+
+    def match(self, pattern: str) -> Set[str]:
+        """
+        Return the hosts matching a single Ansible host pattern
+
+        Supported patterns are "all"/"*", group or host names, shell style globs and regexes
+        prefixed with "~". Globs/regexes select the hosts of matching groups as well as matching
+        hosts.
+
+        Arguments:
+            pattern: the host pattern
+
+        """
+        if pattern in ("all", "*"):
+            return set(self.host_parents)
+        if pattern in self.children:
+            return self.get_group_hosts(pattern)
+        if pattern in self.host_parents:
+            return {pattern}
+
+        if pattern.startswith("~"):
+            matcher = re.compile(pattern[1:])
+        else:
+            matcher = re.compile(fnmatch.translate(pattern))
+
+        hosts = {host for host in self.host_parents if matcher.match(host)}
+        for group in self.children:
+            if matcher.match(group):
+                hosts.update(self.get_group_hosts(group))
+        return hosts
+
+    def select(self, limit: Union[str, List[str]]) -> Set[str]:
+        """
+        Return the hosts selected by an Ansible limit expression, i.e. "site1:&ios:!lab"
+
+        As in Ansible patterns are separated by "," or ":", patterns prefixed with "&" intersect
+        the selection and patterns prefixed with "!" exclude hosts from it. Patterns prefixed with
+        "@" are read from a file, one pattern per line.
+
+        Arguments:
+            limit: the limit expression or a list of patterns
+
+        """
+        patterns: List[str] = []
+        for expression in [limit] if isinstance(limit, str) else limit:
+            for pattern in split_host_pattern(expression):
+                if pattern.startswith("@"):
+                    with open(pattern[1:], "r", encoding="utf-8") as f:
+                        patterns.extend(line.strip() for line in f if line.strip())
+                else:
+                    patterns.append(pattern)
+
+        includes = [p for p in patterns if not p.startswith(("&", "!"))] or ["all"]
+        selected: Set[str] = set()
+        for pattern in includes:
+            selected |= self.match(pattern)
+        for pattern in patterns:
+            if pattern.startswith("&"):
+                selected &= self.match(pattern[1:])
+            elif pattern.startswith("!"):
+                selected -= self.match(pattern[1:])
+
+        if not selected:
+            LOG.warning("AnsibleInventory: could not match supplied host pattern %r", limit)
+        return selected
+
+    def select_shard(
+        self, hosts: Iterable[str], shard_index: int, shard_count: int, shard_by: str = "host"
+    ) -> Set[str]:
+        """
+        Return the hosts of `hosts` that belong to a shard
+
+        With `shard_by="host"` hosts are split by a hash of their name, which balances the shards.
+        With `shard_by="group"` they are split by a hash of the first group they are listed under
+        in the inventory (their name for hosts that are not in any group), so that hosts listed
+        under the same group are kept in the same shard.
+
+        Arguments:
+            hosts: names of the hosts to split
+            shard_index: index of the shard, from 0 to `shard_count - 1`
+            shard_count: number of shards
+            shard_by: "host" or "group"
+
+        """
+        if shard_by == "host":
+            return {host for host in hosts if get_shard(host, shard_count) == shard_index}
+        selected: Set[str] = set()
+        for host in hosts:
+            key = next((group for group in self.host_parents.get(host, {}) if group != "all"), host)
+            if get_shard(key, shard_count) == shard_index:
+                selected.add(host)
+        return selected
+
+
+def split_host_pattern(pattern: str) -> List[str]:
+    """
+    Split an Ansible limit expression into patterns, keeping bracketed expressions intact
+
+    Arguments:
+        pattern: the limit expression
+
+    """
+    if "," in pattern:
+        patterns = pattern.split(",")
+    elif pattern.startswith("~"):
+        patterns = [pattern]
+    else:
+        patterns = re.findall(r"(?:[^\s:\[\]]|\[[^\]]*\])+", pattern)
+    return [p.strip() for p in patterns if p.strip()]
@@ -0,0 +1,26 @@
+"""nornir_ansible.inventory.models"""
+
+from typing import Any, Callable, Dict, Optional, Tuple, TypedDict
+
+VarsDict = Dict[str, Any]
+AnsibleHostsDict = Dict[str, Optional[VarsDict]]
+
+AnsibleGroupDataDict = TypedDict(
+    "AnsibleGroupDataDict",
+    {"children": Dict[str, Any], "vars": VarsDict, "hosts": AnsibleHostsDict},
+    total=False,
+)  # bug: https://github.com/python/mypy/issues/5357
+
+AnsibleGroupsDict = Dict[str, AnsibleGroupDataDict]
+
+InventoryTuple = Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]
+
+# (inline vars, group_vars) records of groups, by group name ("all" for the defaults)
+GroupLayers = Dict[str, Tuple[Dict[str, Any], Dict[str, Any]]]
+
+# (st_mtime_ns, st_size) of an inventory source, None if the source does not exist
+Fingerprint = Optional[Tuple[int, int]]
+
+# called with the name of a load phase ("sources", "vars_files", "groups" or "hosts"), the number
+# of items of the phase done so far and its total number of items
+ProgressCallback = Callable[[str, int, int], None]
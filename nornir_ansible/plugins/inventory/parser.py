@@ -0,0 +1,991 @@
+"""nornir_ansible.inventory.parser"""
+
+import logging
+import os
+import re
+import shlex
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union, cast
+
+from nornir.core.exceptions import NornirNoValidInventoryError
+from ruamel.yaml.error import YAMLError
+
+from nornir_ansible.plugins.inventory import vars_files
+from nornir_ansible.plugins.inventory.cache import get_fingerprint
+from nornir_ansible.plugins.inventory.elements import expand_host_ranges
+from nornir_ansible.plugins.inventory.flatten import GROUP_PRIORITY_VAR, VarsFlattener
+from nornir_ansible.plugins.inventory.graph import (
+    SHARD_BY,
+    InventoryGraph,
+    expand_hostname_range,
+    is_host_range,
+)
+from nornir_ansible.plugins.inventory.models import (
+    AnsibleGroupDataDict,
+    AnsibleGroupsDict,
+    AnsibleHostsDict,
+    Fingerprint,
+    GroupLayers,
+    ProgressCallback,
+    VarsDict,
+)
+from nornir_ansible.plugins.inventory.stats import LoadStats
+from nornir_ansible.plugins.inventory.vars_files import (
+    VarsCache,
+    VarsIndex,
+    load_yaml,
+    loaded_vault_data,
+)
+from nornir_ansible.plugins.inventory.vault import Vault
+
+RESERVED_FIELDS = ("hostname", "port", "username", "password", "platform", "connection_options")
+VARS_EXECUTORS: Dict[str, Callable[..., Executor]] = {
+    "thread": ThreadPoolExecutor,
+    "process": ProcessPoolExecutor,
+}
+LOG = logging.getLogger(__name__)
+
+INI_COMMENT_PREFIXES = ("#", ";")
+INI_SECTION_PATTERN = re.compile(r"^\[([^\]]+)\]\s*(?:[#;].*)?$")
+# "key=value", "key = value" or "key value", the same delimiters configparser was set up with
+INI_VAR_PATTERN = re.compile(r"^(\S+?)\s*[=\s]\s*(.*)$")
+# a YAML mapping key, i.e. "all:", as opposed to an INI host line such as "host:2222 var=1"
+YAML_KEY_PATTERN = re.compile(r"^[^\s=\[]+:(\s|$)")
+
+
+class AnsibleParser:
+    def __init__(
+        self,
+        hostsfile: str,
+        *,
+        vars_executor: Optional[Union[str, Executor]] = None,
+        max_workers: Optional[int] = None,
+        lazy: bool = False,
+        limit: Optional[Union[str, List[str]]] = None,
+        shard_index: Optional[int] = None,
+        shard_count: int = 1,
+        shard_by: str = "host",
+        stats: Optional[LoadStats] = None,
+        vars_cache: Optional[VarsCache] = None,
+        vars_path: Optional[str] = None,
+        progress_callback: Optional[ProgressCallback] = None,
+        vault: Optional[Vault] = None,
+    ) -> None:
+        """
+        Parse Ansible inventories for use with Nornir
+
+        Arguments:
+            hostsfile: Path to valid Ansible inventory
+            vars_executor: optional executor to load vars files concurrently with; either an
+                `Executor` instance, "thread" (best for slow/network storage) or "process" (best
+                for many large files as YAML parsing is CPU bound)
+            max_workers: max workers of the executor created for "thread"/"process"
+            lazy: only record host names, groups and inline vars while parsing; host vars are
+                loaded on demand by `resolve_host`
+            limit: optional Ansible limit expression, only hosts matching it (and the groups they
+                belong to) are parsed, see `InventoryGraph.select`
+            shard_index: optional index of the shard of hosts to parse, from 0 to
+                `shard_count - 1`; like with `limit` the vars of other hosts, and of groups none
+                of the shard hosts belong to, are never read, see `InventoryGraph.select_shard`
+            shard_count: number of shards the hosts are split into
+            shard_by: "host" to split hosts by a hash of their name, "group" by a hash of the
+                first group they are listed under
+            stats: optional `LoadStats` to record phase timings and file reads in
+            vars_cache: optional `VarsCache` of a previous parse, only vars files that changed
+                since are read again
+            vars_path: optional directory holding the group_vars/host_vars directories, defaults
+                to the directory of the hosts file
+            progress_callback: optional callable called with "groups" after every group parsed,
+                and "vars_files" after every vars file preloaded by `vars_executor`
+            vault: optional vault to decrypt encrypted vars files and `!vault` values with
+
+        """
+        if isinstance(vars_executor, str) and vars_executor not in VARS_EXECUTORS:
+            raise ValueError(
+                f"AnsibleInventory: unknown vars_executor {vars_executor!r}, "
+                f"expected one of {sorted(VARS_EXECUTORS)}"
+            )
+        if shard_index is not None and not 0 <= shard_index < shard_count:
+            raise ValueError(
+                f"AnsibleInventory: shard_index must be between 0 and {shard_count - 1}, "
+                f"got {shard_index!r}"
+            )
+        if shard_by not in SHARD_BY:
+            raise ValueError(
+                f"AnsibleInventory: unknown shard_by {shard_by!r}, expected one of {list(SHARD_BY)}"
+            )
+        self.vars_executor = vars_executor
+        self.max_workers = max_workers
+        self.lazy = lazy
+        self.lazy_hosts: Dict[str, List[VarsDict]] = {}
+        # hosts not setting `ansible_host`, see `_set_default_hostnames`
+        self.default_hostnames: Set[str] = set()
+        self.limit = limit
+        self.limit_hosts: Optional[Set[str]] = None
+        self.limit_groups: Optional[Set[str]] = None
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+        self.shard_by = shard_by
+        self.graph: Optional[InventoryGraph] = None
+        self.host_ranges: Dict[str, Dict[str, Any]] = {}
+        # `ansible_group_priority` of groups setting it in the hosts file
+        self.group_priorities: Dict[str, int] = {}
+        # (inline vars, group_vars) records of the groups, "all" for the defaults, having
+        # group_vars; both are merged in their records, `VarsFlattener` applies them apart
+        self.group_layers: GroupLayers = {}
+        self.progress_callback = progress_callback
+        self.hostsfile = hostsfile
+        self.path = str(Path(vars_path or Path(hostsfile).parent).absolute())
+        self.hosts: Dict[str, Any] = {}
+        self.groups: Dict[str, Any] = {}
+        self.defaults: Dict[str, Any] = {"data": {}}
+        self.original_data: Optional[AnsibleGroupsDict] = None
+        self.stats = stats if stats is not None else LoadStats(enabled=False)
+        self.vault = vault
+        # whether the hosts file held `!vault` values, see `InventorySource.dump_cache`
+        self.vault_data = False
+        if vars_cache is not None:
+            vars_cache.reset()
+            vars_cache.stats = self.stats
+            vars_cache.vault = vault
+        self.vars_cache = vars_cache if vars_cache is not None else VarsCache(self.stats, vault)
+        self.vars_indexes: Dict[str, VarsIndex] = {}
+        self.hostsfile_fingerprint = get_fingerprint(hostsfile)
+        self.stats.incr("files_stat")
+        with self.stats.phase("hosts_file"):
+            self.load_hosts_file()
+        if self.hostsfile_fingerprint is not None:
+            self.stats.record_file(self.hostsfile, self.hostsfile_fingerprint[1])
+
+    def parse_groups(self) -> None:
+        """
+        Parse every group of `graph` exactly once, in order of first occurrence
+
+        Groups shared by several parents are parsed once with all of their parents, so the parse is
+        linear in the number of groups and parent/child edges.
+
+        """
+        graph = cast(InventoryGraph, self.graph)
+        for done, (group, occurrences) in enumerate(graph.group_data.items(), 1):
+            if group == "all" or self.limit_groups is None or group in self.limit_groups:
+                if group == "all":
+                    self.parse_group("defaults", occurrences)
+                else:
+                    self.parse_group(group, occurrences, self._get_group_parents(group))
+                for data in occurrences:
+                    parent = group if group != "all" else None
+                    self.parse_hosts(data.get("hosts") or {}, parent=parent)
+            if self.progress_callback is not None:
+                self.progress_callback("groups", done, len(graph.group_data))
+
+    def _get_group_parents(self, group: str) -> List[str]:
+        """
+        Return the parents of a group that are parsed, "all" is implicit and never included
+
+        Arguments:
+            group: name of the group
+
+        """
+        return [
+            parent
+            for parent in cast(InventoryGraph, self.graph).group_parents.get(group, {})
+            if parent != "all" and (self.limit_groups is None or parent in self.limit_groups)
+        ]
+
+    def parse_group(
+        self,
+        group: str,
+        occurrences: List[AnsibleGroupDataDict],
+        parents: Optional[List[str]] = None,
+    ) -> None:
+        """
+        Parse inventory group data
+
+        Arguments:
+            group: name of group being parsed
+            occurrences: inventory data of every occurrence of the group, in inventory order
+            parents: optional parents of group
+
+        """
+        if group == "defaults":
+            group_file = "all"
+            dest_group = self.defaults
+        else:
+            self.add(group, self.groups)
+            group_file = group
+            dest_group = self.groups[group]
+            dest_group["groups"].extend(parents or [])
+
+        group_data: VarsDict = {}
+        for data in occurrences:
+            group_data.update(data.get("vars") or {})
+        if GROUP_PRIORITY_VAR in group_data and group != "defaults":
+            try:
+                self.group_priorities[group] = int(group_data[GROUP_PRIORITY_VAR])
+            except (TypeError, ValueError) as exc:
+                LOG.error("AnsibleInventory: invalid %s of group %r", GROUP_PRIORITY_VAR, group)
+                raise NornirNoValidInventoryError(
+                    f"AnsibleInventory: invalid {GROUP_PRIORITY_VAR} of group {group!r}: "
+                    f"{group_data[GROUP_PRIORITY_VAR]!r}"
+                ) from exc
+
+        vars_file_data = self.load_vars(group_file, is_host=False)
+
+        with self.stats.phase("normalize"):
+            if vars_file_data:
+                self.group_layers[group_file] = (
+                    self._get_layer(group_data),
+                    self._get_layer(vars_file_data),
+                )
+            else:
+                self.group_layers.pop(group_file, None)
+            self.normalize_data(dest_group, group_data, vars_file_data)
+            self.map_nornir_vars(dest_group)
+
+    def parse(self) -> None:
+        """Parse inventory entrypoint"""
+        with self.stats.phase("parse"):
+            if self.original_data is not None:
+                with self.stats.phase("graph"):
+                    self.graph = InventoryGraph(self.original_data)
+                    if self.limit is not None or self.shard_index is not None:
+                        self.apply_limit()
+                if self.vars_executor is not None:
+                    with self.stats.phase("preload_vars"):
+                        self.preload_vars()
+                self.parse_groups()
+                with self.stats.phase("normalize"):
+                    self._expand_inheriting_ranges()
+                    self._set_default_hostnames()
+            with self.stats.phase("sort_groups"):
+                self.sort_groups()
+
+    def apply_limit(self) -> None:
+        """Resolve `limit` and the shard against the graph, before any vars file is read"""
+        if self.original_data is None or (self.limit is None and self.shard_index is None):
+            return
+        if self.graph is None:
+            self.graph = InventoryGraph(self.original_data)
+        if self.limit is not None:
+            self.limit_hosts = self.graph.select(self.limit)
+        else:
+            self.limit_hosts = set(self.graph.host_parents)
+        if self.shard_index is not None:
+            self.limit_hosts = self.graph.select_shard(
+                self.limit_hosts, self.shard_index, self.shard_count, self.shard_by
+            )
+        self.limit_groups = self.graph.get_ancestors(self.limit_hosts)
+
+    def collect_vars_files(self) -> List[str]:
+        """Walk the inventory and return all vars files the parse will read, without reading them"""
+        if self.original_data is None:
+            return []
+
+        if self.graph is None:
+            self.graph = InventoryGraph(self.original_data)
+
+        groups = [
+            group
+            for group in self.graph.children
+            if self.limit_groups is None or group == "all" or group in self.limit_groups
+        ]
+        hosts = [
+            host
+            for host in self.graph.host_parents
+            if not self.lazy and (self.limit_hosts is None or host in self.limit_hosts)
+        ]
+
+        files: List[str] = []
+        for sub_dir, elements in (("group_vars", groups), ("host_vars", hosts)):
+            index = self.get_vars_index(self.path, sub_dir)
+            for element in elements:
+                if element in index.files:
+                    files.append(index.files[element])
+                else:
+                    files.extend(index.get_dir_files(element))
+        return files
+
+    def preload_vars(self) -> None:
+        """
+        Load all vars files the parse will need concurrently with `vars_executor`
+
+        The files are parsed into `vars_cache` only, the regular parse then merges them exactly as
+        if they were read sequentially.
+
+        """
+        files = self.collect_vars_files()
+        if not files:
+            return
+
+        if isinstance(self.vars_executor, Executor):
+            self.vars_cache.preload(files, self.vars_executor, self.progress_callback)
+            return
+
+        executor_class = VARS_EXECUTORS[cast(str, self.vars_executor)]
+        with executor_class(max_workers=self.max_workers) as executor:
+            self.vars_cache.preload(files, executor, self.progress_callback)
+
+    def parse_hosts(self, hosts: AnsibleHostsDict, parent: Optional[str] = None) -> None:
+        """
+        Parse inventory hosts
+
+        Arguments:
+            hosts: dict containing hosts; {host: data}
+            parent: optional parent of host
+
+        """
+        for host, data in hosts.items():
+            if is_host_range(host):
+                self.parse_host_range(host, data, parent)
+                continue
+            if self.limit_hosts is not None and host not in self.limit_hosts:
+                continue
+            data = data or {}
+            self.add(host, self.hosts)
+            if parent and parent != "defaults" and parent not in self.hosts[host]["groups"]:
+                self.hosts[host]["groups"].append(parent)
+
+            if self.lazy:
+                self.lazy_hosts.setdefault(host, []).append(data)
+                continue
+
+            vars_file_data = self.load_vars(host, is_host=True)
+
+            with self.stats.phase("normalize"):
+                self.normalize_data(self.hosts[host], data, vars_file_data)
+                self.map_nornir_vars(self.hosts[host])
+
+    def parse_host_range(
+        self, pattern: str, data: Optional[VarsDict], parent: Optional[str] = None
+    ) -> None:
+        """
+        Parse a host range pattern such as "leaf[001:512]"
+
+        Hosts of a range share a single record in `host_ranges` holding their groups and vars,
+        they are only materialized into individual hosts by `expand_host_ranges`. Hosts that have
+        host_vars, or are also defined on their own/in another range, are parsed as regular hosts.
+
+        Arguments:
+            pattern: the host range pattern
+            data: inline vars of the range
+            parent: optional parent of the range
+
+        """
+        data = data or {}
+        host_vars_index = self.get_vars_index(self.path, "host_vars")
+        conflicts = self.graph.range_conflicts if self.graph is not None else set()
+
+        hosts, individual_hosts = [], []
+        for host in expand_hostname_range(pattern):
+            if self.limit_hosts is not None and host not in self.limit_hosts:
+                continue
+            if host in conflicts or host in host_vars_index.files or host in host_vars_index.dirs:
+                individual_hosts.append(host)
+            else:
+                hosts.append(host)
+
+        if hosts:
+            if pattern not in self.host_ranges:
+                self.host_ranges[pattern] = {"hosts": hosts, "groups": [], "data": {}}
+            host_range = self.host_ranges[pattern]
+            if parent and parent != "defaults" and parent not in host_range["groups"]:
+                host_range["groups"].append(parent)
+            self.normalize_data(host_range, dict(data), {})
+            self.map_nornir_vars(host_range)
+
+        if individual_hosts:
+            self.parse_hosts({host: dict(data) for host in individual_hosts}, parent=parent)
+
+    def resolve_host(self, host: str) -> Dict[str, Any]:
+        """
+        Load the vars of a host deferred in lazy mode, return the parsed host
+
+        Inline vars of every occurrence of the host are applied in inventory order followed by its
+        host_vars, which yields the same result as the eager parse.
+
+        Arguments:
+            host: name of the host
+
+        """
+        sources = self.lazy_hosts.pop(host, None)
+        if sources is not None:
+            for data in sources:
+                self.normalize_data(self.hosts[host], data, {})
+            vars_file_data = self.load_vars(host, is_host=True)
+            self.normalize_data(self.hosts[host], {}, vars_file_data)
+            self.map_nornir_vars(self.hosts[host])
+            self._set_default_hostnames([host])
+        return cast(Dict[str, Any], self.hosts[host])
+
+    def load_vars(self, element: str, is_host: bool = True) -> VarsDict:
+        """
+        Return the group_vars/host_vars data of a group/host
+
+        Results are memoized in `vars_cache`, so a group/host referenced from several places in the
+        inventory only has its vars located and parsed once.
+
+        Arguments:
+            element: name of host or group being parsed
+            is_host: bool indicating if loading host vars or if false group vars
+
+        """
+        sub_dir = "host_vars" if is_host else "group_vars"
+
+        def _loader() -> VarsDict:
+            with self.stats.phase(sub_dir):
+                index = self.get_vars_index(self.path, sub_dir)
+                vars_file_data: VarsDict = {}
+                if element in index.files:
+                    vars_file_data = self.read_vars_file(
+                        element=element, path=self.path, is_host=is_host, is_dir=False
+                    )
+                elif element in index.dirs:
+                    vars_file_data = self.vars_cache.merge_files(index.get_dir_files(element))
+                return vars_file_data
+
+        return self.vars_cache.get_element(sub_dir, element, _loader)
+
+    def get_changed_elements(self, changed: Iterable[str]) -> Optional[Dict[str, Set[str]]]:
+        """
+        Map changed sources to the names of the groups/hosts whose vars they hold
+
+        Arguments:
+            changed: paths of the changed sources, see `get_sources`
+
+        Returns:
+            dict: "group_vars" and "host_vars" element names, None if the hosts file or a source
+                that can not be mapped to an element changed
+
+        """
+        hostsfile = str(Path(self.hostsfile).absolute())
+        elements: Dict[str, Set[str]] = {"group_vars": set(), "host_vars": set()}
+        # vars files are recorded by their resolved path, vars directories by their absolute path
+        vars_dirs = {}
+        for sub_dir in elements:
+            vars_dirs[os.path.join(self.path, sub_dir)] = sub_dir
+            vars_dirs[str(Path(self.path, sub_dir).resolve())] = sub_dir
+
+        for source in changed:
+            if source == hostsfile:
+                return None
+            for vars_dir, sub_dir in vars_dirs.items():
+                if source == vars_dir:
+                    index = self.vars_indexes.get(os.path.join(self.path, sub_dir))
+                    new_index = VarsIndex(os.path.join(self.path, sub_dir))
+                    for entries, new_entries in (
+                        (index.files if index else {}, new_index.files),
+                        (index.dirs if index else {}, new_index.dirs),
+                    ):
+                        elements[sub_dir].update(
+                            element
+                            for element in {*entries, *new_entries}
+                            if entries.get(element) != new_entries.get(element)
+                        )
+                    break
+                if source.startswith(vars_dir + os.sep):
+                    name, *sub_path = source[len(vars_dir) + 1 :].split(os.sep)
+                    elements[sub_dir].add(name)
+                    if not sub_path:
+                        # a vars file directly in the vars directory, named after its element
+                        elements[sub_dir].update(
+                            name[: -len(ext)]
+                            for ext in vars_files.VARS_FILENAME_EXTENSIONS
+                            if ext and name.endswith(ext)
+                        )
+                    break
+            else:
+                return None
+        return elements
+
+    def reparse(self, elements: Dict[str, Set[str]]) -> bool:
+        """
+        Re-parse the given groups/hosts after their vars files changed
+
+        The hosts file must not have changed since `parse`. Hosts of host ranges and hosts deferred
+        in lazy mode can not be re-parsed on their own, `parse` has to be run on a new parser then.
+
+        Arguments:
+            elements: "group_vars" and "host_vars" element names, see `get_changed_elements`
+
+        Returns:
+            bool: False if a full parse is needed, i.e. host ranges now inherit `ansible_host`
+
+        """
+        graph = cast(InventoryGraph, self.graph)
+        host_occurrences = {}
+        for host in elements["host_vars"]:
+            if host not in graph.host_parents or (
+                self.limit_hosts is not None and host not in self.limit_hosts
+            ):
+                continue
+            occurrences = self._get_host_occurrences(host)
+            if occurrences is None:
+                return False
+            host_occurrences[host] = occurrences
+
+        for sub_dir, names in elements.items():
+            if names:
+                self._invalidate_vars(sub_dir, names)
+
+        for group in elements["group_vars"]:
+            if group == "all":
+                self.defaults.clear()
+                self.defaults["data"] = {}
+                self.parse_group("defaults", graph.group_data["all"])
+            elif group in self.groups:
+                # a new record, keeping the position of the group
+                self.groups[group] = {"groups": [], "data": {}}
+                self.parse_group(group, graph.group_data[group], self._get_group_parents(group))
+                self.groups[group]["groups"].sort()
+
+        if self._get_inheriting_ranges():
+            return False
+        for host, occurrences in host_occurrences.items():
+            self.hosts[host] = {"groups": [], "data": {}}
+            self.default_hostnames.discard(host)
+            for group, data in occurrences:
+                self.parse_hosts({host: data}, parent=group if group != "all" else None)
+            self.hosts[host]["groups"].sort()
+        # hosts inherit the `ansible_host` of the groups re-parsed, or go back to their name
+        self._set_default_hostnames()
+        return True
+
+    def _invalidate_vars(self, sub_dir: str, names: Iterable[str]) -> None:
+        """
+        Forget the cached vars of groups/hosts and scan their vars directory again
+
+        Arguments:
+            sub_dir: vars directory of the elements; "group_vars" or "host_vars"
+            names: names of the groups/hosts
+
+        """
+        index = self.get_vars_index(self.path, sub_dir)
+        for name in names:
+            paths = index.invalidate(name)
+            if name in index.files:
+                paths.append(index.files[name])
+            self.vars_cache.invalidate(sub_dir, name, paths)
+        index.refresh()
+
+    def _get_host_occurrences(self, host: str) -> Optional[List[Tuple[str, Optional[VarsDict]]]]:
+        """
+        Return (group, inline vars) of every occurrence of a parsed host, in parse order
+
+        Arguments:
+            host: name of the host
+
+        Returns:
+            list: occurrences of the host, None if the host can not be re-parsed on its own as it
+                is not parsed yet, deferred in lazy mode or part of a host range
+
+        """
+        graph = cast(InventoryGraph, self.graph)
+        if host not in self.hosts or host in self.lazy_hosts or host in graph.range_conflicts:
+            return None
+        occurrences: List[Tuple[str, Optional[VarsDict]]] = []
+        for group in sorted(
+            graph.host_parents.get(host, {}), key=graph.group_positions.__getitem__
+        ):
+            if self.limit_groups is not None and group != "all" and group not in self.limit_groups:
+                continue
+            listed = False
+            for data in graph.group_data[group]:
+                hosts = data.get("hosts") or {}
+                if host in hosts:
+                    listed = True
+                    occurrences.append((group, hosts[host]))
+            if not listed:
+                return None
+        return occurrences
+
+    def get_vars_index(self, path: str, sub_dir: str) -> VarsIndex:
+        """
+        Return the (lazily built) index of the `sub_dir` vars directory of `path`
+
+        Arguments:
+            path: parent directory of inventory file
+            sub_dir: vars directory to index; "group_vars" or "host_vars"
+
+        """
+        vars_dir = os.path.join(path, sub_dir)
+        if vars_dir not in self.vars_indexes:
+            self.vars_indexes[vars_dir] = VarsIndex(vars_dir, stats=self.stats)
+        return self.vars_indexes[vars_dir]
+
+    def get_sources(self) -> Dict[str, Fingerprint]:
+        """
+        Return fingerprints of every source consumed so far: hosts file, vars dirs and vars files
+
+        Non-existing vars directories are included (with a `None` fingerprint) so that creating
+        them later is detected as a change as well.
+
+        """
+        sources = {str(Path(self.hostsfile).absolute()): self.hostsfile_fingerprint}
+        for index in self.vars_indexes.values():
+            sources.update(index.fingerprints)
+        sources.update(self.vars_cache.fingerprints)
+        return sources
+
+    def normalize_data(
+        self,
+        host_or_group: Dict[str, Any],
+        data: Dict[str, Any],
+        vars_data: Dict[str, Any],
+    ) -> None:
+        """
+        Parse inventory hosts
+
+        data and vars_data come from the inventory file(s) and are generally global/host/group vars
+        depending on which section of the inventory file is being currently parsed
+
+        Arguments:
+            host_or_group: dict of host or group data
+            data: dict of vars to parse
+            vars_data: dict of vars to parse
+
+        """
+        self.map_nornir_vars(data)
+        for k, v in data.items():
+            if k in RESERVED_FIELDS:
+                host_or_group[k] = v
+            else:
+                host_or_group["data"][k] = v
+        self.map_nornir_vars(vars_data)
+        for k, v in vars_data.items():
+            if k in RESERVED_FIELDS:
+                host_or_group[k] = v
+            else:
+                host_or_group["data"][k] = v
+        for field in RESERVED_FIELDS:
+            if field not in host_or_group:
+                if field == "connection_options":
+                    host_or_group[field] = {}
+                else:
+                    host_or_group[field] = None
+
+    def _get_layer(self, data: VarsDict) -> Dict[str, Any]:
+        """
+        Return a group record holding only the given vars, see `group_layers`
+
+        Arguments:
+            data: inline vars or group_vars of the group
+
+        """
+        layer: Dict[str, Any] = {"data": {}}
+        self.normalize_data(layer, dict(data), {})
+        return layer
+
+    def _get_hostname_inheritance(self) -> Callable[[List[str]], bool]:
+        """
+        Return a callable telling whether a host of the given groups inherits `ansible_host` from
+        them or from the defaults
+        """
+        if self.defaults.get("hostname") is not None:
+            return lambda groups: True
+        hostname_groups = {name for name, group in self.groups.items() if group.get("hostname")}
+        if not hostname_groups:
+            return lambda groups: False
+        flattener = VarsFlattener(self.groups, self.defaults)
+        return lambda groups: any(
+            hostname_groups & flattener.get_ancestors(group) for group in groups
+        )
+
+    def _get_inheriting_ranges(self) -> List[str]:
+        """Return the patterns of the host ranges inheriting `ansible_host`"""
+        inherits = self._get_hostname_inheritance()
+        return [
+            pattern
+            for pattern, host_range in self.host_ranges.items()
+            if host_range.get("hostname") is None and inherits(host_range["groups"])
+        ]
+
+    def _set_default_hostnames(self, hosts: Optional[Iterable[str]] = None) -> None:
+        """
+        Default the hostname of hosts not setting `ansible_host` to their name, like Ansible does
+
+        Runs once the groups are parsed: hosts of groups, or defaults, setting `ansible_host` get
+        no hostname and inherit it instead, the way they inherit the other connection fields.
+        Hosts deferred in lazy mode are defaulted once resolved.
+
+        Arguments:
+            hosts: optional names of the hosts to default, all hosts if not provided
+
+        """
+        inherits = self._get_hostname_inheritance()
+        for host in self.hosts if hosts is None else hosts:
+            record = self.hosts[host]
+            if host in self.lazy_hosts:
+                continue
+            hostname = None if inherits(record["groups"]) else host
+            if host not in self.default_hostnames:
+                if record.get("hostname") is not None:
+                    continue
+                self.default_hostnames.add(host)
+                record["hostname"] = hostname
+            elif record["hostname"] != hostname:
+                # a new record, so that reloads see the host changed
+                self.hosts[host] = {**record, "hostname": hostname}
+
+    def _expand_inheriting_ranges(self) -> None:
+        """Parse the hosts of host ranges inheriting `ansible_host` as individual hosts"""
+        for pattern in self._get_inheriting_ranges():
+            for host, data in expand_host_ranges({pattern: self.host_ranges.pop(pattern)}):
+                data["hostname"] = None
+                self.hosts[host] = data
+
+    def sort_groups(self) -> None:
+        """Sort group data"""
+        for host in self.hosts.values():
+            host["groups"].sort()
+
+        for host_range in self.host_ranges.values():
+            host_range["groups"].sort()
+
+        for name, group in self.groups.items():
+            if name == "defaults":
+                continue
+
+            group["groups"].sort()
+
+    def read_vars_file(
+        self, element: str, path: str, is_host: bool = True, is_dir: bool = False
+    ) -> VarsDict:
+        """
+        Read vars file data, return `VarsDict`
+
+        Arguments:
+            element: inventory element being parsed, i.e. name of host or group being parsed
+            path: parent directory of inventory file, or path of the vars file if `is_dir`
+            is_host: bool indicating if reading a host vars file or if false a group vars file
+            is_dir: bool indicating if variables are defined in a directory
+
+        """
+        if is_dir:
+            return self.vars_cache.get_file(path)
+
+        sub_dir = "host_vars" if is_host else "group_vars"
+        vars_file = self.get_vars_index(path, sub_dir).files.get(element)
+        if vars_file is not None:
+            return self.vars_cache.get_file(vars_file)
+        LOG.debug(
+            "AnsibleInventory: no vars file was found with the path %r "
+            "and one of the supported extensions: %s",
+            str(Path(path) / sub_dir / element),
+            vars_files.VARS_FILENAME_EXTENSIONS,
+        )
+        return {}
+
+    @staticmethod
+    def map_nornir_vars(obj: VarsDict) -> None:
+        """
+        Map ansible-specific variables such as host to nornir equivalent
+
+        Arguments:
+            obj: dict of variables being parsed to determine if any of them should be mapped to
+                nornir's "core" vars such as username/port
+
+        """
+        mappings = {
+            "ansible_host": "hostname",
+            "ansible_port": "port",
+            "ansible_user": "username",
+            "ansible_password": "password",
+        }
+        for ansible_var, nornir_var in mappings.items():
+            if ansible_var in obj:
+                obj[nornir_var] = obj.pop(ansible_var)
+
+    @staticmethod
+    def add(element: str, element_dict: Dict[str, VarsDict]) -> None:
+        """
+        Determine if host/group is already in vars dict, if not add the host/group
+
+        Arguments:
+            element: host or group being parsed
+            element_dict: dictionary representing host/group: vars mapping
+
+        """
+        if element not in element_dict:
+            element_dict[element] = {"groups": [], "data": {}}
+
+    def load_hosts_file(self) -> None:
+        """Parse host specific inventory files"""
+        raise NotImplementedError
+
+
+class INIParser(AnsibleParser):
+    @staticmethod
+    def normalize_value(value: str) -> Union[str, int]:
+        """
+        Convert integers as strings to actual integers, otherwise return original string
+
+        Arguments:
+            value: value to try to cast to int
+
+        """
+        try:
+            return int(value)
+
+        except (ValueError, TypeError):
+            return value
+
+    @staticmethod
+    def normalize_content(content: Optional[str]) -> VarsDict:
+        """
+        Normalize the `key=value` list of an INI host line into a `VarsDict`
+
+        Values may be quoted, i.e. `ansible_ssh_common_args="-o StrictHostKeyChecking=no"`, and
+        anything after an unquoted "#" is a comment.
+
+        Arguments:
+            content: string row from ini inventory file to parse, without the host name
+
+        """
+        result: VarsDict = {}
+
+        if not content:
+            return result
+
+        for option in shlex.split(content, comments=True):
+            key, sep, value = option.partition("=")
+            if not sep:
+                raise ValueError(f"expected key=value host variable assignment, got: {option}")
+            result[key] = INIParser.normalize_value(value)
+        return result
+
+    @staticmethod
+    def normalize_var(value: Optional[str]) -> Any:
+        """
+        Normalize the value of a `[group:vars]` line, quoted values are kept as strings
+
+        Arguments:
+            value: raw value to normalize
+
+        """
+        if value is None:
+            return None
+        value = value.strip()
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+            return value[1:-1]
+        return INIParser.normalize_value(value)
+
+    def normalize(self, lines: Iterable[str]) -> AnsibleGroupsDict:
+        """
+        Parent method to normalize INI inventory lines into Nornir friendly structure
+
+        Each line is tokenized exactly once, hosts defined before any section are added to "all"
+
+        Arguments:
+            lines: lines of the ini inventory file
+
+        """
+        # Dict[str, AnsibleGroupDataDict] does not work because of
+        # https://github.com/python/mypy/issues/5359
+        groups: Dict[str, Dict[str, Any]] = {}
+        all_group: Dict[str, Any] = {"children": groups}
+        section: Dict[str, Any] = {}
+        meta = "hosts"
+        in_section = False
+
+        for lineno, raw_line in enumerate(lines, start=1):
+            line = raw_line.strip()
+            if not line or line[0] in INI_COMMENT_PREFIXES:
+                continue
+
+            try:
+                if line[0] == "[":
+                    match = INI_SECTION_PATTERN.match(line)
+                    if match is None:
+                        raise ValueError(f"invalid section header: {line}")
+                    group_name, _, meta = match.group(1).strip().partition(":")
+                    meta = meta or "hosts"
+                    if meta not in ("hosts", "vars", "children"):
+                        raise ValueError(f"unknown section type: {meta}")
+                    group = all_group if group_name == "all" else groups.setdefault(group_name, {})
+                    section = group.setdefault(meta, {})
+                    in_section = True
+                    continue
+
+                if not in_section:
+                    section = all_group.setdefault("hosts", {})
+                    in_section = True
+
+                if meta == "hosts":
+                    host, *content = line.split(None, 1)
+                    host_vars = self.normalize_content(content[0] if content else None)
+                    section[host] = {**section[host], **host_vars} if host in section else host_vars
+                elif meta == "vars":
+                    match = INI_VAR_PATTERN.match(line)
+                    if match is None:
+                        section[line] = None
+                    else:
+                        section[match.group(1)] = self.normalize_var(match.group(2))
+                else:
+                    section[line.split()[0]] = {}
+            except ValueError as exc:
+                LOG.error("AnsibleInventory: %s:%s: %s", self.hostsfile, lineno, exc)
+                raise NornirNoValidInventoryError(
+                    f"AnsibleInventory: no valid inventory source(s) to parse. "
+                    f"Tried: {self.hostsfile}"
+                ) from exc
+
+        return cast(AnsibleGroupsDict, {"all": all_group})
+
+    def load_hosts_file(self) -> None:
+        """Parse host specific inventory files"""
+        with open(self.hostsfile, "r", encoding="utf-8") as f:
+            self.original_data = self.normalize(f)
+
+
+class YAMLParser(AnsibleParser):
+    def load_hosts_file(self) -> None:
+        """Parse host specific inventory files"""
+        with open(self.hostsfile, "r", encoding="utf-8") as f:
+            try:
+                self.original_data = cast(AnsibleGroupsDict, load_yaml(f, self.vault))
+                self.vault_data = loaded_vault_data()
+            except YAMLError as exc:
+                LOG.error("AnsibleInventory: file %r is not INI or YAML file", self.hostsfile)
+                raise NornirNoValidInventoryError(
+                    f"AnsibleInventory: no valid inventory source(s) to parse. "
+                    f"Tried: {self.hostsfile}"
+                ) from exc
+
+
+def get_parser(hostsfile: str, **kwargs: Any) -> AnsibleParser:
+    """
+    Return the parser matching the format of the provided inventory file
+
+    Arguments:
+        hostsfile: string of hostsfile to parse
+        kwargs: extra arguments passed to the parser, see `AnsibleParser`
+
+    """
+    if sniff_format(hostsfile) == "ini":
+        return INIParser(hostsfile, **kwargs)
+    return YAMLParser(hostsfile, **kwargs)
+
+
+def sniff_format(hostsfile: str) -> str:
+    """
+    Detect if an inventory file is an INI or YAML file from its first significant line
+
+    Arguments:
+        hostsfile: string of hostsfile to parse
+
+    Returns:
+        str: "ini" or "yaml"
+
+    """
+    with open(hostsfile, "r", encoding="utf-8") as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if not line or line[0] in INI_COMMENT_PREFIXES:
+                continue
+            if line[0] == "[":
+                return "ini"
+            if line.startswith(("---", "%", "{")) or YAML_KEY_PATTERN.match(line):
+                return "yaml"
+            return "ini"
+    return "ini"
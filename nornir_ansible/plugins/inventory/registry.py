@@ -0,0 +1,306 @@
+"""nornir_ansible.inventory.registry"""
+
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Union
+
+from nornir.core.inventory import Inventory
+
+from nornir_ansible.plugins.inventory.ansible import AnsibleInventory
+from nornir_ansible.plugins.inventory.elements import freeze
+
+RegistryKey = Tuple[Tuple[str, ...], Hashable]
+LOG = logging.getLogger(__name__)
+
+
+def get_size(value: Any) -> int:
+    """
+    Return an estimate of the memory used by inventory data, nested values included
+
+    Objects shared by several records are only counted once.
+
+    Arguments:
+        value: parsed hosts, groups, defaults...
+
+    """
+    size = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if id(value) in seen:
+            continue
+        seen.add(id(value))
+        size += sys.getsizeof(value)
+        if isinstance(value, (str, int, float, bool, type(None))):
+            continue
+        if hasattr(value, "items"):
+            for k, v in value.items():
+                stack.append(k)
+                stack.append(v)
+        elif isinstance(value, (list, tuple, set, frozenset)):
+            stack.extend(value)
+    return size
+
+
+class RegistryEntry:
+    __slots__ = ("inventory", "size", "checked")
+
+    def __init__(self, inventory: AnsibleInventory, size: int) -> None:
+        """
+        Inventory shared through an `InventoryRegistry`
+
+        Arguments:
+            inventory: the parsed inventory
+            size: estimated memory used by the inventory, see `get_size`
+
+        """
+        self.inventory = inventory
+        self.size = size
+        # time.monotonic() of the last check of the sources
+        self.checked = time.monotonic()
+
+
+class RegistryLock:
+    __slots__ = ("lock", "users")
+
+    def __init__(self) -> None:
+        """
+        Lock serializing the parse of an inventory of an `InventoryRegistry`, counting the threads
+        holding or waiting on it so that it is only dropped once none does
+        """
+        self.lock = threading.Lock()
+        self.users = 0
+
+
+class InventoryRegistry:
+    def __init__(
+        self,
+        max_entries: Optional[int] = 8,
+        max_bytes: Optional[int] = None,
+        check_interval: float = 0.0,
+    ) -> None:
+        """
+        Thread safe registry sharing parsed inventories between the nornir inventories of a process
+
+        Inventories are keyed by their resolved paths and `AnsibleInventory` options, parsed once
+        and handed out; once one of their sources (hosts files, vars files and directories)
+        changes, only the changed sources are parsed again, see `AnsibleInventory.reload`. The
+        least recently used inventories are evicted past `max_entries` or `max_bytes`; an
+        inventory is parsed at most once at a time, other threads asking for it wait for it to be
+        parsed.
+
+        Arguments:
+            max_entries: optional max number of inventories kept
+            max_bytes: optional max estimated memory used by the inventories kept, their parsed
+                records and the state their parsers keep, see `get_size`; the most recently used
+                inventory is always kept
+            check_interval: seconds during which an inventory is handed out again without
+                checking whether its sources changed
+
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.check_interval = check_interval
+        self._entries: "OrderedDict[RegistryKey, RegistryEntry]" = OrderedDict()
+        # locks of the inventories being handed out, dropped once no thread uses them
+        self._key_locks: Dict[RegistryKey, RegistryLock] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def size(self) -> int:
+        """Estimated memory used by the inventories kept"""
+        with self._lock:
+            return sum(entry.size for entry in self._entries.values())
+
+    @staticmethod
+    def get_key(hostsfile: Union[str, List[str]], options: Dict[str, Any]) -> RegistryKey:
+        """
+        Return the registry key of an inventory
+
+        Arguments:
+            hostsfile: Path to valid Ansible inventory, or list of inventory files and/or
+                directories
+            options: `AnsibleInventory` options
+
+        """
+        paths = [hostsfile] if isinstance(hostsfile, str) else hostsfile
+        try:
+            frozen_options = freeze(dict(sorted(options.items())))
+        except TypeError as exc:
+            raise ValueError(f"AnsibleInventory: unhashable registry options: {exc}") from exc
+        return tuple(str(Path(path).resolve()) for path in paths), frozen_options
+
+    def get(self, hostsfile: Union[str, List[str]] = "hosts", **options: Any) -> AnsibleInventory:
+        """
+        Return the shared `AnsibleInventory` of an inventory, parsed if needed
+
+        Arguments:
+            hostsfile: Path to valid Ansible inventory, or list of inventory files and/or
+                directories
+            options: `AnsibleInventory` options
+
+        """
+        key = self.get_key(hostsfile, options)
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, RegistryLock())
+            key_lock.users += 1
+        try:
+            with key_lock.lock:
+                inventory = self._get_valid_inventory(key)
+                if inventory is not None:
+                    return inventory
+                inventory = AnsibleInventory(hostsfile, **options)
+                entry = RegistryEntry(inventory, get_size(_get_parsed_data(inventory)))
+                with self._lock:
+                    self._entries[key] = entry
+                    self._evict()
+                LOG.debug("AnsibleInventory: registered %s (%d bytes)", key[0], entry.size)
+                return inventory
+        finally:
+            with self._lock:
+                key_lock.users -= 1
+                if not key_lock.users:
+                    del self._key_locks[key]
+
+    def _get_valid_inventory(self, key: RegistryKey) -> Optional[AnsibleInventory]:
+        """
+        Return a registered inventory, reloaded if its sources changed, None if there is none
+
+        The lock of the key must be held. Only the sources that changed are parsed again, see
+        `AnsibleInventory.reload`; an inventory failing to reload is dropped.
+
+        Arguments:
+            key: registry key of the inventory
+
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        now = time.monotonic()
+        if now - entry.checked < self.check_interval:
+            return entry.inventory
+        changed = entry.inventory.get_changed_sources()
+        if changed:
+            LOG.debug("AnsibleInventory: reloading %s, changed sources: %s", key[0], changed)
+            try:
+                entry.inventory.reload()
+            except Exception:
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                raise
+            entry.size = get_size(_get_parsed_data(entry.inventory))
+            with self._lock:
+                self._evict()
+        entry.checked = now
+        return entry.inventory
+
+    def _evict(self) -> None:
+        """Drop the least recently used inventories past the bounds, `_lock` must be held"""
+        size = sum(entry.size for entry in self._entries.values())
+        while len(self._entries) > 1 and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries)
+            or (self.max_bytes is not None and size > self.max_bytes)
+        ):
+            key, entry = self._entries.popitem(last=False)
+            size -= entry.size
+            LOG.debug("AnsibleInventory: evicted %s from the registry", key[0])
+
+    def load(self, hostsfile: Union[str, List[str]] = "hosts", **options: Any) -> Inventory:
+        """
+        Return a new nornir Inventory built from the shared `AnsibleInventory` of an inventory
+
+        Every call returns its own hosts, groups and defaults with a copy of their top level vars,
+        nested vars are shared by all the nornir inventories and must be copied before being
+        modified, see `AnsibleInventory.load`.
+
+        Arguments:
+            hostsfile: Path to valid Ansible inventory, or list of inventory files and/or
+                directories
+            options: `AnsibleInventory` options
+
+        """
+        return self.get(hostsfile, **options).load(copy_data=True)
+
+    def invalidate(self, hostsfile: Optional[Union[str, List[str]]] = None) -> int:
+        """
+        Drop registered inventories so that they are parsed again, return how many were dropped
+
+        Arguments:
+            hostsfile: optional inventory to drop the inventories of, whatever their options;
+                all inventories are dropped if not provided
+
+        """
+        paths = None
+        if hostsfile is not None:
+            paths = self.get_key(hostsfile, {})[0]
+        with self._lock:
+            keys = [key for key in self._entries if paths is None or key[0] == paths]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+
+def _get_parsed_data(inventory: AnsibleInventory) -> Tuple[Any, ...]:
+    """
+    Return the data an inventory keeps, to estimate its size: the parsed records, and the hosts
+    file data, vars files data, vars directory indexes and group graph its parsers keep to reload
+    and resolve lazy hosts
+    """
+    data: List[Any] = [inventory.hosts, inventory.groups, inventory.defaults, inventory.host_ranges]
+    for source in inventory.inventory_sources:
+        data.extend((source.inventory, source.fingerprints))
+        parser = source.parser
+        if parser is None:
+            continue
+        vars_cache = parser.vars_cache
+        data.extend(
+            (
+                parser.original_data,
+                parser.lazy_hosts,
+                vars_cache.files,
+                vars_cache.elements,
+                vars_cache.fingerprints,
+            )
+        )
+        if parser.graph is not None:
+            data.append(vars(parser.graph))
+        data.extend(vars(index) for index in parser.vars_indexes.values())
+    return tuple(data)
+
+
+# registry shared by the `SharedAnsibleInventory` plugins of the process
+INVENTORY_REGISTRY = InventoryRegistry()
+
+
+class SharedAnsibleInventory:
+    def __init__(self, hostsfile: Union[str, List[str]] = "hosts", **options: Any) -> None:
+        """
+        Ansible Inventory plugin sharing the parsed inventory between the nornir objects of a
+        process through `INVENTORY_REGISTRY`
+
+        The inventory is only parsed again once its sources change, every `load` returns its own
+        nornir hosts, groups and defaults, see `InventoryRegistry.load`.
+
+        Arguments:
+            hostsfile: Path to valid Ansible inventory, or list of inventory files and/or
+                directories
+            options: `AnsibleInventory` options
+
+        """
+        self.hostsfile = hostsfile
+        self.options = options
+
+    def load(self) -> Inventory:
+        """Return nornir Inventory object."""
+        return INVENTORY_REGISTRY.load(self.hostsfile, **self.options)
@@ -0,0 +1,234 @@
+"""nornir_ansible.inventory.script"""
+
+import hashlib
+import json
+import logging
+import os
+import subprocess  # nosec
+import time
+from pathlib import Path
+from typing import Any, Dict, List, NoReturn, Optional
+
+from nornir.core.exceptions import NornirNoValidInventoryError
+
+from nornir_ansible.plugins.inventory.cache import write_cache_file
+from nornir_ansible.plugins.inventory.models import AnsibleGroupsDict, VarsDict
+from nornir_ansible.plugins.inventory.parser import AnsibleParser
+
+SCRIPT_CACHE_VERSION = 1
+# first bytes of files run as dynamic inventory scripts, if they are executable
+SCRIPT_MAGICS = (b"#!", b"\x7fELF")
+LOG = logging.getLogger(__name__)
+
+
+def is_inventory_script(path: str) -> bool:
+    """
+    Return True if `path` is a dynamic inventory script: an executable script or binary
+
+    Arguments:
+        path: path of the inventory source
+
+    """
+    if not os.path.isfile(path) or not os.access(path, os.X_OK):
+        return False
+    with open(path, "rb") as f:
+        return f.read(4).startswith(SCRIPT_MAGICS)
+
+
+class ScriptParser(AnsibleParser):
+    def __init__(
+        self,
+        hostsfile: str,
+        *,
+        timeout: float = 30.0,
+        cache_dir: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        Parse the output of Ansible dynamic inventory scripts
+
+        The script is run with `--list` and its JSON output decoded in one pass. Host vars are
+        taken from `_meta.hostvars` when the script provides it, otherwise the script is run with
+        `--host <name>` for every host. group_vars/host_vars next to the script apply like for
+        any other inventory file.
+
+        Arguments:
+            hostsfile: path of the executable inventory script
+            timeout: seconds every run of the script may take
+            cache_dir: optional directory to cache the output of the script in
+            cache_ttl: seconds the cached output is used for instead of running the script
+                again, the output is not cached if not set; the cache is also invalidated if the
+                script itself changes
+            kwargs: extra arguments passed to the parser, see `AnsibleParser`
+
+        """
+        self.timeout = timeout
+        self.cache_dir = cache_dir
+        self.cache_ttl = cache_ttl
+        super().__init__(hostsfile, **kwargs)
+
+    def load_hosts_file(self) -> None:
+        """Run the inventory script, or use its cached output"""
+        data = self.load_cached_output()
+        if data is None:
+            data = self.run("--list")
+            if not isinstance(data, dict):
+                self.raise_error(f"returned {type(data).__name__} instead of a JSON object")
+            meta = data.setdefault("_meta", {})
+            if not isinstance(meta.get("hostvars"), dict):
+                meta["hostvars"] = {host: self.run("--host", host) for host in self.get_hosts(data)}
+            self.dump_cached_output(data)
+        self.original_data = self.get_groups(data)
+
+    def run(self, *args: str) -> Any:
+        """
+        Run the inventory script with `args`, return its decoded JSON output
+
+        Arguments:
+            args: arguments of the script, i.e. "--list"
+
+        """
+        script = str(Path(self.hostsfile).absolute())
+        try:
+            result = subprocess.run(  # nosec
+                [script, *args],
+                capture_output=True,
+                timeout=self.timeout,
+                cwd=os.path.dirname(script),
+                check=False,
+            )
+        except subprocess.TimeoutExpired as exc:
+            self.raise_error(f"timed out after {self.timeout}s", exc)
+        except OSError as exc:
+            self.raise_error(f"could not be run: {exc}", exc)
+        if result.returncode != 0:
+            stderr = result.stderr.decode("utf-8", errors="replace").strip()
+            self.raise_error(f"exited with status {result.returncode}: {stderr}")
+        try:
+            return json.loads(result.stdout)
+        except ValueError as exc:
+            self.raise_error(f"did not output valid JSON: {exc}", exc)
+
+    def raise_error(self, message: str, exc: Optional[BaseException] = None) -> NoReturn:
+        """
+        Log and raise an error of the inventory script
+
+        Arguments:
+            message: description of the error
+            exc: optional exception the error originates from
+
+        """
+        LOG.error("AnsibleInventory: inventory script %r %s", self.hostsfile, message)
+        raise NornirNoValidInventoryError(
+            f"AnsibleInventory: inventory script {self.hostsfile} {message}"
+        ) from exc
+
+    @staticmethod
+    def get_hosts(data: Dict[str, Any]) -> List[str]:
+        """
+        Return the hosts of the groups of `--list` output, in order of first occurrence
+
+        Arguments:
+            data: decoded `--list` output
+
+        """
+        hosts: Dict[str, None] = {}
+        for group, group_data in data.items():
+            if group == "_meta":
+                continue
+            if isinstance(group_data, dict):
+                group_data = group_data.get("hosts")
+            hosts.update(dict.fromkeys(group_data or []))
+        return list(hosts)
+
+    @staticmethod
+    def get_groups(data: Dict[str, Any]) -> AnsibleGroupsDict:
+        """
+        Convert `--list` output into the nested groups structure of YAML inventories
+
+        Groups listed as children of several groups share a single dict, so they are only parsed
+        once. Groups that are not the child of any group are children of "all".
+
+        Arguments:
+            data: decoded `--list` output, with `_meta.hostvars`
+
+        """
+        hostvars: Dict[str, Optional[VarsDict]] = data["_meta"]["hostvars"]
+        groups: Dict[str, Any] = {"all": {"hosts": {}, "vars": {}, "children": {}}}
+        children = set()
+        for group, group_data in data.items():
+            if group == "_meta":
+                continue
+            if not isinstance(group_data, dict):
+                # legacy format, a list of hosts
+                group_data = {"hosts": group_data}
+            node = groups.setdefault(group, {"hosts": {}, "vars": {}, "children": {}})
+            for host in group_data.get("hosts") or []:
+                node["hosts"][host] = dict(hostvars.get(host) or {})
+            node["vars"].update(group_data.get("vars") or {})
+            for child in group_data.get("children") or []:
+                if child == "all":
+                    continue
+                children.add(child)
+                node["children"][child] = groups.setdefault(
+                    child, {"hosts": {}, "vars": {}, "children": {}}
+                )
+        for group, node in groups.items():
+            if group != "all" and group not in children:
+                groups["all"]["children"][group] = node
+        return {"all": groups["all"]}
+
+    def get_cache_path(self) -> Optional[Path]:
+        """Return the path of the cached output of the script, None if it is not cached"""
+        if self.cache_dir is None or not self.cache_ttl:
+            return None
+        script = str(Path(self.hostsfile).absolute())
+        digest = hashlib.sha1(script.encode("utf-8")).hexdigest()  # nosec
+        return Path(self.cache_dir) / f"nornir_ansible_script_{digest}.json"
+
+    def load_cached_output(self) -> Optional[Dict[str, Any]]:
+        """Return the cached output of the script if it is still valid, None otherwise"""
+        path = self.get_cache_path()
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            LOG.warning("AnsibleInventory: ignoring unreadable cache file %r: %s", str(path), exc)
+            return None
+
+        fingerprint = self.hostsfile_fingerprint
+        if (
+            cached.get("version") != SCRIPT_CACHE_VERSION
+            or cached.get("script") != str(Path(self.hostsfile).absolute())
+            or cached.get("fingerprint") != (list(fingerprint) if fingerprint else None)
+            or time.time() - cached.get("time", 0) > float(self.cache_ttl or 0)
+        ):
+            return None
+        LOG.debug("AnsibleInventory: using cached output of inventory script %r", self.hostsfile)
+        return dict(cached["data"])
+
+    def dump_cached_output(self, data: Dict[str, Any]) -> None:
+        """
+        Cache the output of the script
+
+        Arguments:
+            data: decoded `--list` output, with `_meta.hostvars`
+
+        """
+        path = self.get_cache_path()
+        if path is None:
+            return
+        fingerprint = self.hostsfile_fingerprint
+        cached = {
+            "version": SCRIPT_CACHE_VERSION,
+            "script": str(Path(self.hostsfile).absolute()),
+            "fingerprint": list(fingerprint) if fingerprint else None,
+            "time": time.time(),
+            "data": data,
+        }
+        write_cache_file(path, json.dumps(cached).encode("utf-8"))
@@ -0,0 +1,454 @@
+"""nornir_ansible.inventory.sources"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+from nornir_ansible.plugins.inventory.cache import InventoryCache, get_fingerprint
+from nornir_ansible.plugins.inventory.compact import compact_inventory
+from nornir_ansible.plugins.inventory.elements import expand_host_ranges
+from nornir_ansible.plugins.inventory.models import Fingerprint, GroupLayers, ProgressCallback
+from nornir_ansible.plugins.inventory.parser import AnsibleParser, get_parser
+from nornir_ansible.plugins.inventory.script import ScriptParser, is_inventory_script
+from nornir_ansible.plugins.inventory.stats import LoadStats
+from nornir_ansible.plugins.inventory.vars_files import VarsCache
+
+LOG = logging.getLogger(__name__)
+
+# entries of inventory directories that are not inventory files, same defaults as Ansible
+INVENTORY_IGNORE_NAMES = ("group_vars", "host_vars", "vars_plugins")
+INVENTORY_IGNORE_EXTS = (
+    ".pyc",
+    ".pyo",
+    ".swp",
+    ".bak",
+    "~",
+    ".rpm",
+    ".md",
+    ".txt",
+    ".rst",
+    ".orig",
+    ".ini",
+    ".cfg",
+    ".retry",
+)
+
+
+def get_inventory_files(
+    hostsfile: Union[str, Sequence[str]], dirs: Optional[Dict[str, Fingerprint]] = None
+) -> List[Tuple[str, Optional[str]]]:
+    """
+    Return the inventory files of inventory sources, with the directory holding their vars
+
+    Directories are walked recursively like Ansible does: entries sorted by name, hidden entries,
+    vars directories and files with an extension of `INVENTORY_IGNORE_EXTS` skipped. Vars of files
+    found in subdirectories are resolved relative to the directory given as source.
+
+    Arguments:
+        hostsfile: path or list of paths of inventory files and/or directories
+        dirs: optional dict the fingerprints of the walked directories are recorded in
+
+    Returns:
+        list: (inventory file, vars path) tuples, the vars path is None when it is the directory
+            of the inventory file
+
+    """
+    files: List[Tuple[str, Optional[str]]] = []
+    for source in [hostsfile] if isinstance(hostsfile, str) else hostsfile:
+        if os.path.isdir(source):
+            _walk_inventory_dir(source, source, files, dirs)
+        else:
+            files.append((source, None))
+    return files
+
+
+def _walk_inventory_dir(
+    path: str,
+    top: str,
+    files: List[Tuple[str, Optional[str]]],
+    dirs: Optional[Dict[str, Fingerprint]],
+) -> None:
+    """
+    Append the inventory files of the inventory directory `path` to `files`
+
+    Arguments:
+        path: directory to walk
+        top: inventory directory given as source
+        files: list of (inventory file, vars path) to update
+        dirs: optional dict the fingerprints of the walked directories are recorded in
+
+    """
+    if dirs is not None:
+        dirs[str(Path(path).absolute())] = get_fingerprint(path)
+    with os.scandir(path) as scan:
+        entries = sorted(scan, key=lambda entry: entry.name)
+    for entry in entries:
+        if (
+            entry.name.startswith(".")
+            or entry.name in INVENTORY_IGNORE_NAMES
+            or entry.name.endswith(INVENTORY_IGNORE_EXTS)
+        ):
+            continue
+        if entry.is_dir():
+            _walk_inventory_dir(entry.path, top, files, dirs)
+        elif entry.is_file():
+            files.append((entry.path, os.path.abspath(top) if path != top else None))
+
+
+def merge_inventories(inventories: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge parsed inventories like Ansible merges its inventory sources
+
+    Hosts and groups defined in several inventories belong to the groups of every definition and
+    get the vars of the later inventories over the earlier ones; so do the defaults. A single
+    inventory is returned as is, records only defined in one inventory are shared, not copied.
+    Host ranges having hosts defined in another inventory are expanded into individual hosts.
+
+    Arguments:
+        inventories: parsed "hosts", "groups", "defaults", "host_ranges", "group_priorities" and
+            "group_layers" in source order
+
+    """
+    if len(inventories) == 1:
+        return inventories[0]
+
+    merged: Dict[str, Any] = {
+        "hosts": {},
+        "groups": {},
+        "defaults": {"data": {}},
+        "host_ranges": {},
+        "group_priorities": {},
+    }
+    seen: Set[str] = set()
+    shared: Set[str] = set()
+    for inventory in inventories:
+        names = [*inventory["hosts"]]
+        for host_range in inventory["host_ranges"].values():
+            names.extend(host_range["hosts"])
+        shared.update(name for name in names if name in seen)
+        seen.update(names)
+
+    copied: Set[Tuple[str, str]] = set()
+    for inventory in inventories:
+        merge_element(merged["defaults"], inventory["defaults"])
+        hosts = inventory["hosts"].items()
+        for pattern, host_range in inventory["host_ranges"].items():
+            if shared.isdisjoint(host_range["hosts"]):
+                merged["host_ranges"][pattern] = host_range
+            else:
+                hosts = [*hosts, *expand_host_ranges({pattern: host_range})]
+        for kind, elements in (("hosts", hosts), ("groups", inventory["groups"].items())):
+            for name, data in elements:
+                if name not in merged[kind]:
+                    merged[kind][name] = data
+                    continue
+                if (kind, name) not in copied:
+                    copied.add((kind, name))
+                    merged[kind][name] = merge_element({}, merged[kind][name])
+                merge_element(merged[kind][name], data)
+        merged["group_priorities"].update(inventory["group_priorities"])
+    merged["group_layers"] = merge_group_layers(inventories)
+    return merged
+
+
+def merge_group_layers(inventories: List[Dict[str, Any]]) -> GroupLayers:
+    """
+    Merge the inline vars and group_vars of the groups of several inventories apart
+
+    Arguments:
+        inventories: parsed inventories in source order, see `merge_inventories`
+
+    """
+    merged: GroupLayers = {}
+    for name in {name for inventory in inventories for name in inventory["group_layers"]}:
+        inline: Dict[str, Any] = {}
+        group_vars: Dict[str, Any] = {}
+        for inventory in inventories:
+            record = inventory["defaults"] if name == "all" else inventory["groups"].get(name)
+            if record is not None:
+                layers = inventory["group_layers"].get(name, (record, {}))
+                merge_element(inline, layers[0])
+                merge_element(group_vars, layers[1])
+        merged[name] = (inline, group_vars)
+    return merged
+
+
+def merge_element(dest: Dict[str, Any], source: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Merge a parsed host, group or defaults into `dest`, return `dest`
+
+    Arguments:
+        dest: record to update, its "groups", "data" and "connection_options" are replaced
+        source: record to merge, left untouched
+
+    """
+    for key, value in source.items():
+        if key == "groups":
+            dest["groups"] = sorted({*dest.get("groups", ()), *value})
+        elif key in ("data", "connection_options"):
+            dest[key] = {**(dest.get(key) or {}), **(value or {})}
+        else:
+            dest[key] = value
+    return dest
+
+
+def parse_sources(
+    sources: List["InventorySource"],
+    stats: LoadStats,
+    progress_callback: Optional[ProgressCallback] = None,
+) -> None:
+    """
+    Parse inventory sources, concurrently if there are more than one
+
+    Arguments:
+        sources: sources to parse
+        stats: `LoadStats` to record phase timings and file reads in
+        progress_callback: optional callable called with "sources" after every source parsed
+
+    """
+    if len(sources) == 1:
+        sources[0].parse(stats)
+        if progress_callback is not None:
+            progress_callback("sources", 1, 1)
+        return
+    with ThreadPoolExecutor(max_workers=min(32, len(sources))) as executor:
+        futures = [executor.submit(source.parse, stats) for source in sources]
+        for done, future in enumerate(as_completed(futures), 1):
+            # raise the first error
+            future.result()
+            if progress_callback is not None:
+                progress_callback("sources", done, len(sources))
+
+
+class InventorySource:
+    def __init__(
+        self,
+        hostsfile: str,
+        vars_path: Optional[str] = None,
+        *,
+        cache_dir: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None,
+        script_timeout: float = 30.0,
+        script_cache_ttl: Optional[float] = None,
+        compact: bool = False,
+    ) -> None:
+        """
+        A single inventory file, parsed, cached and reloaded on its own
+
+        Executable inventory files are run as dynamic inventory scripts, see `ScriptParser`. The
+        parsed inventory of a script is never cached as its output changes without the script
+        changing, the output of the script itself is cached for `script_cache_ttl` instead.
+
+        Arguments:
+            hostsfile: path of the inventory file
+            vars_path: optional directory holding its group_vars/host_vars, see `AnsibleParser`
+            cache_dir: optional directory to cache the parsed inventory in, see `InventoryCache`
+            options: extra arguments passed to the parser, see `AnsibleParser`
+            script_timeout: seconds a dynamic inventory script may run
+            script_cache_ttl: optional seconds the output of a dynamic inventory script is cached
+                in `cache_dir` for
+            compact: replace the parsed records by compact ones, see `compact_inventory`
+
+        """
+        self.hostsfile = hostsfile
+        self.vars_path = vars_path
+        self.cache_dir = cache_dir
+        self.options: Dict[str, Any] = options or {}
+        self.script_timeout = script_timeout
+        self.script_cache_ttl = script_cache_ttl
+        self.is_script = is_inventory_script(hostsfile)
+        self.compact = compact
+        self.parser: Optional[AnsibleParser] = None
+        self.inventory: Dict[str, Any] = {}
+        # fingerprints of the parsed sources, host vars of lazy hosts are added once loaded
+        self.fingerprints: Dict[str, Fingerprint] = {}
+
+    def get_cache(self) -> Optional[InventoryCache]:
+        """Return the on-disk cache of the source, None if no `cache_dir` is set"""
+        if self.cache_dir is None or self.is_script:
+            return None
+        shard = None
+        if self.options.get("shard_index") is not None:
+            shard = (
+                self.options["shard_index"],
+                self.options.get("shard_count", 1),
+                self.options.get("shard_by", "host"),
+            )
+        return InventoryCache(
+            self.hostsfile,
+            self.cache_dir,
+            limit=self.options.get("limit"),
+            vars_path=self.vars_path,
+            shard=shard,
+        )
+
+    def parse(self, stats: LoadStats, vars_cache: Optional[VarsCache] = None) -> None:
+        """
+        Parse the inventory file, or load it from the cache if it did not change
+
+        The inventory is stored as a dict of "hosts", "groups", "defaults", "host_ranges",
+        "group_priorities" and "group_layers" in `inventory`, `parser` is None if it was loaded
+        from the cache.
+
+        Arguments:
+            stats: `LoadStats` to record phase timings and file reads in
+            vars_cache: optional `VarsCache` of a previous parse, see `AnsibleParser`
+
+        """
+        cache = self.get_cache()
+        if cache is not None:
+            with stats.phase("cache_load"):
+                cached = cache.load()
+            if cached is not None:
+                self.parser = None
+                self.inventory = cached
+                self.fingerprints = cached["sources"]
+                self.compact_inventory(stats)
+                return
+
+        parser: AnsibleParser
+        if self.is_script:
+            parser = ScriptParser(
+                self.hostsfile,
+                timeout=self.script_timeout,
+                cache_dir=self.cache_dir,
+                cache_ttl=self.script_cache_ttl,
+                stats=stats,
+                vars_cache=vars_cache,
+                vars_path=self.vars_path,
+                **self.options,
+            )
+        else:
+            parser = get_parser(
+                self.hostsfile,
+                stats=stats,
+                vars_cache=vars_cache,
+                vars_path=self.vars_path,
+                **self.options,
+            )
+        parser.parse()
+        self.parser = parser
+        self.inventory = {
+            "hosts": parser.hosts,
+            "groups": parser.groups,
+            "defaults": parser.defaults,
+            "host_ranges": parser.host_ranges,
+            "group_priorities": parser.group_priorities,
+            "group_layers": parser.group_layers,
+        }
+        self.fingerprints = parser.get_sources()
+        # a lazily parsed inventory is incomplete, only fully parsed inventories are cached
+        if cache is not None and not parser.lazy:
+            with stats.phase("cache_dump"):
+                self.dump_cache(cache)
+        self.compact_inventory(stats)
+
+    def compact_inventory(self, stats: LoadStats) -> None:
+        """
+        Replace the parsed records by compact ones if `compact` is set
+
+        Arguments:
+            stats: `LoadStats` to record the phase timing in
+
+        """
+        if self.compact:
+            with stats.phase("compact"):
+                compact_inventory(self.inventory)
+
+    def release(self) -> None:
+        """
+        Release the parser and its raw inventory data, vars files data and indexes
+
+        The parsed records and fingerprints are kept, a reload of the source parses it again from
+        scratch. Sources with hosts deferred in lazy mode keep their parser to load them.
+
+        """
+        if self.parser is not None and not self.parser.lazy_hosts:
+            self.parser = None
+
+    def get_changed_sources(self) -> List[str]:
+        """Return the sources (hosts file, vars files and directories) changed since the parse"""
+        sources = self.fingerprints
+        if self.parser is not None and self.parser.lazy:
+            sources = {**self.parser.get_sources(), **sources}
+        return [source for source, fp in sources.items() if get_fingerprint(source) != fp]
+
+    def reload(self, stats: LoadStats) -> Optional[Dict[str, Set[str]]]:
+        """
+        Parse the sources that changed since the inventory file was parsed
+
+        If only vars files changed, only the groups/hosts they belong to are parsed again.
+        Otherwise the whole inventory file is parsed again, vars files that did not change are
+        not read again though.
+
+        Arguments:
+            stats: `LoadStats` to record phase timings and file reads in
+
+        Returns:
+            dict: "group_vars" and "host_vars" names of the elements whose vars files changed,
+                None if the hosts file changed, see `AnsibleParser.get_changed_elements`
+
+        """
+        changed = self.get_changed_sources()
+        parser = self.parser
+        elements = parser.get_changed_elements(changed) if parser is not None else None
+        if parser is None or elements is None or parser.lazy:
+            self.parse(stats, vars_cache=parser.vars_cache if parser is not None else None)
+            return elements
+
+        hosts, groups, defaults = dict(parser.hosts), dict(parser.groups), dict(parser.defaults)
+        try:
+            reparsed = parser.reparse(elements)
+        except Exception:
+            # restore the records a failed re-parse may have reset, retried next reload
+            parser.hosts.update(hosts)
+            parser.groups.update(groups)
+            parser.defaults.clear()
+            parser.defaults.update(defaults)
+            raise
+        if not reparsed:
+            self.parse(stats, vars_cache=parser.vars_cache)
+            return elements
+
+        self.fingerprints = parser.get_sources()
+        cache = self.get_cache()
+        if cache is not None:
+            self.dump_cache(cache)
+        self.compact_inventory(stats)
+        return elements
+
+    def dump_cache(self, cache: InventoryCache) -> None:
+        """
+        Store the parsed inventory in the cache, unless it holds vault encrypted data
+
+        Decrypted vault data is never written to disk, nor handed to a later run that may not
+        have the vault password; such inventories are parsed again by every run.
+
+        Arguments:
+            cache: cache of the source, see `get_cache`
+
+        """
+        parser = self.parser
+        if parser is not None and (parser.vault_data or parser.vars_cache.has_vault_data()):
+            LOG.debug("AnsibleInventory: not caching %r, it holds vault data", self.hostsfile)
+            return
+        cache.dump(self.inventory, self.fingerprints)
+
+    def resolve_host(self, name: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a parsed host, loading its vars if it was deferred in lazy mode
+
+        Arguments:
+            name: name of the host
+
+        Returns:
+            dict: the parsed host, None if the host is not defined in this source
+
+        """
+        if name not in self.inventory["hosts"]:
+            return None
+        if self.parser is None:
+            return self.inventory["hosts"][name]
+        return self.parser.resolve_host(name)
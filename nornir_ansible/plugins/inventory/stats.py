@@ -0,0 +1,126 @@
+"""nornir_ansible.inventory.stats"""
+
+import heapq
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+COUNTERS = (
+    "files_stat",
+    "files_opened",
+    "files_parsed",
+    "bytes_read",
+    "dirs_scanned",
+    "vars_cache_hits",
+    "vars_cache_misses",
+)
+_NO_PHASE = nullcontext()
+
+
+class LoadStats:
+    def __init__(self, enabled: bool = True, slowest: int = 10) -> None:
+        """
+        Phase timings and I/O counters of an inventory load
+
+        Phases are timed in wall and CPU time and accumulate over repeated calls; they nest, i.e.
+        "group_vars", "host_vars" and "normalize" are part of "parse". Recording is thread safe,
+        phases run concurrently (i.e. the parse of several inventory sources) add up the time
+        spent in every thread. A disabled instance records nothing and only costs a method call
+        per instrumented site.
+
+        Arguments:
+            enabled: record timings and counters
+            slowest: number of slowest vars files to keep track of
+
+        """
+        self.enabled = enabled
+        self.slowest = slowest
+        self.phases: Dict[str, Dict[str, float]] = {}
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        # min-heap of (elapsed, path), the fastest of the kept files is evicted first
+        self._slowest_vars_files: List[Tuple[float, str]] = []
+        self._lock = threading.Lock()
+
+    def phase(self, name: str) -> ContextManager[None]:
+        """
+        Return a context manager timing the enclosed block as phase `name`
+
+        Arguments:
+            name: name of the phase
+
+        """
+        if not self.enabled:
+            return _NO_PHASE
+        return self._phase(name)
+
+    @contextmanager
+    def _phase(self, name: str) -> Iterator[None]:
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            with self._lock:
+                phase = self.phases.setdefault(name, {"wall": 0.0, "cpu": 0.0, "calls": 0})
+                phase["wall"] += wall
+                phase["cpu"] += cpu
+                phase["calls"] += 1
+
+    def incr(self, counter: str, value: int = 1) -> None:
+        """
+        Increment a counter
+
+        Arguments:
+            counter: name of the counter, see `COUNTERS`
+            value: increment
+
+        """
+        if self.enabled:
+            with self._lock:
+                self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def record_file(self, path: str, size: int, elapsed: Optional[float] = None) -> None:
+        """
+        Record a file read and parsed
+
+        Arguments:
+            path: path of the file
+            size: size of the file in bytes
+            elapsed: time spent reading and parsing a vars file, tracked in `slowest_vars_files`
+
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            self.counters["files_opened"] += 1
+            self.counters["files_parsed"] += 1
+            self.counters["bytes_read"] += size
+            if elapsed is None or not self.slowest:
+                return
+            if len(self._slowest_vars_files) < self.slowest:
+                heapq.heappush(self._slowest_vars_files, (elapsed, path))
+            else:
+                heapq.heappushpop(self._slowest_vars_files, (elapsed, path))
+
+    @property
+    def slowest_vars_files(self) -> List[Tuple[str, float]]:
+        """(path, seconds) of the slowest vars files to read and parse, slowest first"""
+        return [(path, elapsed) for elapsed, path in sorted(self._slowest_vars_files, reverse=True)]
+
+    def dict(self) -> Dict[str, Any]:
+        """Return the stats as a dict of "phases", "counters" and "slowest_vars_files" """
+        return {
+            "phases": {name: dict(phase) for name, phase in self.phases.items()},
+            "counters": dict(self.counters),
+            "slowest_vars_files": self.slowest_vars_files,
+        }
+
+    def __str__(self) -> str:
+        phases = ", ".join(
+            f"{name}={phase['wall']:.3f}s/{phase['cpu']:.3f}s cpu"
+            for name, phase in self.phases.items()
+        )
+        counters = ", ".join(f"{name}={value}" for name, value in self.counters.items())
+        slowest = ", ".join(f"{path}={elapsed:.3f}s" for path, elapsed in self.slowest_vars_files)
+        return f"phases: {phases}; counters: {counters}; slowest vars files: {slowest}"
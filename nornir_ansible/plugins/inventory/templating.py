@@ -0,0 +1,389 @@
+"""nornir_ansible.inventory.templating"""
+
+import functools
+import logging
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Tuple
+
+from nornir.core.exceptions import NornirNoValidInventoryError
+
+from nornir_ansible.plugins.inventory.elements import DeferredValue
+
+try:
+    from jinja2 import StrictUndefined, TemplateError, Undefined
+    from jinja2.nativetypes import NativeEnvironment, native_concat
+
+    HAS_JINJA2 = True
+except ImportError:  # pragma: no cover
+    HAS_JINJA2 = False
+
+# host fields rendered on top of the host data
+TEMPLATED_FIELDS = ("hostname", "port", "username", "password", "platform")
+# template variables of the nornir fields of a host, under their Ansible name
+FIELD_VARS = {
+    "ansible_host": "hostname",
+    "ansible_port": "port",
+    "ansible_user": "username",
+    "ansible_password": "password",
+}
+TEMPLATE_MARKERS = ("{{", "{%", "{#")
+LOG = logging.getLogger(__name__)
+
+
+def is_template(value: Any) -> bool:
+    """
+    Return True if a value is a string holding a Jinja2 expression, statement or comment
+
+    Arguments:
+        value: var value
+
+    """
+    return isinstance(value, str) and any(marker in value for marker in TEMPLATE_MARKERS)
+
+
+def has_templates(value: Any) -> bool:
+    """
+    Return True if a value, or any value nested in it, is a template
+
+    Arguments:
+        value: var value
+
+    """
+    if isinstance(value, dict):
+        return any(has_templates(v) for v in value.values())
+    if isinstance(value, list):
+        return any(has_templates(v) for v in value)
+    return is_template(value)
+
+
+class TemplateRenderer:
+    def __init__(self) -> None:
+        """
+        Render the Jinja2 templated vars of hosts, such as `"{{ inventory_hostname }}.example.com"`
+
+        Templates are compiled once per source string and shared by all hosts. Templates that
+        are a single expression keep the type of their result (i.e. `"{{ 22 }}"` renders to `22`)
+        like Ansible does; undefined variables raise an error.
+
+        Raises:
+            ImportError: if jinja2 is not installed
+
+        """
+        if not HAS_JINJA2:
+            raise ImportError(
+                "AnsibleInventory: render_templates requires jinja2, "
+                "install it with `pip install nornir_ansible[jinja2]`"
+            )
+        self.environment = NativeEnvironment(undefined=StrictUndefined)
+        self.templates: Dict[str, Any] = {}
+
+    def get_template(self, source: str) -> Any:
+        """
+        Return the compiled template of a source string, compiled on first use
+
+        Arguments:
+            source: template source
+
+        """
+        template = self.templates.get(source)
+        if template is None:
+            template = self.templates[source] = self.environment.from_string(source)
+        return template
+
+    def render_host(
+        self, name: str, host: Dict[str, Any], variables: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Return a copy of a host whose templated vars, connection fields and connection options are
+        rendered on first access, one value at a time
+
+        Templated connection fields and connection options the host inherits from its groups or
+        the defaults are rendered for the host too, see `strip_templates`. Rendering errors are
+        only raised by the access to the value failing to render.
+
+        Arguments:
+            name: name of the host
+            host: host data, see `AnsibleInventory.get_host_data`
+            variables: all vars of the host, its groups vars included, see `VarsFlattener`
+
+        """
+        host_vars = HostVars(self, name, host, variables)
+        rendered = dict(host)
+        rendered["data"] = TemplatedVars(host_vars, host.get("data") or {})
+        for field, value in get_fields(host, variables):
+            if is_template(value):
+                rendered[field] = DeferredValue(functools.partial(host_vars.render, field, value))
+        connection_options = variables.get("connection_options")
+        if has_templates(connection_options):
+            rendered["connection_options"] = DeferredValue(
+                functools.partial(host_vars.render, "connection_options", connection_options)
+            )
+        return rendered
+
+
+def get_fields(host: Dict[str, Any], variables: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """
+    Yield the connection fields of a host, inherited from its groups or the defaults if not set
+
+    Arguments:
+        host: host data
+        variables: all vars of the host, its groups vars included
+
+    """
+    for field in TEMPLATED_FIELDS:
+        value = host.get(field)
+        yield field, variables.get(field) if value is None else value
+
+
+def strip_templates(element: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return a group or defaults without its templated connection fields and connection options
+
+    They can only be rendered against the vars of a host, hosts inheriting them get them
+    rendered instead, see `TemplateRenderer.render_host`. Elements without any are returned as is.
+
+    Arguments:
+        element: parsed group or defaults
+
+    """
+    fields = [field for field in TEMPLATED_FIELDS if is_template(element.get(field))]
+    connection_options = element.get("connection_options") or {}
+    templated = [name for name, options in connection_options.items() if has_templates(options)]
+    if not fields and not templated:
+        return element
+    stripped = {**element, **dict.fromkeys(fields)}
+    stripped["connection_options"] = {
+        name: options for name, options in connection_options.items() if name not in templated
+    }
+    return stripped
+
+
+class TemplatedVars(Dict[str, Any]):
+    __slots__ = ("host_vars", "pending")
+
+    def __init__(self, host_vars: "HostVars", data: Dict[str, Any]) -> None:
+        """
+        Vars of a host whose templated values are rendered on first access, one at a time
+
+        Reading all the values at once (iterating items or values, comparing, copying to a dict,
+        serializing...) renders all of them. Values set are kept as is, templated or not.
+
+        Arguments:
+            host_vars: vars the templates are rendered against
+            data: the vars, with their templates
+
+        """
+        super().__init__(data)
+        self.host_vars = host_vars
+        self.pending = {key for key, value in data.items() if has_templates(value)}
+
+    def _render(self, keys: Iterable[Any]) -> None:
+        """Render the pending templated values of keys"""
+        with self.host_vars.lock:
+            for key in keys:
+                if key in self.pending:
+                    super().__setitem__(key, self.host_vars[key])
+                    self.pending.discard(key)
+
+    def _render_all(self) -> None:
+        """Render all pending templated values, in order"""
+        if self.pending:
+            self._render([key for key in super().keys() if key in self.pending])
+
+    def __getitem__(self, key: Any) -> Any:
+        self._render((key,))
+        return super().__getitem__(key)
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self.pending.discard(key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key: Any) -> None:
+        self.pending.discard(key)
+        super().__delitem__(key)
+
+    def __iter__(self) -> Iterator[Any]:  # pylint: disable=useless-parent-delegation
+        # overriding `__iter__` makes `dict(vars)` and `{**vars}` go through `__getitem__`
+        return super().__iter__()
+
+    def __eq__(self, other: object) -> bool:
+        self._render_all()
+        return super().__eq__(other)
+
+    def __ne__(self, other: object) -> bool:
+        self._render_all()
+        return super().__ne__(other)
+
+    __hash__ = None  # type: ignore
+
+    def __repr__(self) -> str:
+        self._render_all()
+        return super().__repr__()
+
+    def __reduce__(self) -> Any:
+        return dict, (dict(self),)
+
+    def __or__(self, other: Any) -> Any:
+        return dict(self) | other
+
+    def __ror__(self, other: Any) -> Any:
+        return other | dict(self)
+
+    def get(self, key: Any, default: Any = None) -> Any:
+        self._render((key,))
+        return super().get(key, default)
+
+    def items(self) -> Any:
+        self._render_all()
+        return super().items()
+
+    def values(self) -> Any:
+        self._render_all()
+        return super().values()
+
+    def copy(self) -> "TemplatedVars":
+        with self.host_vars.lock:
+            copy = TemplatedVars(self.host_vars, dict(super().items()))
+            copy.pending = set(self.pending)
+        return copy
+
+    def pop(self, key: Any, *default: Any) -> Any:
+        self._render((key,))
+        self.pending.discard(key)
+        return super().pop(key, *default)
+
+    def popitem(self) -> Tuple[Any, Any]:
+        self._render_all()
+        return super().popitem()
+
+    def setdefault(self, key: Any, default: Any = None) -> Any:
+        self._render((key,))
+        return super().setdefault(key, default)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        data = dict(*args, **kwargs)
+        self.pending.difference_update(data)
+        super().update(data)
+
+    def __ior__(self, other: Any) -> "TemplatedVars":  # type: ignore[override,misc]
+        self.update(other)
+        return self
+
+    def clear(self) -> None:
+        self.pending.clear()
+        super().clear()
+
+
+class HostVars(Mapping[str, Any]):
+    def __init__(
+        self,
+        renderer: TemplateRenderer,
+        name: str,
+        host: Dict[str, Any],
+        variables: Dict[str, Any],
+    ) -> None:
+        """
+        Vars of a host as seen by its templates, rendered on first access and memoized
+
+        Holds the Jinja2 globals, the vars of the host and its groups, the nornir fields of the
+        host (or inherited from its groups) under their Ansible name (i.e. "ansible_host") and
+        the `inventory_hostname`, `inventory_hostname_short` and `group_names` magic vars.
+        Values are rendered one at a time under `lock`, hosts may be accessed from several
+        threads at once.
+
+        Arguments:
+            renderer: renderer compiling the templates
+            name: name of the host
+            host: host data
+            variables: all vars of the host, its groups vars included
+
+        """
+        self.renderer = renderer
+        self.name = name
+        self.raw: Dict[str, Any] = dict(renderer.environment.globals)
+        self.raw.update(variables.get("data") or {})
+        self.raw.update(host.get("data") or {})
+        fields = dict(get_fields(host, variables))
+        for var, field in FIELD_VARS.items():
+            if fields[field] is not None:
+                self.raw[var] = fields[field]
+        self.raw["inventory_hostname"] = name
+        self.raw["inventory_hostname_short"] = name.split(".")[0]
+        self.raw["group_names"] = sorted(host.get("groups") or [])
+        self.rendered: Dict[str, Any] = {}
+        self.resolving: List[str] = []
+        self.lock = threading.RLock()
+
+    def __getitem__(self, key: str) -> Any:
+        with self.lock:
+            if key in self.rendered:
+                return self.rendered[key]
+            value = self.raw[key]
+            if has_templates(value):
+                value = self.render(key, value)
+            self.rendered[key] = value
+            return value
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.raw
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.raw)
+
+    def __len__(self) -> int:
+        return len(self.raw)
+
+    def render(self, key: str, value: Any) -> Any:
+        """
+        Render a templated value, raising an error if it (indirectly) refers to itself
+
+        Arguments:
+            key: var the value belongs to
+            value: value to render, nested values are rendered too
+
+        """
+        with self.lock:
+            return self._render_key(key, value)
+
+    def _render_key(self, key: str, value: Any) -> Any:
+        """Render a templated value of a var, `lock` must be held"""
+        if key in self.resolving:
+            cycle = " -> ".join(self.resolving[self.resolving.index(key) :] + [key])
+            LOG.error("AnsibleInventory: recursive template in host %r: %s", self.name, cycle)
+            raise NornirNoValidInventoryError(
+                f"AnsibleInventory: recursive template in host {self.name!r}: {cycle}"
+            )
+        self.resolving.append(key)
+        try:
+            return self._render_value(key, value)
+        finally:
+            self.resolving.pop()
+
+    def _render_value(self, key: str, value: Any) -> Any:
+        """
+        Render a value and the values nested in it
+
+        Arguments:
+            key: var the value belongs to, for error messages
+            value: value to render
+
+        """
+        if isinstance(value, dict):
+            return {k: self._render_value(key, v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._render_value(key, v) for v in value]
+        if not is_template(value):
+            return value
+        template = self.renderer.get_template(value)
+        try:
+            context = template.new_context(self, shared=True)
+            rendered = native_concat(template.root_render_func(context))
+            if isinstance(rendered, Undefined):
+                # a single undefined expression is returned as is instead of being rendered
+                str(rendered)
+            return rendered
+        except TemplateError as exc:
+            LOG.error("AnsibleInventory: unable to render %r of host %r: %s", key, self.name, exc)
+            raise NornirNoValidInventoryError(
+                f"AnsibleInventory: unable to render {key!r} of host {self.name!r}: {exc}"
+            ) from exc
@@ -0,0 +1,476 @@
+"""nornir_ansible.inventory.vars_files"""
+
+import functools
+import io
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import ruamel.yaml
+from nornir.core.exceptions import NornirNoValidInventoryError
+from ruamel.yaml.error import YAMLError
+
+from nornir_ansible.plugins.inventory.cache import get_fingerprint
+from nornir_ansible.plugins.inventory.models import Fingerprint, ProgressCallback, VarsDict
+from nornir_ansible.plugins.inventory.stats import LoadStats
+from nornir_ansible.plugins.inventory.vault import (
+    VAULT_HEADER,
+    Vault,
+    VaultValue,
+    decrypt,
+    decrypt_values,
+    is_encrypted,
+)
+
+VARS_FILENAME_EXTENSIONS = ["", ".ini", ".yml", ".yaml", ".json"]
+# use the libyaml based parser when ruamel.yaml C extension is installed, pure python otherwise
+YAML_WITH_LIBYAML: bool = getattr(ruamel.yaml, "__with_libyaml__", False)
+LOG = logging.getLogger(__name__)
+
+VarsDecoder = Callable[[IO[Any]], Any]
+
+# vars file extension -> (decoder, whether the file has to be opened in binary mode); files with
+# any other extension are decoded as YAML
+VARS_DECODERS: Dict[str, Tuple[VarsDecoder, bool]] = {".json": (json.load, False)}
+_YAML_LOCAL = threading.local()
+
+
+def register_vars_decoder(extension: str, decoder: VarsDecoder, binary: bool = False) -> None:
+    """
+    Register a decoder for vars files with the given extension, bypassing YAML parsing
+
+    Decoders are looked up when a vars file is read, so they must be registered at import time to
+    be available to "process" `vars_executor` workers on platforms that do not fork.
+
+    Arguments:
+        extension: file extension including the leading dot, i.e. ".msgpack"
+        decoder: callable returning the data of an opened file, i.e. `msgpack.load`
+        binary: bool indicating if the file has to be opened in binary mode
+
+    """
+    VARS_DECODERS[extension] = (decoder, binary)
+    if extension not in VARS_FILENAME_EXTENSIONS:
+        VARS_FILENAME_EXTENSIONS.append(extension)
+
+
+class VaultConstructor(ruamel.yaml.constructor.SafeConstructor):
+    """Safe YAML constructor loading `!vault` tagged values as `VaultValue`"""
+
+    def construct_vault(self, node: ruamel.yaml.nodes.ScalarNode) -> VaultValue:
+        """Construct a `!vault` value, flagging the file for `load_yaml` to decrypt it"""
+        _YAML_LOCAL.vault_values = True
+        return VaultValue(self.construct_scalar(node))
+
+
+VaultConstructor.add_constructor("!vault", VaultConstructor.construct_vault)
+
+
+def get_yaml() -> ruamel.yaml.YAML:
+    """Return a YAML instance for the current thread as YAML instances are not thread safe"""
+    yaml = getattr(_YAML_LOCAL, "yaml", None)
+    if yaml is None:
+        yaml = _YAML_LOCAL.yaml = ruamel.yaml.YAML(typ="safe", pure=not YAML_WITH_LIBYAML)
+        yaml.Constructor = VaultConstructor
+    return yaml
+
+
+def load_yaml(file_stream: IO[Any], vault: Optional[Vault] = None) -> Any:
+    """
+    Load a YAML file, decrypting its `!vault` values
+
+    Arguments:
+        file_stream: opened file stream
+        vault: optional vault to decrypt the values with
+
+    """
+    _YAML_LOCAL.vault_values = False
+    data = get_yaml().load(file_stream)
+    if _YAML_LOCAL.vault_values:
+        data = decrypt_values(data, vault, file_stream.name)
+    return data
+
+
+def loaded_vault_data() -> bool:
+    """Return whether the last file loaded by the current thread held vault encrypted data"""
+    return bool(getattr(_YAML_LOCAL, "vault_values", False))
+
+
+def _read_vars_path(
+    path: Union[str, Path], vault: Optional[Vault] = None
+) -> Tuple[str, int, int, VarsDict, float, bool]:
+    """
+    Read and parse a vars file, return its resolved path, mtime, size, data, time taken and
+    whether it held vault encrypted data
+
+    Module level so it can be shipped to `ProcessPoolExecutor` workers.
+
+    Arguments:
+        path: path to the vars file
+        vault: optional vault to decrypt encrypted files and values with
+
+    """
+    start = time.perf_counter()
+    resolved = Path(path).resolve()
+    stat = resolved.stat()
+    decoder, binary = VARS_DECODERS.get(os.path.splitext(path)[1], (None, False))
+    LOG.debug("AnsibleInventory: reading var file %r", str(path))
+    if binary:
+        with open(path, "rb") as bf:
+            data = _load_vars(bf, decoder, vault)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = _load_vars(f, decoder, vault)
+    elapsed = time.perf_counter() - start
+    return str(resolved), stat.st_mtime_ns, stat.st_size, data, elapsed, loaded_vault_data()
+
+
+def _load_vars(
+    file_stream: IO[Any], decoder: Optional[VarsDecoder] = None, vault: Optional[Vault] = None
+) -> VarsDict:
+    """
+    Read vars file data, return `VarsDict`
+
+    Arguments:
+        file_stream: opend file stream
+        decoder: optional decoder of the file, see `register_vars_decoder`; YAML if not provided
+        vault: optional vault to decrypt encrypted files and values with
+
+    """
+    encrypted = is_encrypted(file_stream.read(len(VAULT_HEADER)))
+    file_stream.seek(0)
+    if encrypted:
+        file_stream = _decrypt_file(file_stream, vault)
+    try:
+        data = decoder(file_stream) if decoder is not None else load_yaml(file_stream, vault)
+        # flag encrypted files as holding vault data as well, see `loaded_vault_data`
+        _YAML_LOCAL.vault_values = encrypted or (decoder is None and loaded_vault_data())
+    except (YAMLError, ValueError) as exc:
+        LOG.error("AnsibleInventory: file %r is not a valid YAML file", file_stream.name)
+        raise NornirNoValidInventoryError(
+            f"AnsibleInventory: no valid YAML file. Tried: {file_stream.name}"
+        ) from exc
+
+    if isinstance(data, dict):
+        return data
+    if data is None:
+        LOG.warning("AnsibleInventory: file %r is empty", file_stream.name)
+        return {}
+    LOG.error(
+        "AnsibleInventory: file %r does not return a dictionary. Got: %s",
+        file_stream.name,
+        type(data),
+    )
+    raise NornirNoValidInventoryError(
+        f"AnsibleInventory: file {file_stream.name} does not return a dictionary. Got: {type(data)}"
+    )
+
+
+def _decrypt_file(file_stream: IO[Any], vault: Optional[Vault]) -> IO[Any]:
+    """
+    Return a stream of the plaintext of a Vault encrypted file
+
+    Arguments:
+        file_stream: opened encrypted file stream
+        vault: vault to decrypt the file with
+
+    """
+    content = file_stream.read()
+    if isinstance(content, bytes):
+        content = content.decode("utf-8")
+    plaintext = decrypt(content, vault, file_stream.name)
+    decrypted: IO[Any]
+    if isinstance(file_stream, io.TextIOBase):
+        decrypted = io.StringIO(plaintext)
+    else:
+        decrypted = io.BytesIO(plaintext.encode("utf-8"))
+    decrypted.name = file_stream.name  # type: ignore
+    return decrypted
+
+
+class VarsCache:
+    def __init__(self, stats: Optional[LoadStats] = None, vault: Optional[Vault] = None) -> None:
+        """
+        Per-load cache of group_vars/host_vars data
+
+        Vars files are keyed on their resolved path and modification time so that a file shared by
+        many groups/hosts is only opened and parsed once. Resolved group/host vars are additionally
+        memoized by element name so repeated lookups of the same group/host are a single dict hit.
+
+        Arguments:
+            stats: optional `LoadStats` to record file reads and cache hits/misses in
+            vault: optional vault to decrypt encrypted files and values with
+
+        """
+        self.stats = stats if stats is not None else LoadStats(enabled=False)
+        self.vault = vault
+        self.hits = 0
+        self.misses = 0
+        self.files: Dict[Tuple[str, int], VarsDict] = {}
+        # (resolved path, mtime) of the files holding vault encrypted data
+        self.vault_files: Set[Tuple[str, int]] = set()
+        self.elements: Dict[Tuple[str, str], VarsDict] = {}
+        self.fingerprints: Dict[str, Fingerprint] = {}
+
+    def get_file(self, path: Union[str, Path]) -> VarsDict:
+        """
+        Return parsed data of the vars file at `path`, reading it only on first access
+
+        Arguments:
+            path: path to the vars file
+
+        """
+        return dict(self._get(path))
+
+    def _get(self, path: Union[str, Path]) -> VarsDict:
+        """Return the cached data of the vars file at `path`, must not be mutated"""
+        resolved = Path(path).resolve()
+        stat = resolved.stat()
+        self.stats.incr("files_stat")
+        key = (str(resolved), stat.st_mtime_ns)
+        self.fingerprints[str(resolved)] = (stat.st_mtime_ns, stat.st_size)
+        if key in self.files:
+            self.hits += 1
+            self.stats.incr("vars_cache_hits")
+        else:
+            self.misses += 1
+            self.stats.incr("vars_cache_misses")
+            self._add(_read_vars_path(path, self.vault))
+        return self.files[key]
+
+    def merge_files(self, paths: Iterable[str]) -> VarsDict:
+        """
+        Return the data of several vars files merged in order, later files win
+
+        The merged dict is updated in place file after file, the cached data of the files is
+        neither copied nor mutated. Files not holding a mapping are ignored.
+
+        Arguments:
+            paths: paths to the vars files, in merge order
+
+        """
+        merged: VarsDict = {}
+        for path in paths:
+            data = self._get(path)
+            if isinstance(data, dict):
+                merged.update(data)
+        return merged
+
+    def preload(
+        self,
+        paths: Iterable[str],
+        executor: Executor,
+        progress_callback: Optional[ProgressCallback] = None,
+    ) -> None:
+        """
+        Read and parse vars files concurrently, populating the cache for subsequent `get_file` calls
+
+        Arguments:
+            paths: paths to the vars files to load
+            executor: executor to parse the files with
+            progress_callback: optional callable called with "vars_files" after every file loaded
+
+        """
+        paths = list(paths)
+        results = executor.map(functools.partial(_read_vars_path, vault=self.vault), paths)
+        for done, result in enumerate(results, 1):
+            resolved, mtime_ns, size = result[:3]
+            self.fingerprints[resolved] = (mtime_ns, size)
+            if (resolved, mtime_ns) not in self.files:
+                self.misses += 1
+                self.stats.incr("vars_cache_misses")
+                self._add(result)
+            if progress_callback is not None:
+                progress_callback("vars_files", done, len(paths))
+
+    def _add(self, result: Tuple[str, int, int, VarsDict, float, bool]) -> None:
+        """Store the result of `_read_vars_path` and record the read in `stats`"""
+        resolved, mtime_ns, size, data, elapsed, vault_data = result
+        self.files[(resolved, mtime_ns)] = data
+        if vault_data:
+            self.vault_files.add((resolved, mtime_ns))
+        self.stats.incr("files_stat")
+        self.stats.record_file(resolved, size, elapsed)
+
+    def has_vault_data(self) -> bool:
+        """Return whether any vars file read since the last `reset` held vault encrypted data"""
+        return any(
+            (path, fingerprint[0]) in self.vault_files
+            for path, fingerprint in self.fingerprints.items()
+            if fingerprint is not None
+        )
+
+    def get_element(self, sub_dir: str, element: str, loader: Callable[[], VarsDict]) -> VarsDict:
+        """
+        Return the vars of a group/host, calling `loader` only on first access
+
+        Arguments:
+            sub_dir: vars directory the element belongs to; "group_vars" or "host_vars"
+            element: name of the group/host
+            loader: callable returning the vars of the element
+
+        """
+        key = (sub_dir, element)
+        if key in self.elements:
+            self.hits += 1
+            self.stats.incr("vars_cache_hits")
+        else:
+            self.misses += 1
+            self.stats.incr("vars_cache_misses")
+            self.elements[key] = loader()
+        # vars data is mutated by `map_nornir_vars`, always hand out a copy
+        return dict(self.elements[key])
+
+    def invalidate(self, sub_dir: str, element: str, paths: Iterable[str]) -> None:
+        """
+        Forget the vars of a group/host and the fingerprints of the files they were read from
+
+        Arguments:
+            sub_dir: vars directory the element belongs to; "group_vars" or "host_vars"
+            element: name of the group/host
+            paths: paths of the vars files of the element
+
+        """
+        self.elements.pop((sub_dir, element), None)
+        for path in paths:
+            self.fingerprints.pop(str(Path(path).resolve()), None)
+
+    def reset(self) -> None:
+        """
+        Forget memoized groups/hosts and fingerprints, only keeping the latest data of each file
+
+        Parsed files stay cached by path and modification time, so a new parse with this cache
+        only reads the files that changed since.
+
+        """
+        self.files = {
+            key: data
+            for key, data in self.files.items()
+            if (self.fingerprints.get(key[0]) or (None,))[0] == key[1]
+        }
+        self.vault_files.intersection_update(self.files)
+        self.elements = {}
+        self.fingerprints = {}
+
+
+class VarsIndex:
+    def __init__(self, path: str, stats: Optional[LoadStats] = None) -> None:
+        """
+        In-memory index of a group_vars/host_vars directory
+
+        The directory is scanned once with `os.scandir`, all existence/location lookups of vars
+        files and directories are then answered from the index instead of probing the filesystem
+        for every supported extension.
+
+        Arguments:
+            path: path to the group_vars/host_vars directory
+            stats: optional `LoadStats` to record directory scans in
+
+        """
+        self.stats = stats if stats is not None else LoadStats(enabled=False)
+        self.path = path
+        self.files: Dict[str, str] = {}
+        self.dirs: Dict[str, str] = {}
+        self._dir_files: Dict[str, List[str]] = {}
+        self.fingerprints: Dict[str, Fingerprint] = {}
+        self._build()
+
+    def _build(self) -> None:
+        """Scan the vars directory and index its files and directories by element name"""
+        ranks: Dict[str, int] = {}
+        self.fingerprints[self.path] = get_fingerprint(self.path)
+        self.stats.incr("files_stat")
+        try:
+            entries = list(os.scandir(self.path))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        self.stats.incr("dirs_scanned")
+
+        for entry in entries:
+            if entry.is_dir():
+                self.dirs[entry.name] = entry.path
+                continue
+            if not entry.is_file():
+                continue
+            for rank, ext in enumerate(VARS_FILENAME_EXTENSIONS):
+                if ext and not entry.name.endswith(ext):
+                    continue
+                element = entry.name[: -len(ext)] if ext else entry.name
+                # honor the VARS_FILENAME_EXTENSIONS order when an element has several files
+                if rank < ranks.get(element, len(VARS_FILENAME_EXTENSIONS)):
+                    ranks[element] = rank
+                    self.files[element] = entry.path
+
+    def get_dir_files(self, element: str) -> List[str]:
+        """
+        Get all files with VARS_FILENAME_EXTENSIONS in the vars directory of `element`
+
+        Arguments:
+            element: name of the host or group
+
+        Returns:
+            files_list: List of files that are in this directory and subdirectories
+
+        """
+        if element not in self._dir_files:
+            self._dir_files[element] = (
+                list(self._walk(self.dirs[element])) if element in self.dirs else []
+            )
+        return self._dir_files[element]
+
+    def refresh(self) -> None:
+        """Scan the vars directory again, listings of the directories of elements are kept"""
+        self.files = {}
+        self.dirs = {}
+        self._build()
+
+    def invalidate(self, element: str) -> List[str]:
+        """
+        Forget the listed files of the vars directory of `element`, return the files it had
+
+        Arguments:
+            element: name of the host or group
+
+        """
+        files = self._dir_files.pop(element, [])
+        if element in self.dirs:
+            prefix = self.dirs[element]
+            for path in [
+                p for p in self.fingerprints if p == prefix or p.startswith(prefix + os.sep)
+            ]:
+                del self.fingerprints[path]
+        return files
+
+    def _walk(self, path: str) -> Iterator[str]:
+        """
+        Recursively yield vars files in `path` in Ansible's order
+
+        Entries are sorted by name and subdirectories are walked where they sort, so the order
+        only depends on names and is the same on every machine and filesystem. Hidden entries and
+        backup files (ending with "~") are skipped like Ansible does.
+
+        Arguments:
+            path: directory to walk
+
+        """
+        self.fingerprints[path] = get_fingerprint(path)
+        self.stats.incr("files_stat")
+        self.stats.incr("dirs_scanned")
+        with os.scandir(path) as scan:
+            entries = sorted(
+                (entry for entry in scan if not entry.name.startswith(".")),
+                key=lambda entry: entry.name,
+            )
+        for entry in entries:
+            if entry.is_dir():
+                yield from self._walk(entry.path)
+            elif (
+                entry.is_file()
+                and not entry.name.endswith("~")
+                and os.path.splitext(entry.name)[1] in VARS_FILENAME_EXTENSIONS
+            ):
+                yield entry.path
@@ -0,0 +1,299 @@
+"""nornir_ansible.inventory.vault"""
+
+import binascii
+import functools
+import hashlib
+import hmac
+import logging
+import os
+import subprocess  # nosec
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+
+from nornir.core.exceptions import NornirNoValidInventoryError
+
+try:
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+    from cryptography.hazmat.primitives.padding import PKCS7
+
+    HAS_CRYPTOGRAPHY = True
+except ImportError:  # pragma: no cover
+    HAS_CRYPTOGRAPHY = False
+
+VAULT_HEADER = "$ANSIBLE_VAULT"
+VAULT_VERSIONS = ("1.1", "1.2")
+# AES256 key, HMAC key and counter nonce lengths, derived from the password and salt
+VAULT_KEY_LENGTHS = (32, 32, 16)
+VAULT_PBKDF2_ITERATIONS = 10000
+# max (password, salt) key derivations memoized by `derive_keys`
+VAULT_KEYS_CACHE_SIZE = 4096
+# max plaintexts memoized by vaults with `cache` set, least recently used ones are dropped first
+VAULT_PLAINTEXT_CACHE_SIZE = 1024
+LOG = logging.getLogger(__name__)
+
+# (password digest, vault text digest) -> plaintext, see `Vault.cache`
+_DECRYPTED: "OrderedDict[Tuple[bytes, bytes], str]" = OrderedDict()
+_DECRYPTED_LOCK = threading.Lock()
+
+
+class VaultError(Exception):
+    """Vault text that can not be decrypted"""
+
+
+class VaultValue:
+    __slots__ = ("vaulttext",)
+
+    def __init__(self, vaulttext: str) -> None:
+        """
+        Encrypted value of a YAML file tagged with `!vault`, replaced by its plaintext once the
+        file is loaded, see `decrypt_values`
+
+        Arguments:
+            vaulttext: the encrypted value
+
+        """
+        self.vaulttext = vaulttext
+
+    def __repr__(self) -> str:
+        return "VaultValue(...)"
+
+    def __getstate__(self) -> str:
+        return self.vaulttext
+
+    def __setstate__(self, state: str) -> None:
+        self.vaulttext = state
+
+
+def is_encrypted(data: Union[str, bytes]) -> bool:
+    """
+    Return True if the data is Vault encrypted
+
+    Arguments:
+        data: content of a file, or its first bytes
+
+    """
+    if isinstance(data, bytes):
+        return data.startswith(VAULT_HEADER.encode())
+    return data.startswith(VAULT_HEADER)
+
+
+@functools.lru_cache(maxsize=VAULT_KEYS_CACHE_SIZE)
+def derive_keys(password: bytes, salt: bytes) -> Tuple[bytes, bytes, bytes]:
+    """
+    Return the AES256 key, HMAC key and counter nonce derived from a password and salt
+
+    PBKDF2 is slow by design, derivations are memoized for values and files encrypted with the
+    same salt, and for files decrypted again on reload.
+
+    Arguments:
+        password: vault password
+        salt: salt of the vault text
+
+    """
+    key_length, hmac_length, iv_length = VAULT_KEY_LENGTHS
+    derived = hashlib.pbkdf2_hmac(
+        "sha256",
+        password,
+        salt,
+        VAULT_PBKDF2_ITERATIONS,
+        dklen=key_length + hmac_length + iv_length,
+    )
+    return (
+        derived[:key_length],
+        derived[key_length : key_length + hmac_length],
+        derived[key_length + hmac_length :],
+    )
+
+
+def parse_vaulttext(vaulttext: str) -> Tuple[bytes, bytes, bytes]:
+    """
+    Return the salt, HMAC and ciphertext of a "$ANSIBLE_VAULT;1.1;AES256" vault text
+
+    Arguments:
+        vaulttext: vault text, with its header
+
+    """
+    header, _, body = vaulttext.strip().partition("\n")
+    fields = header.strip().split(";")
+    if len(fields) < 3 or fields[0] != VAULT_HEADER or fields[1] not in VAULT_VERSIONS:
+        raise VaultError(f"unsupported vault header {header.strip()!r}")
+    if fields[2].strip() != "AES256":
+        raise VaultError(f"unsupported vault cipher {fields[2].strip()!r}")
+    try:
+        salt, mac, ciphertext = binascii.unhexlify("".join(body.split())).split(b"\n", 2)
+        return binascii.unhexlify(salt), binascii.unhexlify(mac), binascii.unhexlify(ciphertext)
+    except (binascii.Error, ValueError) as exc:
+        raise VaultError("malformed vault text") from exc
+
+
+class Vault:
+    def __init__(
+        self,
+        password_file: Optional[str] = None,
+        password_callback: Optional[Callable[[], Union[str, bytes]]] = None,
+        cache: bool = False,
+    ) -> None:
+        """
+        Decrypt Ansible Vault encrypted files and `!vault` values
+
+        The password is read, or requested from the callback, on first use only. Key derivations
+        are memoized per password and salt, see `derive_keys`. Decrypting requires the
+        `cryptography` package.
+
+        Arguments:
+            password_file: file holding the vault password; executable files are run and their
+                output used as the password, like Ansible does
+            password_callback: callable returning the vault password, i.e. to prompt for it
+            cache: memoize the `VAULT_PLAINTEXT_CACHE_SIZE` most recently decrypted plaintexts in
+                memory, so that reloads and other inventories do not decrypt them again
+
+        """
+        if (password_file is None) == (password_callback is None):
+            raise ValueError(
+                "AnsibleInventory: either a vault password file or callback must be provided"
+            )
+        if not HAS_CRYPTOGRAPHY:
+            raise ImportError(
+                "AnsibleInventory: decrypting vault data requires cryptography, "
+                "install it with `pip install nornir_ansible[vault]`"
+            )
+        self.password_file = password_file
+        self.password_callback = password_callback
+        self.cache = cache
+        self._password: Optional[bytes] = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # "process" vars_executor workers get the password itself, the callback stays here
+        return {"password": self.get_password(), "cache": self.cache}
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.password_file = None
+        self.password_callback = None
+        self.cache = state["cache"]
+        self._password = state["password"]
+        self._lock = threading.Lock()
+
+    def get_password(self) -> bytes:
+        """Return the vault password, read or requested on first use"""
+        with self._lock:
+            if self._password is None:
+                self._password = self._read_password()
+            return self._password
+
+    def _read_password(self) -> bytes:
+        """Read the vault password from `password_file` or `password_callback`"""
+        if self.password_callback is not None:
+            password = self.password_callback()
+            return password.encode() if isinstance(password, str) else password
+        path = os.path.expanduser(str(self.password_file))
+        try:
+            if os.access(path, os.X_OK):
+                output = subprocess.run(  # nosec
+                    [path], capture_output=True, check=True, timeout=60
+                ).stdout
+            else:
+                with open(path, "rb") as f:
+                    output = f.read()
+        except (OSError, subprocess.SubprocessError) as exc:
+            LOG.error("AnsibleInventory: unable to read vault password file %r: %s", path, exc)
+            raise NornirNoValidInventoryError(
+                f"AnsibleInventory: unable to read vault password file {path}: {exc}"
+            ) from exc
+        return output.strip()
+
+    def decrypt(self, vaulttext: str) -> str:
+        """
+        Return the plaintext of a vault text
+
+        Arguments:
+            vaulttext: vault text, with its header
+
+        Raises:
+            VaultError: if the vault text is malformed or the password does not match
+
+        """
+        password = self.get_password()
+        cache_key = None
+        if self.cache:
+            cache_key = (
+                hashlib.sha256(password).digest(),
+                hashlib.sha256(vaulttext.encode()).digest(),
+            )
+            with _DECRYPTED_LOCK:
+                if cache_key in _DECRYPTED:
+                    _DECRYPTED.move_to_end(cache_key)
+                    return _DECRYPTED[cache_key]
+
+        salt, mac, ciphertext = parse_vaulttext(vaulttext)
+        key, hmac_key, iv = derive_keys(password, salt)
+        expected = hmac.new(hmac_key, ciphertext, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, mac):
+            raise VaultError("the vault password does not match")
+        decryptor = Cipher(algorithms.AES(key), modes.CTR(iv)).decryptor()
+        unpadder = PKCS7(algorithms.AES.block_size).unpadder()
+        padded = decryptor.update(ciphertext) + decryptor.finalize()
+        try:
+            plaintext = (unpadder.update(padded) + unpadder.finalize()).decode("utf-8")
+        except ValueError as exc:
+            raise VaultError("malformed vault plaintext") from exc
+
+        if cache_key is not None:
+            with _DECRYPTED_LOCK:
+                _DECRYPTED[cache_key] = plaintext
+                while len(_DECRYPTED) > VAULT_PLAINTEXT_CACHE_SIZE:
+                    _DECRYPTED.popitem(last=False)
+        return plaintext
+
+
+def decrypt_values(value: Any, vault: Optional[Vault], name: str) -> Any:
+    """
+    Return loaded YAML data with its `!vault` values replaced by their plaintext
+
+    Arguments:
+        value: data loaded from a YAML file
+        vault: vault to decrypt the values with
+        name: name of the file, for error messages
+
+    """
+    if isinstance(value, dict):
+        return {k: decrypt_values(v, vault, name) for k, v in value.items()}
+    if isinstance(value, list):
+        return [decrypt_values(v, vault, name) for v in value]
+    if isinstance(value, VaultValue):
+        return decrypt(value.vaulttext, vault, name)
+    return value
+
+
+def decrypt(vaulttext: str, vault: Optional[Vault], name: str) -> str:
+    """
+    Return the plaintext of a vault text found in a file, raising an inventory error if it can not
+    be decrypted
+
+    Arguments:
+        vaulttext: vault text, with its header
+        vault: vault to decrypt the text with
+        name: name of the file, for error messages
+
+    """
+    if vault is None:
+        LOG.error("AnsibleInventory: file %r holds vault data, no vault password set", name)
+        raise NornirNoValidInventoryError(
+            f"AnsibleInventory: file {name} holds vault encrypted data, set "
+            "vault_password_file or vault_password_callback to decrypt it"
+        )
+    try:
+        return vault.decrypt(vaulttext)
+    except VaultError as exc:
+        LOG.error("AnsibleInventory: unable to decrypt vault data of %r: %s", name, exc)
+        raise NornirNoValidInventoryError(
+            f"AnsibleInventory: unable to decrypt vault data of {name}: {exc}"
+        ) from exc
+
+
+def clear_vault_caches() -> None:
+    """Forget the memoized key derivations and decrypted plaintexts"""
+    derive_keys.cache_clear()
+    with _DECRYPTED_LOCK:
+        _DECRYPTED.clear()
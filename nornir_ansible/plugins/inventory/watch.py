@@ -0,0 +1,243 @@
+"""nornir_ansible.inventory.watch"""
+
+import logging
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Set, Tuple
+
+from nornir.core.inventory import Group, Inventory
+
+from nornir_ansible.plugins.inventory.elements import InventoryBuilder, LazyHost
+
+if TYPE_CHECKING:
+    from nornir_ansible.plugins.inventory.ansible import AnsibleInventory
+
+LOG = logging.getLogger(__name__)
+
+# fields of nornir inventory elements updated in place by `patch_inventory`
+PATCHED_FIELDS = (
+    "hostname",
+    "port",
+    "username",
+    "password",
+    "platform",
+    "data",
+    "connection_options",
+)
+
+
+class InventoryDiff:
+    def __init__(self) -> None:
+        """
+        Hosts, groups and defaults that changed between two parses of an inventory
+
+        Hosts of host ranges are reported by their name, like any other host.
+
+        """
+        self.added_hosts: Set[str] = set()
+        self.removed_hosts: Set[str] = set()
+        self.changed_hosts: Set[str] = set()
+        self.added_groups: Set[str] = set()
+        self.removed_groups: Set[str] = set()
+        self.changed_groups: Set[str] = set()
+        self.defaults_changed = False
+
+    def __bool__(self) -> bool:
+        return bool(
+            self.added_hosts
+            or self.removed_hosts
+            or self.changed_hosts
+            or self.added_groups
+            or self.removed_groups
+            or self.changed_groups
+            or self.defaults_changed
+        )
+
+    def __repr__(self) -> str:
+        return (
+            f"InventoryDiff(hosts=+{len(self.added_hosts)}/-{len(self.removed_hosts)}/"
+            f"~{len(self.changed_hosts)}, groups=+{len(self.added_groups)}/"
+            f"-{len(self.removed_groups)}/~{len(self.changed_groups)}, "
+            f"defaults_changed={self.defaults_changed})"
+        )
+
+    def dict(self) -> Dict[str, Any]:
+        """Return the diff as a dict of sorted names"""
+        return {
+            "added_hosts": sorted(self.added_hosts),
+            "removed_hosts": sorted(self.removed_hosts),
+            "changed_hosts": sorted(self.changed_hosts),
+            "added_groups": sorted(self.added_groups),
+            "removed_groups": sorted(self.removed_groups),
+            "changed_groups": sorted(self.changed_groups),
+            "defaults_changed": self.defaults_changed,
+        }
+
+
+def diff_elements(
+    old: Dict[str, Dict[str, Any]], new: Dict[str, Dict[str, Any]]
+) -> Tuple[Set[str], Set[str], Set[str]]:
+    """
+    Return the added, removed and changed names of two parsed host/group mappings
+
+    Records that were not re-parsed are the same objects in both mappings and are not compared.
+
+    Arguments:
+        old: parsed hosts/groups before the reload
+        new: parsed hosts/groups after the reload
+
+    """
+    added = new.keys() - old.keys()
+    removed = old.keys() - new.keys()
+    changed = {
+        name
+        for name, data in new.items()
+        if name in old and old[name] is not data and old[name] != data
+    }
+    return set(added), set(removed), changed
+
+
+def patch_inventory(
+    inventory: Inventory, ansible_inventory: "AnsibleInventory", diff: InventoryDiff
+) -> None:
+    """
+    Apply a reload diff to a nornir `Inventory` returned by `AnsibleInventory.load`
+
+    Existing hosts, groups and defaults are updated in place, so references held elsewhere (i.e.
+    by filtered `Nornir` objects) see the new data. The update is not atomic, tasks running while
+    the inventory is patched may see a mix of old and new data. New elements are built by the
+    `InventoryBuilder` that built the inventory, with the same options.
+
+    Arguments:
+        inventory: nornir inventory to update
+        ansible_inventory: the reloaded inventory
+        diff: diff returned by `AnsibleInventory.reload`
+
+    """
+    builder = getattr(inventory.hosts, "builder", None)
+    if builder is None:
+        # not built by `AnsibleInventory.load`, elements then get the parsed vars as is
+        builder = InventoryBuilder({})
+        builder.defaults = inventory.defaults
+    builder.groups = inventory.groups
+    if diff.defaults_changed:
+        _update_element(
+            inventory.defaults,
+            builder.build_defaults(ansible_inventory.get_group_data(ansible_inventory.defaults)),
+        )
+
+    _patch_groups(builder, ansible_inventory, diff)
+
+    for name in diff.removed_hosts:
+        inventory.hosts.pop(name, None)
+    if not diff.added_hosts and not diff.changed_hosts:
+        return
+
+    lazy_hosts = ansible_inventory.lazy_hosts
+    for name, data in ansible_inventory.iter_hosts(diff.added_hosts | diff.changed_hosts):
+        host = ansible_inventory.build_host(builder, name, data, lazy_hosts)
+        if name in inventory.hosts:
+            _update_element(inventory.hosts[name], host)
+            inventory.hosts[name].groups = host.groups
+        else:
+            inventory.hosts[name] = host
+
+
+def _patch_groups(
+    builder: InventoryBuilder, ansible_inventory: "AnsibleInventory", diff: InventoryDiff
+) -> None:
+    """
+    Apply the group changes of a reload diff to the groups of a nornir `Inventory`
+
+    Arguments:
+        builder: builder of the nornir inventory, its `groups` being the inventory groups
+        ansible_inventory: the reloaded inventory
+        diff: diff returned by `AnsibleInventory.reload`
+
+    """
+    groups = ansible_inventory.groups
+    for name in diff.removed_groups:
+        builder.groups.pop(name, None)
+    for name in diff.added_groups | diff.changed_groups:
+        group = builder.build(Group, ansible_inventory.get_group_data(groups[name]), name)
+        if name in builder.groups:
+            _update_element(builder.groups[name], group)
+        else:
+            builder.groups[name] = group
+    for name in diff.added_groups | diff.changed_groups:
+        builder.groups[name].groups = builder.get_parents(groups[name]["groups"])
+
+
+def _update_element(element: Any, new: Any) -> None:
+    """
+    Copy the data and connection fields of `new` onto `element`
+
+    A pending `LazyHost` is copied as such, the data of the element is then loaded again on
+    first access. The deferred fields of a loaded one are computed to be copied.
+
+    Arguments:
+        element: nornir host, group or defaults to update
+        new: element holding the new fields
+
+    """
+    if isinstance(new, LazyHost):
+        if isinstance(element, LazyHost):
+            object.__setattr__(element, "_loader", object.__getattribute__(new, "_loader"))
+            object.__setattr__(element, "_deferred", {})
+            return
+        new.dict()
+    elif isinstance(element, LazyHost):
+        object.__setattr__(element, "_loader", None)
+        object.__setattr__(element, "_deferred", {})
+    for field in PATCHED_FIELDS:
+        object.__setattr__(element, field, object.__getattribute__(new, field))
+
+
+class InventoryWatcher(threading.Thread):
+    def __init__(
+        self,
+        ansible_inventory: "AnsibleInventory",
+        interval: float = 5.0,
+        inventory: Optional[Inventory] = None,
+        callback: Optional[Callable[[InventoryDiff], None]] = None,
+    ) -> None:
+        """
+        Daemon thread polling the sources of an inventory and reloading it when they change
+
+        Sources are polled with `os.stat`, the watcher has no dependency on inotify and works on
+        network file systems. Errors of a reload (i.e. a hosts file saved half way) are logged and
+        the reload is retried on the next poll.
+
+        Arguments:
+            ansible_inventory: inventory to reload
+            interval: seconds between two polls
+            inventory: optional nornir inventory to patch in place, see `patch_inventory`
+            callback: optional callable called with the diff of every reload that changed anything
+
+        """
+        super().__init__(name="nornir_ansible-watcher", daemon=True)
+        self.ansible_inventory = ansible_inventory
+        self.interval = interval
+        self.inventory = inventory
+        self.callback = callback
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(self.interval):
+            self.poll()
+
+    def poll(self) -> Optional[InventoryDiff]:
+        """Reload the inventory if any of its sources changed, return the diff of the reload"""
+        if not self.ansible_inventory.get_changed_sources():
+            return None
+        try:
+            diff = self.ansible_inventory.reload(inventory=self.inventory)
+        except Exception:  # pylint: disable=broad-except
+            LOG.exception("AnsibleInventory: unable to reload the inventory")
+            return None
+        if diff and self.callback is not None:
+            self.callback(diff)
+        return diff
+
+    def stop(self) -> None:
+        """Stop polling, the thread exits after its current poll"""
+        self._stop_event.set()
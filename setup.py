@@ -16,12 +16,16 @@ setuptools.setup(
     long_description=README,
     long_description_content_type="text/markdown",
     url="https://github.com/carlmontanari/nornir_ansible",
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=["benchmarks", "benchmarks.*"]),
     install_requires=[
         "ruamel.yaml>=0.16.10,<1.0.0",
         "nornir>=3.4.0,<4.0.0",
     ],
-    extras_require={},
+    extras_require={
+        "libyaml": ["ruamel.yaml[libyaml]"],
+        "jinja2": ["jinja2>=3.0"],
+        "vault": ["cryptography"],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "Programming Language :: Python :: 3.8",
@@ -32,5 +36,9 @@ setuptools.setup(
     entry_points="""
     [nornir.plugins.inventory]
     AnsibleInventory=nornir_ansible.plugins.inventory:AnsibleInventory
+    CompiledInventory=nornir_ansible.plugins.inventory:CompiledInventory
+    SharedAnsibleInventory=nornir_ansible.plugins.inventory:SharedAnsibleInventory
+    [console_scripts]
+    nornir-ansible=nornir_ansible.cli:main
     """,
 )
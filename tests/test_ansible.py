@@ -1,11 +1,31 @@
+import asyncio
+import json
 import os
+import pickle
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 import ruamel.yaml
 from nornir.core.exceptions import NornirNoValidInventoryError
 from nornir_utils.plugins.inventory import YAMLInventory
 
-from nornir_ansible.plugins.inventory import ansible
+from nornir_ansible import cli
+from nornir_ansible.plugins.inventory import (
+    CompiledInventory,
+    InventoryRegistry,
+    SharedAnsibleInventory,
+    ansible,
+    graph,
+)
+from nornir_ansible.plugins.inventory import parser as ansible_parser
+from nornir_ansible.plugins.inventory import registry as registry_module
+from nornir_ansible.plugins.inventory import script as script_parser
+from nornir_ansible.plugins.inventory import sources, templating, vars_files, vault
+from nornir_ansible.plugins.inventory.compact import Record
 
 BASE_PATH = os.path.join(os.path.dirname(__file__), "ansible")
 
@@ -50,3 +70,1497 @@ class Test(object):
         base_path = os.path.join(BASE_PATH, "parse_error")
         with pytest.raises(NornirNoValidInventoryError):
             ansible.parse(hostsfile=os.path.join(base_path, "source", "hosts"))
+
+    @pytest.mark.parametrize("name", sorted(ansible.MOVED_NAMES))
+    def test_moved_names(self, name):
+        with pytest.warns(DeprecationWarning, match=f"ansible.{name} is deprecated"):
+            value = getattr(ansible, name)
+        assert value is not None
+        with pytest.raises(AttributeError):
+            ansible.not_a_name
+
+    def test_vars_cache(self):
+        parser = ansible_parser.YAMLParser(os.path.join(BASE_PATH, "yaml", "source", "hosts"))
+        parser.parse()
+        # foo.example.com is in both webservers and frontend, its host vars are resolved once
+        assert ("host_vars", "foo.example.com") in parser.vars_cache.elements
+        assert parser.vars_cache.hits == 1
+
+        hits = parser.vars_cache.hits
+        assert parser.load_vars("dbservers", is_host=False)["my_var"] == "from_dbservers"
+        assert parser.vars_cache.hits == hits + 1
+
+    def test_vars_index(self):
+        base_path = os.path.join(BASE_PATH, "yaml4", "source")
+        index = vars_files.VarsIndex(os.path.join(base_path, "group_vars"))
+        assert index.files["iosxr"] == os.path.join(base_path, "group_vars", "iosxr.yml")
+        assert sorted(index.dirs) == ["all", "eric_eccli"]
+        assert index.get_dir_files("eric_eccli") == [
+            os.path.join(base_path, "group_vars", "eric_eccli", "ntp", "ntp.yml")
+        ]
+        assert index.get_dir_files("missing") == []
+
+        assert vars_files.VarsIndex(os.path.join(base_path, "missing")).files == {}
+
+    def test_inventory_cache(self, tmp_path, monkeypatch):
+        source = tmp_path / "source"
+        shutil.copytree(os.path.join(BASE_PATH, "yaml4", "source"), source)
+        hostsfile = str(source / "hosts")
+        cache_dir = str(tmp_path / "cache")
+
+        expected = ansible.parse(hostsfile)
+        assert ansible.parse(hostsfile, cache_dir=cache_dir) == expected
+        assert len(os.listdir(cache_dir)) == 1
+
+        # warm start, no parsing at all
+        with monkeypatch.context() as m:
+            m.setattr(sources, "get_parser", lambda *_, **__: pytest.fail("inventory was parsed"))
+            assert ansible.parse(hostsfile, cache_dir=cache_dir) == expected
+
+        with open(source / "group_vars" / "iosxr.yml", "a") as f:
+            f.write("\nnew_var: 1\n")
+        hosts, groups, defaults = ansible.parse(hostsfile, cache_dir=cache_dir)
+        assert groups["iosxr"]["data"]["new_var"] == 1
+
+        (source / "host_vars" / "lab_a_router_02" / "extra.yml").write_text("extra_var: 1\n")
+        hosts, groups, defaults = ansible.parse(hostsfile, cache_dir=cache_dir)
+        assert hosts["lab_a_router_02"]["data"]["extra_var"] == 1
+
+    @pytest.mark.parametrize("vars_executor", ["thread", "process"])
+    @pytest.mark.parametrize("case", ["ini", "yaml", "yaml4", "yaml5"])
+    def test_vars_executor(self, case, vars_executor):
+        hostsfile = os.path.join(BASE_PATH, case, "source", "hosts")
+        assert ansible.parse(hostsfile, vars_executor=vars_executor) == ansible.parse(hostsfile)
+
+    def test_vars_executor_instance(self):
+        hostsfile = os.path.join(BASE_PATH, "yaml", "source", "hosts")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            inv = ansible.AnsibleInventory(hostsfile=hostsfile, vars_executor=executor)
+            assert inv.options["vars_executor"] is executor
+            assert inv.load().dict() == ansible.AnsibleInventory(hostsfile=hostsfile).load().dict()
+            assert not inv.reload().changed_hosts
+            # the shared executor is not shut down by the inventory
+            assert executor.submit(int, "1").result() == 1
+
+    def test_vars_executor_invalid(self):
+        with pytest.raises(ValueError):
+            ansible.parse(os.path.join(BASE_PATH, "yaml", "source", "hosts"), vars_executor="foo")
+
+    def test_vars_decoders(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(vars_files, "VARS_DECODERS", dict(vars_files.VARS_DECODERS))
+        monkeypatch.setattr(
+            vars_files, "VARS_FILENAME_EXTENSIONS", list(vars_files.VARS_FILENAME_EXTENSIONS)
+        )
+        vars_files.register_vars_decoder(".bjson", lambda f: json.loads(f.read()), binary=True)
+
+        (tmp_path / "hosts").write_text("all:\n  children:\n    g1:\n      hosts:\n        h1:\n")
+        (tmp_path / "group_vars").mkdir()
+        (tmp_path / "group_vars" / "g1.json").write_text('{"ansible_user": "admin", "a": 1}')
+        (tmp_path / "host_vars" / "h1").mkdir(parents=True)
+        (tmp_path / "host_vars" / "h1" / "b.bjson").write_bytes(b'{"b": 2}')
+
+        hosts, groups, _ = ansible.parse(str(tmp_path / "hosts"))
+        assert groups["g1"]["username"] == "admin"
+        assert groups["g1"]["data"] == {"a": 1}
+        assert hosts["h1"]["data"] == {"b": 2}
+
+        (tmp_path / "group_vars" / "g1.json").write_text('{"a": ')
+        with pytest.raises(NornirNoValidInventoryError, match="no valid YAML file"):
+            ansible.parse(str(tmp_path / "hosts"))
+
+    def test_vars_dir_merge_order(self, tmp_path):
+        (tmp_path / "hosts").write_text("all:\n  hosts:\n    h1:\n")
+        vars_dir = tmp_path / "host_vars" / "h1"
+        (vars_dir / "b").mkdir(parents=True)
+        (vars_dir / "a.yml").write_text("a: a.yml\nb: a.yml\nc: a.yml\nd: a.yml\n")
+        (vars_dir / "b" / "x.yml").write_text("b: b/x.yml\nc: b/x.yml\nd: b/x.yml\n")
+        (vars_dir / "c.yml").write_text("c: c.yml\nd: c.yml\n")
+        (vars_dir / "d").write_text("d: d\n")
+        (vars_dir / ".hidden.yml").write_text("d: .hidden.yml\n")
+        (vars_dir / "e.yml~").write_text("d: e.yml~\n")
+
+        parser = ansible_parser.get_parser(str(tmp_path / "hosts"))
+        files = parser.get_vars_index(str(tmp_path), "host_vars").get_dir_files("h1")
+        assert [os.path.relpath(f, vars_dir) for f in files] == [
+            "a.yml",
+            os.path.join("b", "x.yml"),
+            "c.yml",
+            "d",
+        ]
+        hosts, _, _ = ansible.parse(str(tmp_path / "hosts"))
+        assert hosts["h1"]["data"] == {"a": "a.yml", "b": "b/x.yml", "c": "c.yml", "d": "d"}
+
+    @pytest.mark.parametrize("case", ["ini", "yaml", "yaml4", "yaml5"])
+    def test_lazy(self, case):
+        hostsfile = os.path.join(BASE_PATH, case, "source", "hosts")
+        inv = ansible.AnsibleInventory(hostsfile=hostsfile, lazy=True)
+        expected = ansible.AnsibleInventory(hostsfile=hostsfile)
+
+        serialized_inv = inv.load()
+        assert set(inv.parser.lazy_hosts) == set(expected.hosts)
+        assert not any(k[0] == "host_vars" for k in inv.parser.vars_cache.elements)
+        assert all(isinstance(h, ansible.LazyHost) for h in serialized_inv.hosts.values())
+
+        host_name = sorted(expected.hosts)[0]
+        assert serialized_inv.hosts[host_name].hostname == expected.hosts[host_name]["hostname"]
+        assert host_name not in inv.parser.lazy_hosts
+        assert len(inv.parser.lazy_hosts) == len(expected.hosts) - 1
+
+        assert serialized_inv.dict() == expected.load().dict()
+        assert inv.hosts == expected.hosts
+        assert not inv.parser.lazy_hosts
+
+    @pytest.mark.parametrize(
+        "limit,expected_hosts,expected_groups",
+        [
+            (
+                "dbservers:!three.example.com",
+                ["one.example.com", "two.example.com"],
+                ["dbservers", "servers"],
+            ),
+            ("servers:&frontend", ["foo.example.com"], ["frontend", "servers", "webservers"]),
+            ("~t.*", ["three.example.com", "two.example.com"], ["dbservers", "servers"]),
+            (
+                "*.example.com,!db*",
+                ["bar.example.com", "foo.example.com"],
+                ["frontend", "servers", "webservers"],
+            ),
+            (["frontend"], ["foo.example.com"], ["frontend", "servers", "webservers"]),
+        ],
+    )
+    @pytest.mark.parametrize("case", ["ini", "yaml"])
+    def test_limit(self, case, limit, expected_hosts, expected_groups):
+        hostsfile = os.path.join(BASE_PATH, case, "source", "hosts")
+        full_hosts, full_groups, _ = ansible.parse(hostsfile)
+
+        parser = ansible.get_parser(hostsfile, limit=limit)
+        parser.parse()
+        assert sorted(parser.hosts) == expected_hosts
+        assert sorted(parser.groups) == expected_groups
+        assert parser.hosts == {h: full_hosts[h] for h in expected_hosts}
+        for sub_dir, element in parser.vars_cache.elements:
+            assert element in (
+                expected_hosts if sub_dir == "host_vars" else expected_groups + ["all"]
+            )
+
+    @pytest.mark.parametrize("shard_by", ["host", "group"])
+    def test_shard(self, tmp_path, shard_by):
+        (tmp_path / "host_vars").mkdir()
+        lines = ["all:", "  children:"]
+        for site in range(4):
+            lines += [f"    site{site}:", "      hosts:"]
+            for i in range(8):
+                lines.append(f"        r{site}-{i}: {{}}")
+                (tmp_path / "host_vars" / f"r{site}-{i}.yml").write_text(f"id: {site}-{i}\n")
+        lines += ["    ios:", "      hosts: {r0-0: {}, r1-0: {}, r2-0: {}, r3-0: {}}"]
+        (tmp_path / "hosts").write_text("\n".join(lines) + "\n")
+        hostsfile, cache_dir = str(tmp_path / "hosts"), str(tmp_path / "cache")
+        full = ansible.AnsibleInventory(hostsfile=hostsfile)
+
+        shards = []
+        for shard_index in range(3):
+            inv = ansible.AnsibleInventory(
+                hostsfile=hostsfile,
+                cache_dir=cache_dir,
+                shard_index=shard_index,
+                shard_count=3,
+                shard_by=shard_by,
+            )
+            assert inv.hosts == {host: full.hosts[host] for host in inv.hosts}
+            groups = {group for host in inv.hosts.values() for group in host["groups"]}
+            assert set(inv.groups) == groups
+            assert {name for sub_dir, name in inv.parser.vars_cache.elements} <= {
+                "all",
+                *inv.hosts,
+                *groups,
+            }
+            shards.append(set(inv.hosts))
+            cached = ansible.AnsibleInventory(
+                hostsfile=hostsfile,
+                cache_dir=cache_dir,
+                shard_index=shard_index,
+                shard_count=3,
+                shard_by=shard_by,
+            )
+            assert cached.parser is None
+            assert cached.hosts == inv.hosts
+
+        assert sum(len(hosts) for hosts in shards) == len(full.hosts)
+        assert set().union(*shards) == set(full.hosts)
+        assert all(shards)
+        if shard_by == "group":
+            for site in range(4):
+                site_hosts = {f"r{site}-{i}" for i in range(8)}
+                assert sum(1 for hosts in shards if hosts & site_hosts) == 1
+
+    @pytest.mark.parametrize(
+        "options",
+        [{"shard_index": 2, "shard_count": 2}, {"shard_index": -1}, {"shard_by": "rack"}],
+    )
+    def test_shard_invalid(self, options):
+        with pytest.raises(ValueError):
+            ansible.AnsibleInventory(
+                hostsfile=os.path.join(BASE_PATH, "yaml", "source", "hosts"), **options
+            )
+
+    def test_ini_parser(self, tmp_path):
+        hostsfile = tmp_path / "hosts"
+        hostsfile.write_text(
+            "# ungrouped hosts\n"
+            "Ungrouped1 ansible_host=192.0.2.1\n"
+            "\n"
+            "[Web]\n"
+            'web1\tansible_port=2222 motd="hello world" # comment\n'
+            "web2:2222\n"
+            "[web:vars]\n"
+            "quoted = 'a b'\n"
+            "plain 10\n"
+            "[Web]\n"
+            "web1 extra=1\n"
+        )
+        assert ansible_parser.sniff_format(str(hostsfile)) == "ini"
+        parser = ansible.get_parser(str(hostsfile))
+        assert parser.original_data == {
+            "all": {
+                "hosts": {"Ungrouped1": {"ansible_host": "192.0.2.1"}},
+                "children": {
+                    "Web": {
+                        "hosts": {
+                            "web1": {"ansible_port": 2222, "motd": "hello world", "extra": 1},
+                            "web2:2222": {},
+                        }
+                    },
+                    "web": {"vars": {"quoted": "a b", "plain": 10}},
+                },
+            }
+        }
+
+    @pytest.mark.parametrize(
+        "content",
+        ["[web]\nweb1 ansible_host\n", "[web:foo]\nweb1\n", '[web]\nweb1 a="b\n', "[web\n"],
+    )
+    def test_ini_parser_error(self, tmp_path, content):
+        hostsfile = tmp_path / "hosts"
+        hostsfile.write_text(content)
+        with pytest.raises(NornirNoValidInventoryError):
+            ansible.parse(str(hostsfile))
+
+    @pytest.mark.parametrize("case", ["yaml", "yaml2", "yaml3", "yaml4", "yaml5"])
+    def test_sniff_format(self, case):
+        assert (
+            ansible_parser.sniff_format(os.path.join(BASE_PATH, case, "source", "hosts")) == "yaml"
+        )
+
+    @pytest.mark.parametrize(
+        "pattern,expected",
+        [
+            ("leaf[01:03]", ["leaf01", "leaf02", "leaf03"]),
+            (
+                "web[1:10:4].example.com",
+                ["web1.example.com", "web5.example.com", "web9.example.com"],
+            ),
+            ("db-[a:b]-[:1]", ["db-a-0", "db-a-1", "db-b-0", "db-b-1"]),
+            ("plain", ["plain"]),
+        ],
+    )
+    def test_expand_hostname_range(self, pattern, expected):
+        assert list(graph.expand_hostname_range(pattern)) == expected
+
+    @pytest.mark.parametrize("pattern", ["leaf[01:100]", "leaf[1:]", "leaf[1:z]"])
+    def test_expand_hostname_range_error(self, pattern):
+        with pytest.raises(ValueError):
+            list(graph.expand_hostname_range(pattern))
+
+    @pytest.mark.parametrize(
+        "ranges,explicit",
+        [
+            (
+                "[leafs]\nleaf[01:03] role=leaf\n[rack1]\nleaf[01:03]\n[special]\nleaf02 x=1\n"
+                "[dbs]\ndb-[a:b]-[1:2] ansible_port=22\n",
+                "[leafs]\nleaf01 role=leaf\nleaf02 role=leaf\nleaf03 role=leaf\n"
+                "[rack1]\nleaf01\nleaf02\nleaf03\n[special]\nleaf02 x=1\n"
+                "[dbs]\ndb-a-1 ansible_port=22\ndb-a-2 ansible_port=22\n"
+                "db-b-1 ansible_port=22\ndb-b-2 ansible_port=22\n",
+            ),
+        ],
+    )
+    def test_host_ranges(self, tmp_path, ranges, explicit):
+        for name, content in (("ranges", ranges), ("explicit", explicit)):
+            (tmp_path / name / "host_vars").mkdir(parents=True)
+            (tmp_path / name / "hosts").write_text(content)
+            (tmp_path / name / "host_vars" / "leaf03.yml").write_text("hv: 1\n")
+
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "ranges" / "hosts"))
+        assert sorted(inv.hosts) == ["leaf02", "leaf03"]
+        assert inv.host_ranges["leaf[01:03]"]["hosts"] == ["leaf01"]
+        assert inv.host_ranges["leaf[01:03]"]["groups"] == ["leafs", "rack1"]
+        assert len(inv.host_ranges["db-[a:b]-[1:2]"]["hosts"]) == 4
+
+        expected = ansible.AnsibleInventory(hostsfile=str(tmp_path / "explicit" / "hosts"))
+        assert ansible.parse(str(tmp_path / "ranges" / "hosts"))[0] == expected.hosts
+        assert inv.load().dict() == expected.load().dict()
+
+        parser = ansible.get_parser(str(tmp_path / "ranges" / "hosts"), limit="leaf0[1:2]")
+        parser.parse()
+        assert sorted(parser.hosts) == ["leaf02"]
+        assert parser.host_ranges["leaf[01:03]"]["hosts"] == ["leaf01"]
+
+    @pytest.mark.parametrize("case", ["ini", "yaml"])
+    def test_load_stats(self, case, caplog):
+        hostsfile = os.path.join(BASE_PATH, case, "source", "hosts")
+        assert not ansible.AnsibleInventory(hostsfile=hostsfile).stats.enabled
+
+        emitted = []
+        inv = ansible.AnsibleInventory(
+            hostsfile=hostsfile, log_stats=True, stats_callback=emitted.append
+        )
+        with caplog.at_level("INFO", logger=ansible.LOG.name):
+            inv.load()
+        assert emitted == [inv.stats]
+        assert "AnsibleInventory: load stats" in caplog.text
+
+        stats = inv.stats.dict()
+        for phase in ("hosts_file", "graph", "parse", "group_vars", "host_vars", "load"):
+            assert stats["phases"][phase]["calls"] >= 1
+        assert stats["phases"]["parse"]["wall"] >= stats["phases"]["group_vars"]["wall"]
+
+        files = list(inv.parser.vars_cache.fingerprints)
+        counters = stats["counters"]
+        assert counters["files_parsed"] == len(files) + 1
+        assert counters["bytes_read"] == os.path.getsize(hostsfile) + sum(
+            os.path.getsize(f) for f in files
+        )
+        assert counters["files_stat"] >= counters["files_opened"] == counters["files_parsed"]
+        assert counters["vars_cache_misses"] == inv.parser.vars_cache.misses
+        slowest = stats["slowest_vars_files"]
+        assert len(slowest) == min(len(files), inv.stats.slowest)
+        assert [t for _, t in slowest] == sorted((t for _, t in slowest), reverse=True)
+
+    def test_group_graph(self, tmp_path):
+        # 40 layers of 2 groups, each a child of both groups of the previous layer: 2**40 paths
+        layers = 40
+        lines = ["[l0a]", "h0", "[l0b]", "h1"]
+        for i in range(layers - 1):
+            for parent in (f"l{i}a", f"l{i}b"):
+                lines += [f"[{parent}:children]", f"l{i + 1}a", f"l{i + 1}b"]
+        lines += [f"[l{layers - 1}a]", "leaf", f"[l{layers - 1}a:vars]", "depth=deep"]
+        (tmp_path / "hosts").write_text("\n".join(lines) + "\n")
+
+        hosts, groups, _ = ansible.parse(str(tmp_path / "hosts"))
+        assert len(groups) == 2 * layers
+        assert groups["l10a"]["groups"] == ["l9a", "l9b"]
+        assert hosts["leaf"]["groups"] == [f"l{layers - 1}a"]
+        assert groups[f"l{layers - 1}a"]["data"] == {"depth": "deep"}
+
+        # a chain deeper than the recursion limit
+        chain = "".join(f"[g{i}:children]\ng{i + 1}\n" for i in range(3000)) + "[g3000]\nh\n"
+        (tmp_path / "hosts").write_text(chain)
+        _, groups, _ = ansible.parse(str(tmp_path / "hosts"))
+        assert groups["g3000"]["groups"] == ["g2999"]
+
+    @pytest.mark.parametrize(
+        "content,cycle",
+        [
+            ("[a:children]\nb\n[b:children]\nc\n[c:children]\na\n", "a -> b -> c -> a"),
+            (
+                "all:\n  children:\n    a:\n      children:\n        b:\n          children:\n"
+                "            a:\n",
+                "a -> b -> a",
+            ),
+            ("all:\n  children:\n    a: &a\n      children:\n        b: *a\n", "b -> b"),
+        ],
+    )
+    def test_group_cycle(self, tmp_path, content, cycle):
+        (tmp_path / "hosts").write_text(content)
+        with pytest.raises(NornirNoValidInventoryError, match=f"group cycle detected: {cycle}"):
+            ansible.parse(str(tmp_path / "hosts"))
+
+    @staticmethod
+    def write(path, content):
+        """Write a source and move its mtime (and its directory's) forward to be seen as changed"""
+        existed = path.exists()
+        path.write_text(content)
+        for changed in (path,) if existed else (path, path.parent):
+            stat = changed.stat()
+            os.utime(changed, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def test_reload(self, tmp_path):
+        shutil.copytree(os.path.join(BASE_PATH, "yaml", "source"), tmp_path / "source")
+        hostsfile = tmp_path / "source" / "hosts"
+        inv = ansible.AnsibleInventory(hostsfile=str(hostsfile))
+        parser = inv.parser
+        nornir_inv = inv.load()
+        one = nornir_inv.hosts["one.example.com"]
+        assert not inv.get_changed_sources()
+        assert not inv.reload()
+
+        # vars files only: the affected hosts/groups are re-parsed by the same parser
+        self.write(tmp_path / "source" / "host_vars" / "two.example.com.yaml", "new_var: 2\n")
+        self.write(tmp_path / "source" / "host_vars" / "bar.example.com.yml", "ansible_port: 2\n")
+        self.write(tmp_path / "source" / "group_vars" / "dbservers.yml", "db_var: 1\n")
+        diff = inv.reload(inventory=nornir_inv)
+        assert inv.parser is parser
+        assert diff.dict() == {
+            "added_hosts": [],
+            "removed_hosts": [],
+            "changed_hosts": ["bar.example.com", "two.example.com"],
+            "added_groups": [],
+            "removed_groups": [],
+            "changed_groups": ["dbservers"],
+            "defaults_changed": False,
+        }
+        expected = ansible.AnsibleInventory(hostsfile=str(hostsfile))
+        assert inv.hosts == expected.hosts
+        assert inv.groups == expected.groups
+        assert nornir_inv.dict() == expected.load().dict()
+        assert nornir_inv.hosts["one.example.com"] is one
+        assert nornir_inv.hosts["bar.example.com"].port == 2
+        assert not inv.get_changed_sources()
+
+        # hosts file: full parse
+        content = hostsfile.read_text().replace("three.example.com:", "four.example.com:")
+        self.write(
+            hostsfile, content + "        new:\n          hosts:\n            one.example.com:\n"
+        )
+        diff = inv.reload(inventory=nornir_inv)
+        assert inv.parser is not parser
+        assert diff.added_hosts == {"four.example.com"}
+        assert diff.removed_hosts == {"three.example.com"}
+        assert diff.changed_hosts == {"one.example.com"}
+        assert diff.added_groups == {"new"}
+        expected = ansible.AnsibleInventory(hostsfile=str(hostsfile))
+        assert nornir_inv.dict() == expected.load().dict()
+        assert nornir_inv.hosts["one.example.com"] is one
+        assert [g.name for g in one.groups] == ["dbservers", "new"]
+
+    def test_reload_errors(self, tmp_path):
+        shutil.copytree(os.path.join(BASE_PATH, "yaml", "source"), tmp_path / "source")
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "source" / "hosts"))
+        hosts = dict(inv.hosts)
+
+        self.write(tmp_path / "source" / "host_vars" / "two.example.com.yaml", "foo: [\n")
+        with pytest.raises(NornirNoValidInventoryError):
+            inv.reload()
+        assert inv.hosts == hosts
+        assert inv.get_changed_sources()
+
+        self.write(tmp_path / "source" / "host_vars" / "two.example.com.yaml", "fixed: true\n")
+        assert inv.reload().changed_hosts == {"two.example.com"}
+        assert inv.hosts["two.example.com"]["data"]["fixed"] is True
+
+    @pytest.mark.parametrize("lazy", [False, True])
+    def test_reload_builder(self, tmp_path, lazy):
+        (tmp_path / "host_vars").mkdir()
+        options = "connection_options: {netmiko: {extras: {a: 1}}}"
+        (tmp_path / "hosts").write_text(f"all:\n  hosts:\n    h1: {{{options}}}\n")
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "hosts"), lazy=lazy)
+        nornir_inv = inv.load(copy_data=True)
+        h1 = nornir_inv.hosts["h1"]
+
+        # patched hosts are built like loaded ones: own vars, shared connection options
+        self.write(
+            tmp_path / "hosts",
+            f"all:\n  vars: {{x: 1}}\n  hosts:\n    h1: {{{options}}}\n    h2: {{{options}}}\n",
+        )
+        self.write(tmp_path / "host_vars" / "h1.yml", "y: 1\n")
+        diff = inv.reload(inventory=nornir_inv)
+        assert diff.added_hosts == {"h2"}
+        assert diff.defaults_changed
+        h2 = nornir_inv.hosts["h2"]
+        assert nornir_inv.hosts["h1"] is h1
+        assert h2.connection_options["netmiko"] is h1.connection_options["netmiko"]
+        assert h1["y"] == 1
+        h1.data["y"] = 2
+        h2.data["z"] = 1
+        nornir_inv.defaults.data["x"] = 2
+        assert inv.dict()["hosts"]["h1"]["data"] == {"y": 1}
+        assert "z" not in inv.dict()["hosts"]["h2"]["data"]
+        assert inv.defaults["data"] == {"x": 1}
+
+    def test_reload_lazy(self, tmp_path):
+        shutil.copytree(os.path.join(BASE_PATH, "yaml", "source"), tmp_path / "source")
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "source" / "hosts"), lazy=True)
+        nornir_inv = inv.load()
+        host = nornir_inv.hosts["two.example.com"]
+        assert host.data["my_var"] == "from_hostfile"
+
+        self.write(tmp_path / "source" / "host_vars" / "two.example.com.yaml", "my_var: new\n")
+        diff = inv.reload(inventory=nornir_inv)
+        assert diff.changed_hosts == {"two.example.com"}
+        assert nornir_inv.hosts["two.example.com"] is host
+        assert host.data["my_var"] == "new"
+
+    def test_reload_lazy_accessed(self, tmp_path):
+        (tmp_path / "host_vars").mkdir()
+        (tmp_path / "host_vars" / "h2.yml").write_text("c: 1\n")
+        (tmp_path / "hosts").write_text(
+            "all:\n  hosts:\n    h1:\n      a: 1\n    h2:\n      b: 1\n"
+        )
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "hosts"), lazy=True)
+        nornir_inv = inv.load()
+        h2 = nornir_inv.hosts["h2"]
+        assert h2.data == {"b": 1, "c": 1}
+
+        # accessed hosts that did not change are compared resolved on both sides
+        for value in (2, 3):
+            self.write(
+                tmp_path / "hosts",
+                f"all:\n  hosts:\n    h1:\n      a: {value}\n    h2:\n      b: 1\n",
+            )
+            diff = inv.reload(inventory=nornir_inv)
+            assert diff.changed_hosts == {"h1"}
+            assert nornir_inv.hosts["h2"] is h2
+            assert h2.data == {"b": 1, "c": 1}
+            assert nornir_inv.hosts["h1"].data == {"a": value}
+
+    def test_lazy_locks(self, tmp_path):
+        (tmp_path / "hosts").write_text("all:\n  hosts:\n    h1:\n    h2:\n")
+        inventories = [
+            ansible.AnsibleInventory(hostsfile=str(tmp_path / "hosts"), lazy=True) for _ in range(2)
+        ]
+        hosts = [inv.load().hosts["h1"] for inv in inventories]
+        both_resolving = threading.Barrier(2, timeout=5)
+        for inv in inventories:
+            resolve = inv.inventory_sources[0].resolve_host
+
+            def resolve_host(name, inv=inv, resolve=resolve):
+                # every path resolving hosts holds the lock of its inventory
+                assert inv._resolve_lock._is_owned()
+                if name == "h1":
+                    both_resolving.wait()
+                return resolve(name)
+
+            inv.inventory_sources[0].resolve_host = resolve_host
+
+        # hosts of different inventories are resolved concurrently
+        threads = [threading.Thread(target=lambda host=host: host.data) for host in hosts]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert not both_resolving.broken
+        assert inventories[0].dict()["hosts"]["h2"]["hostname"] == "h2"
+
+    def test_watch(self, tmp_path):
+        shutil.copytree(os.path.join(BASE_PATH, "yaml", "source"), tmp_path / "source")
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "source" / "hosts"))
+        diffs = []
+        watcher = inv.watch(interval=0.01, callback=diffs.append)
+        try:
+            assert watcher.poll() is None
+            self.write(tmp_path / "source" / "group_vars" / "dbservers.yml", "db_var: 1\n")
+            watcher.join(timeout=0.5)
+        finally:
+            watcher.stop()
+        watcher.join(timeout=1)
+        assert not watcher.is_alive()
+        assert [diff.changed_groups for diff in diffs] == [{"dbservers"}]
+
+    def test_reload_cache(self, tmp_path):
+        shutil.copytree(os.path.join(BASE_PATH, "yaml", "source"), tmp_path / "source")
+        hostsfile, cache_dir = str(tmp_path / "source" / "hosts"), str(tmp_path / "cache")
+        ansible.AnsibleInventory(hostsfile=hostsfile, cache_dir=cache_dir)
+        inv = ansible.AnsibleInventory(hostsfile=hostsfile, cache_dir=cache_dir)
+        assert inv.parser is None
+
+        self.write(tmp_path / "source" / "group_vars" / "dbservers.yml", "db_var: 1\n")
+        assert inv.reload().changed_groups == {"dbservers"}
+        assert inv.parser is not None
+        self.write(tmp_path / "source" / "group_vars" / "dbservers.yml", "db_var: 22\n")
+        assert inv.reload().changed_groups == {"dbservers"}
+
+        cached = ansible.AnsibleInventory(hostsfile=hostsfile, cache_dir=cache_dir)
+        assert cached.parser is None
+        assert cached.groups["dbservers"]["data"] == {"db_var": 22}
+
+    def test_flatten_vars(self, tmp_path):
+        (tmp_path / "group_vars").mkdir()
+        (tmp_path / "host_vars").mkdir()
+        (tmp_path / "hosts").write_text(
+            "all:\n"
+            "  vars: {v: all, only_all: 1}\n"
+            "  children:\n"
+            "    top:\n"
+            "      vars: {v: top, w: top, ansible_user: top}\n"
+            "      children:\n"
+            "        mid:\n"
+            "          vars: {v: mid}\n"
+            "          hosts: {h1: {ansible_port: 22}, h2: {}}\n"
+            "    zeta:\n"
+            "      vars: {w: zeta, ansible_user: zeta}\n"
+            "      hosts: {h1: {}}\n"
+            "    prio:\n"
+            "      vars: {w: prio, ansible_group_priority: 0}\n"
+            "      hosts: {h1: {}}\n"
+        )
+        (tmp_path / "group_vars" / "zeta.yml").write_text("z: 1\n")
+        (tmp_path / "host_vars" / "h1.yml").write_text("v: host_vars\n")
+        hostsfile = str(tmp_path / "hosts")
+
+        inv = ansible.AnsibleInventory(hostsfile=hostsfile, flatten_vars=True)
+        assert inv.group_priorities == {"prio": 0}
+        nornir_inv = inv.load()
+        h1 = nornir_inv.hosts["h1"]
+        # depth 1 groups sorted by priority then name: prio, top, zeta; then mid (depth 2)
+        assert h1.data == {"v": "host_vars", "w": "zeta", "only_all": 1, "z": 1}
+        assert (h1.username, h1.port, h1.hostname) == ("zeta", 22, "h1")
+        assert nornir_inv.hosts["h2"].data == {"v": "mid", "w": "top", "only_all": 1}
+        assert nornir_inv.hosts["h2"].username == "top"
+        # groups themselves are not flattened
+        assert nornir_inv.groups["mid"].data == {"v": "mid"}
+
+        lazy = ansible.AnsibleInventory(hostsfile=hostsfile, flatten_vars=True, lazy=True)
+        assert lazy.load().dict() == nornir_inv.dict()
+
+        self.write(tmp_path / "group_vars" / "zeta.yml", "z: 2\n")
+        diff = inv.reload(inventory=nornir_inv)
+        assert diff.changed_groups == {"zeta"}
+        assert diff.changed_hosts == {"h1"}
+        assert h1.data["z"] == 2
+
+        # with priority 2 "prio" sorts after "top" and "zeta"
+        content = (tmp_path / "hosts").read_text()
+        self.write(tmp_path / "hosts", content.replace("priority: 0", "priority: 2"))
+        assert inv.reload(inventory=nornir_inv).changed_hosts == {"h1"}
+        assert h1.data["w"] == "prio"
+
+    def test_flatten_vars_group_vars(self, tmp_path):
+        (tmp_path / "group_vars").mkdir()
+        (tmp_path / "hosts").write_text(
+            "all:\n"
+            "  vars: {a: all_inline}\n"
+            "  children:\n"
+            "    parent:\n"
+            "      children:\n"
+            "        child:\n"
+            "          vars: {v: inline_child, a: inline_child, w: inline_child}\n"
+            "          hosts: {h1: {}}\n"
+        )
+        (tmp_path / "group_vars" / "all.yml").write_text("a: file_all\n")
+        (tmp_path / "group_vars" / "parent.yml").write_text("v: file_parent\nw: file_parent\n")
+        (tmp_path / "group_vars" / "child.yml").write_text("w: file_child\n")
+        options = {"hostsfile": str(tmp_path / "hosts"), "flatten_vars": True}
+
+        # inline vars of all groups first, then group_vars/all, then the group_vars of groups
+        expected = {"a": "file_all", "v": "file_parent", "w": "file_child"}
+        inv = ansible.AnsibleInventory(cache_dir=str(tmp_path / "cache"), **options)
+        nornir_inv = inv.load()
+        assert nornir_inv.hosts["h1"].data == expected
+        # groups keep their own merged vars
+        assert nornir_inv.groups["child"].data == {
+            "v": "inline_child",
+            "a": "inline_child",
+            "w": "file_child",
+        }
+        cached = ansible.AnsibleInventory(cache_dir=str(tmp_path / "cache"), **options)
+        assert cached.parser is None
+        assert cached.load().hosts["h1"].data == expected
+
+        # the group_vars of a group of another inventory file still win over inline vars
+        (tmp_path / "other").write_text(
+            "all:\n  children:\n    parent:\n      vars: {v: other_inline}\n"
+        )
+        merged = ansible.AnsibleInventory(
+            **{**options, "hostsfile": [str(tmp_path / "hosts"), str(tmp_path / "other")]}
+        )
+        assert merged.load().hosts["h1"].data == expected
+
+        self.write(tmp_path / "group_vars" / "child.yml", "w: file_child\nv: file_child\n")
+        diff = inv.reload(inventory=nornir_inv)
+        assert diff.changed_hosts == {"h1"}
+        assert nornir_inv.hosts["h1"]["v"] == "file_child"
+        # a var moving from the inline vars to the group_vars of a group keeps its record
+        content = (tmp_path / "hosts").read_text()
+        self.write(tmp_path / "hosts", content.replace(" v: inline_child,", ""))
+        self.write(tmp_path / "group_vars" / "child.yml", "w: file_child\n")
+        self.write(tmp_path / "group_vars" / "parent.yml", "v: inline_child\nw: file_parent\n")
+        assert inv.reload(inventory=nornir_inv).changed_hosts == {"h1"}
+        assert nornir_inv.hosts["h1"]["v"] == "inline_child"
+
+    @pytest.mark.parametrize("options", [{}, {"flatten_vars": True}, {"lazy": True}])
+    def test_inherited_hostname(self, tmp_path, options):
+        (tmp_path / "group_vars").mkdir()
+        (tmp_path / "hosts").write_text(
+            "all:\n"
+            "  children:\n"
+            "    lab:\n"
+            "      vars: {ansible_host: 192.0.2.1, ansible_port: 2022}\n"
+            "      hosts: {h1: {}, h2: {ansible_host: 192.0.2.2}, 'r[1:2]': {}}\n"
+            "    other:\n"
+            "      hosts: {h3: {}}\n"
+        )
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "hosts"), **options)
+        nornir_inv = inv.load()
+        # hosts inherit the ansible_host of their groups over their name, like their port
+        for name in ("h1", "r1", "r2"):
+            host = nornir_inv.hosts[name]
+            assert (host.hostname, host.port) == ("192.0.2.1", 2022)
+        assert nornir_inv.hosts["h2"].hostname == "192.0.2.2"
+        assert nornir_inv.hosts["h3"].hostname == "h3"
+        if not options:
+            assert inv.hosts["h1"]["hostname"] is None
+            assert inv.hosts["h3"]["hostname"] == "h3"
+
+        self.write(tmp_path / "group_vars" / "other.yml", "ansible_host: 192.0.2.3\n")
+        diff = inv.reload(inventory=nornir_inv)
+        assert "h3" in diff.changed_hosts
+        assert nornir_inv.hosts["h3"].hostname == "192.0.2.3"
+        self.write(tmp_path / "group_vars" / "other.yml", "{}\n")
+        inv.reload(inventory=nornir_inv)
+        assert nornir_inv.hosts["h3"].hostname == "h3"
+
+    def test_load_shared_connection_options(self, tmp_path):
+        (tmp_path / "hosts").write_text(
+            "all:\n"
+            "  vars:\n"
+            "    connection_options:\n"
+            "      netmiko: {extras: {fast_cli: true}}\n"
+            "  children:\n"
+            "    ios:\n"
+            "      hosts:\n"
+            "        r1: {}\n"
+            "        r2: {}\n"
+            "        r3: {connection_options: {netmiko: {port: 1, extras: {fast_cli: true}}}}\n"
+            "        r4: {connection_options: {netmiko: {port: true, extras: {fast_cli: true}}}}\n"
+        )
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "hosts"), flatten_vars=True)
+        nornir_inv = inv.load()
+        r1, r2, r3, r4 = (nornir_inv.hosts[name] for name in ("r1", "r2", "r3", "r4"))
+        assert r1.connection_options is not r2.connection_options
+        assert r1.connection_options["netmiko"] is r2.connection_options["netmiko"]
+        assert r1.connection_options["netmiko"] is nornir_inv.defaults.connection_options["netmiko"]
+        assert r3.connection_options["netmiko"] is not r1.connection_options["netmiko"]
+        assert r3.connection_options["netmiko"] is not r4.connection_options["netmiko"]
+        assert (r3.connection_options["netmiko"].port, r4.connection_options["netmiko"].port) == (
+            1,
+            True,
+        )
+        assert r1.groups[0] is nornir_inv.groups["ios"]
+
+    def test_inventory_sources(self, tmp_path):
+        inv_dir, other = tmp_path / "inventory", tmp_path / "other"
+        for path in (inv_dir / "sub", inv_dir / "group_vars", inv_dir / "host_vars", other):
+            path.mkdir(parents=True)
+        (inv_dir / "a.yml").write_text(
+            "all:\n  vars: {x: a}\n  children:\n    g:\n      vars: {y: a}\n      hosts:\n"
+            "        h1: {ansible_port: 22}\n        leaf[1:2]:\n"
+        )
+        (inv_dir / "b").write_text("[g]\nh2\nleaf2 z=b\n[g:vars]\ny=b\n[all:vars]\nx=b\n")
+        (inv_dir / "sub" / "c.yml").write_text("all:\n  hosts:\n    h3:\n")
+        (inv_dir / "notes.md").write_text("not an inventory\n")
+        (inv_dir / ".hidden").write_text("[hidden]\nh4\n")
+        (inv_dir / "group_vars" / "g.yml").write_text("gv: 1\n")
+        (inv_dir / "host_vars" / "h3.yml").write_text("hv: 3\n")
+        (other / "hosts").write_text("[o]\nh1 ansible_port=2222\n")
+        (other / "group_vars").mkdir()
+        (other / "group_vars" / "o.yml").write_text("ov: 1\n")
+
+        files = sources.get_inventory_files([str(inv_dir), str(other / "hosts")])
+        assert [(os.path.relpath(f, tmp_path), v) for f, v in files] == [
+            ("inventory/a.yml", None),
+            ("inventory/b", None),
+            ("inventory/sub/c.yml", str(inv_dir)),
+            ("other/hosts", None),
+        ]
+
+        inv = ansible.AnsibleInventory(hostsfile=[str(inv_dir), str(other / "hosts")])
+        # leaf2 is also defined in "b", its range is expanded
+        assert not inv.host_ranges
+        assert sorted(inv.hosts) == ["h1", "h2", "h3", "leaf1", "leaf2"]
+        # later sources win, groups are merged, vars resolve relative to their source
+        assert inv.hosts["h1"]["groups"] == ["g", "o"]
+        assert inv.hosts["h1"]["port"] == 2222
+        assert inv.hosts["h3"]["data"] == {"hv": 3}
+        assert inv.hosts["leaf2"]["data"] == {"z": "b"}
+        assert inv.hosts["leaf2"]["groups"] == ["g"]
+        assert inv.groups["g"]["data"] == {"y": "b", "gv": 1}
+        assert inv.groups["o"]["data"] == {"ov": 1}
+        assert inv.defaults["data"] == {"x": "b"}
+        assert ansible.parse([str(inv_dir), str(other / "hosts")]) == (
+            dict(inv.iter_hosts()),
+            inv.groups,
+            inv.defaults,
+        )
+
+        # only the changed source is parsed again
+        nornir_inv = inv.load()
+        parsers = {source.hostsfile: source.parser for source in inv.inventory_sources}
+        self.write(other / "group_vars" / "o.yml", "ov: 2\n")
+        self.write(inv_dir / "d.yml", "all:\n  hosts:\n    h5:\n")
+        diff = inv.reload(inventory=nornir_inv)
+        assert diff.added_hosts == {"h5"}
+        assert diff.changed_groups == {"o"}
+        # "other/hosts" only had a vars file change, it is re-parsed in place by its parser
+        kept = {s.hostsfile: s.parser for s in inv.inventory_sources if s.hostsfile in parsers}
+        assert kept == parsers
+        assert nornir_inv.groups["o"].data == {"ov": 2}
+        assert "h5" in nornir_inv.hosts
+
+    def test_inventory_sources_cache(self, tmp_path):
+        cache_dir = str(tmp_path / "cache")
+        for name in ("a", "b"):
+            (tmp_path / name).write_text(f"[{name}]\nh{name}\n")
+        hostsfiles = [str(tmp_path / "a"), str(tmp_path / "b")]
+        ansible.AnsibleInventory(hostsfile=hostsfiles, cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 2
+
+        self.write(tmp_path / "b", "[b]\nhb\nhc\n")
+        inv = ansible.AnsibleInventory(hostsfile=hostsfiles, cache_dir=cache_dir)
+        assert [source.parser is None for source in inv.inventory_sources] == [True, False]
+        assert sorted(inv.hosts) == ["ha", "hb", "hc"]
+
+    @staticmethod
+    def write_script(path, output, host_output=None, exit_code=0):
+        """Write a dynamic inventory script printing `output`, counting its runs in `path.runs`"""
+        path.write_text(
+            f"#!{sys.executable}\n"
+            "import json, sys\n"
+            f"with open({str(path) + '.runs'!r}, 'a') as f:\n"
+            "    f.write(' '.join(sys.argv[1:]) + '\\n')\n"
+            f"if sys.argv[1] == '--host':\n"
+            f"    print(json.dumps({host_output!r}.get(sys.argv[2], {{}})))\n"
+            "else:\n"
+            f"    print({output!r})\n"
+            f"sys.exit({exit_code})\n"
+        )
+        path.chmod(0o755)
+
+    def test_inventory_script(self, tmp_path):
+        output = {
+            "_meta": {"hostvars": {"h1": {"ansible_host": "10.0.0.1"}, "h2": {"x": 2}}},
+            "all": {"vars": {"v": "all"}},
+            "web": {"hosts": ["h1", "h2"], "vars": {"w": 1}, "children": ["prod"]},
+            "prod": {"hosts": ["h2"]},
+            "legacy": ["h3"],
+        }
+        script = tmp_path / "inventory.py"
+        self.write_script(script, json.dumps(output))
+        (tmp_path / "group_vars").mkdir()
+        (tmp_path / "group_vars" / "prod.yml").write_text("p: 1\n")
+
+        inv = ansible.AnsibleInventory(hostsfile=str(script))
+        assert isinstance(inv.parser, script_parser.ScriptParser)
+        assert {name: (h["groups"], h["data"], h["hostname"]) for name, h in inv.hosts.items()} == {
+            "h1": (["web"], {}, "10.0.0.1"),
+            "h2": (["prod", "web"], {"x": 2}, "h2"),
+            "h3": (["legacy"], {}, "h3"),
+        }
+        assert (inv.groups["web"]["groups"], inv.groups["web"]["data"]) == ([], {"w": 1})
+        assert (inv.groups["prod"]["groups"], inv.groups["prod"]["data"]) == (["web"], {"p": 1})
+        assert inv.defaults["data"] == {"v": "all"}
+        # _meta.hostvars avoids running the script for every host
+        assert (tmp_path / "inventory.py.runs").read_text() == "--list\n"
+
+        # without _meta.hostvars every host is queried with --host
+        del output["_meta"]
+        self.write_script(script, json.dumps(output), {"h1": {"ansible_host": "10.0.0.1"}})
+        assert ansible.AnsibleInventory(hostsfile=str(script)).hosts["h1"]["hostname"] == "10.0.0.1"
+        runs = (tmp_path / "inventory.py.runs").read_text().splitlines()
+        assert runs[1:] == ["--list", "--host h1", "--host h2", "--host h3"]
+
+    def test_inventory_script_cache(self, tmp_path, monkeypatch):
+        script, cache_dir = tmp_path / "inventory.py", str(tmp_path / "cache")
+        self.write_script(script, json.dumps({"g": {"hosts": ["h1"]}, "_meta": {"hostvars": {}}}))
+        for _ in range(2):
+            inv = ansible.AnsibleInventory(
+                hostsfile=str(script), cache_dir=cache_dir, script_cache_ttl=60
+            )
+            assert list(inv.hosts) == ["h1"]
+        assert (tmp_path / "inventory.py.runs").read_text() == "--list\n"
+
+        now = time.time()
+        monkeypatch.setattr(script_parser.time, "time", lambda: now + 61)
+        ansible.AnsibleInventory(hostsfile=str(script), cache_dir=cache_dir, script_cache_ttl=60)
+        assert (tmp_path / "inventory.py.runs").read_text() == "--list\n--list\n"
+
+    @pytest.mark.parametrize(
+        "output, exit_code, timeout, error",
+        [
+            ("[]", 0, 30, "returned list instead of a JSON object"),
+            ("{", 0, 30, "did not output valid JSON"),
+            ("{}", 3, 30, "exited with status 3"),
+            ("{}", 0, 0.001, "timed out after 0.001s"),
+        ],
+    )
+    def test_inventory_script_errors(self, tmp_path, output, exit_code, timeout, error):
+        self.write_script(tmp_path / "inventory.py", output, exit_code=exit_code)
+        with pytest.raises(NornirNoValidInventoryError, match=error):
+            ansible.AnsibleInventory(
+                hostsfile=str(tmp_path / "inventory.py"), script_timeout=timeout
+            )
+
+    @pytest.mark.parametrize("case", ["ini", "yaml", "yaml4", "yaml5"])
+    def test_compact(self, case):
+        hostsfile = os.path.join(BASE_PATH, case, "source", "hosts")
+        expected = ansible.AnsibleInventory(hostsfile=hostsfile)
+        inv = ansible.AnsibleInventory(hostsfile=hostsfile, compact=True)
+        assert all(isinstance(host, Record) for host in inv.hosts.values())
+        assert all(isinstance(group, Record) for group in inv.groups.values())
+        for kind in ("hosts", "groups"):
+            records = getattr(inv, kind)
+            assert {
+                name: {**rec, "groups": list(rec["groups"])} for name, rec in records.items()
+            } == getattr(expected, kind)
+        assert inv.load().dict() == expected.load().dict()
+        assert inv.parser is None
+
+    def test_compact_sharing(self, tmp_path):
+        (tmp_path / "hosts").write_text(
+            "all:\n"
+            "  children:\n"
+            "    leaf:\n"
+            "      hosts:\n"
+            "        h1: {ntp: {servers: [a, b]}, site: par}\n"
+            "        h2: {ntp: {servers: [a, b]}, site: par}\n"
+        )
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "hosts"), compact=True)
+        h1, h2 = inv.hosts["h1"], inv.hosts["h2"]
+        assert h1["groups"] is h2["groups"]
+        assert h1["data"] is not h2["data"]
+        assert h1["data"]["ntp"] is h2["data"]["ntp"]
+
+        nornir_inv = inv.load()
+        assert inv.parser is None
+        nornir_inv.hosts["h1"].data["site"] = "lon"
+        assert nornir_inv.hosts["h2"].data["site"] == "par"
+
+        self.write(
+            tmp_path / "hosts",
+            (tmp_path / "hosts")
+            .read_text()
+            .replace("[a, b]}, site: par}\n        h2", "[c]}, site: par}\n        h2"),
+        )
+        diff = inv.reload(inventory=nornir_inv)
+        assert diff.changed_hosts == {"h1"}
+        assert nornir_inv.hosts["h1"].data["ntp"] == {"servers": ["c"]}
+        assert isinstance(inv.hosts["h1"], Record)
+
+    def test_compact_record(self):
+        record = Record(groups=("a",), data={"x": 1})
+        assert dict(record) == {"groups": ("a",), "data": {"x": 1}}
+        assert len(record) == 2 and "hostname" not in record
+        record["hostname"] = "h"
+        del record["data"]
+        assert list(record) == ["groups", "hostname"]
+        with pytest.raises(KeyError):
+            record["unknown"] = 1
+        with pytest.raises(KeyError):
+            del record["port"]
+        assert pickle.loads(pickle.dumps(record)) == record
+
+    @pytest.mark.parametrize("export_format", ["simple", "json", "pickle"])
+    @pytest.mark.parametrize("case", ["ini", "yaml", "yaml5"])
+    def test_export(self, tmp_path, case, export_format):
+        hostsfile = os.path.join(BASE_PATH, case, "source", "hosts")
+        inv = ansible.AnsibleInventory(hostsfile=hostsfile)
+        expected = inv.load().dict()
+        path = str(tmp_path / "export")
+        inv.export(path, export_format)
+
+        compiled = CompiledInventory(path, export_format)
+        assert compiled.load().dict() == expected
+        if export_format == "simple":
+            control_inv = YAMLInventory(
+                host_file=os.path.join(path, "hosts.yaml"),
+                group_file=os.path.join(path, "groups.yaml"),
+                defaults_file=os.path.join(path, "defaults.yaml"),
+            )
+            assert control_inv.load().dict() == expected
+
+    def test_export_dict(self, tmp_path):
+        (tmp_path / "hosts").write_text(
+            "all:\n"
+            "  vars: {site: par}\n"
+            "  children:\n"
+            "    leaf:\n"
+            "      hosts:\n"
+            "        leaf[1:3]: {role: leaf}\n"
+            "        spine1: {ntp: {servers: [a]}}\n"
+        )
+        hostsfile = str(tmp_path / "hosts")
+        expected = ansible.AnsibleInventory(hostsfile=hostsfile).dict()
+        assert sorted(expected["hosts"]) == ["leaf1", "leaf2", "leaf3", "spine1"]
+        assert expected["hosts"]["leaf2"]["data"] == {"role": "leaf"}
+        assert expected["defaults"]["data"] == {"site": "par"}
+        for options in ({"lazy": True}, {"compact": True}):
+            assert ansible.AnsibleInventory(hostsfile=hostsfile, **options).dict() == expected
+        flat = ansible.AnsibleInventory(hostsfile=hostsfile, flatten_vars=True).dict()
+        assert flat["hosts"]["leaf2"]["data"] == {"role": "leaf", "site": "par"}
+        # exported data is plain, json serializable and detached from the inventory
+        json.dumps(ansible.AnsibleInventory(hostsfile=hostsfile, compact=True).dict())
+
+    def test_export_json_dates(self, tmp_path):
+        (tmp_path / "hosts").write_text(
+            "all:\n  hosts:\n    h1: {since: 2024-01-02, at: 2024-01-02 03:04:05, tags: !!set {a}}\n"
+        )
+        output = str(tmp_path / "inventory.json")
+        cli.main(["export", str(tmp_path / "hosts"), "-o", output])
+        # YAML dates are exported as ISO 8601 strings, other values JSON lacks as strings
+        assert CompiledInventory(output).load().hosts["h1"].data == {
+            "since": "2024-01-02",
+            "at": "2024-01-02T03:04:05",
+            "tags": "{'a'}",
+        }
+
+    def test_export_cli(self, tmp_path, capsys):
+        hostsfile = os.path.join(BASE_PATH, "yaml", "source", "hosts")
+        output = str(tmp_path / "inventory.pickle")
+        cli.main(["export", hostsfile, "-o", output, "--limit", "webservers"])
+        assert sorted(CompiledInventory(output).load().hosts) == [
+            "bar.example.com",
+            "foo.example.com",
+        ]
+
+        with pytest.raises(SystemExit):
+            cli.main(["export", str(tmp_path / "missing"), "-o", output])
+        assert "nornir-ansible:" in capsys.readouterr().err
+
+        with open(output, "wb") as f:
+            pickle.dump({"version": 0}, f)
+        with pytest.raises(NornirNoValidInventoryError, match="unsupported version"):
+            CompiledInventory(output).load()
+        with pytest.raises(ValueError, match="unknown export format"):
+            CompiledInventory(output, "xml")
+
+    def test_progress_callback(self, tmp_path):
+        (tmp_path / "a.yml").write_text("all:\n  hosts:\n    h1: {}\n")
+        (tmp_path / "b.yml").write_text(
+            "all:\n  children:\n    g:\n      hosts:\n        h[1:3]:\n"
+        )
+        progress = []
+        inv = ansible.AnsibleInventory(
+            hostsfile=str(tmp_path),
+            progress_callback=lambda *args: progress.append(args),
+        )
+        inv.load()
+        assert [args for args in progress if args[0] == "sources"] == [
+            ("sources", 1, 2),
+            ("sources", 2, 2),
+        ]
+        assert ("groups", 2, 2) in progress
+        assert progress[-1] == ("hosts", 3, 3)
+
+    def test_acreate(self):
+        hostsfile = os.path.join(BASE_PATH, "yaml5", "source", "hosts")
+        expected = ansible.AnsibleInventory(hostsfile=hostsfile).load().dict()
+        progress = []
+
+        async def main():
+            loop_thread = threading.get_ident()
+
+            def callback(phase, done, total):
+                assert threading.get_ident() == loop_thread
+                progress.append((phase, done, total))
+
+            inv = await ansible.AnsibleInventory.acreate(hostsfile, progress_callback=callback)
+            assert inv.options["vars_executor"] == "thread"
+            return await inv.aload()
+
+        assert asyncio.run(main()).dict() == expected
+        phases = {phase: (done, total) for phase, done, total in progress}
+        assert set(phases) == {"sources", "vars_files", "groups", "hosts"}
+        assert all(done == total for done, total in phases.values())
+
+    def test_render_templates(self, tmp_path):
+        pytest.importorskip("jinja2")
+        (tmp_path / "hosts").write_text(
+            "all:\n"
+            "  vars:\n"
+            "    domain: example.com\n"
+            "    mgmt: '{{ ansible_host }}'\n"
+            "    ansible_port: '{{ base_port + 1 }}'\n"
+            "    base_port: 21\n"
+            "  children:\n"
+            "    site1:\n"
+            "      vars:\n"
+            "        domain: site1.example.com\n"
+            "      hosts:\n"
+            "        r1:\n"
+            "          ansible_host: '{{ inventory_hostname }}.{{ domain }}'\n"
+            "          role: '{{ group_names | join(\",\") }}'\n"
+            "          ansible_user: '{{ \"admin\" }}'\n"
+        )
+        inv = ansible.AnsibleInventory(
+            hostsfile=str(tmp_path / "hosts"), flatten_vars=True, render_templates=True
+        )
+        inventory = inv.load()
+        r1 = inventory.hosts["r1"]
+        assert isinstance(r1, ansible.LazyHost)
+        assert r1.hostname == "r1.site1.example.com"
+        assert r1.port == 22
+        assert r1.username == "admin"
+        assert r1["mgmt"] == "r1.site1.example.com"
+        assert r1["role"] == "site1"
+        assert set(inv.renderer.templates) == {
+            "{{ inventory_hostname }}.{{ domain }}",
+            "{{ ansible_host }}",
+            "{{ base_port + 1 }}",
+            '{{ group_names | join(",") }}',
+            '{{ "admin" }}',
+        }
+        assert inv.dict()["hosts"]["r1"]["data"]["mgmt"] == "r1.site1.example.com"
+
+        # inherited group vars are only rendered per host once flattened
+        (tmp_path / "hosts").write_text(
+            "all:\n  vars:\n    x: '{{ inventory_hostname }}'\n  hosts:\n    h1:\n    h2:\n"
+        )
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "hosts"), render_templates=True)
+        hosts = inv.load().hosts
+        assert [hosts["h1"]["x"], hosts["h2"]["x"]] == ["{{ inventory_hostname }}"] * 2
+        inv = ansible.AnsibleInventory(
+            hostsfile=str(tmp_path / "hosts"), render_templates=True, flatten_vars=True
+        )
+        hosts = inv.load().hosts
+        assert [hosts["h1"]["x"], hosts["h2"]["x"]] == ["h1", "h2"]
+        # templates are shared by hosts and only compiled once
+        assert list(inv.renderer.templates) == ["{{ inventory_hostname }}"]
+
+    @pytest.mark.parametrize(
+        "content, error",
+        [
+            ("a: '{{ b }}'\n      b: '{{ c }}'\n      c: '{{ a }}'", "a -> b -> c -> a"),
+            ("a: '{{ a }}'", "a -> a"),
+            ("a: '{{ missing }}'", "unable to render 'a' of host 'h1'"),
+        ],
+    )
+    def test_render_templates_errors(self, tmp_path, content, error):
+        pytest.importorskip("jinja2")
+        (tmp_path / "hosts").write_text(f"all:\n  hosts:\n    h1:\n      {content}\n")
+        inv = ansible.AnsibleInventory(hostsfile=str(tmp_path / "hosts"), render_templates=True)
+        host = inv.load().hosts["h1"]
+        assert host.hostname == "h1"
+        with pytest.raises(NornirNoValidInventoryError, match=error):
+            host["a"]
+        with pytest.raises(NornirNoValidInventoryError, match=error):
+            inv.dict()
+
+    def test_render_templates_lazy(self, tmp_path):
+        pytest.importorskip("jinja2")
+        (tmp_path / "hosts").write_text(
+            "all:\n"
+            "  vars:\n"
+            "    domain: example.com\n"
+            "    loop_var: '{{ item }}'\n"
+            "  children:\n"
+            "    lab:\n"
+            "      vars:\n"
+            "        ansible_host: '{{ inventory_hostname }}.{{ domain }}'\n"
+            "        ansible_port: '{{ 2000 + id }}'\n"
+            "        connection_options: {netconf: {port: '{{ 830 + id }}'}}\n"
+            "        recursive: '{{ recursive }}'\n"
+            "      hosts:\n"
+            "        h1: {id: 1, mgmt: '{{ ansible_host }}'}\n"
+            "        h2: {id: 2, ansible_host: 192.0.2.2}\n"
+        )
+        for flatten_vars in (False, True):
+            inv = ansible.AnsibleInventory(
+                hostsfile=str(tmp_path / "hosts"),
+                render_templates=True,
+                flatten_vars=flatten_vars,
+            )
+            inventory = inv.load()
+            h1, h2 = inventory.hosts["h1"], inventory.hosts["h2"]
+            # templated group connection fields are rendered per host, values one at a time
+            assert (h1.hostname, h1.port) == ("h1.example.com", 2001)
+            assert (h2.hostname, h2.port) == ("192.0.2.2", 2002)
+            assert h1.get_connection_parameters("netconf").port == 831
+            assert h1["mgmt"] == "h1.example.com"
+            assert inventory.groups["lab"].hostname is None
+            if not flatten_vars:
+                exported = inv.dict()
+                assert exported["hosts"]["h1"]["hostname"] == "h1.example.com"
+                assert exported["groups"]["lab"]["connection_options"] == {}
+            else:
+                # undefined and recursive vars only fail when read
+                with pytest.raises(NornirNoValidInventoryError, match="'item' is undefined"):
+                    h1["loop_var"]
+                with pytest.raises(NornirNoValidInventoryError, match="recursive"):
+                    h1.data.get("recursive")
+            assert h1.data.pop("id") == 1
+            h1.data["new"] = "{{ kept }}"
+            assert h1["new"] == "{{ kept }}"
+
+        # hosts rendering the vars of a changed group are rendered again
+        content = (tmp_path / "hosts").read_text()
+        self.write(tmp_path / "hosts", content.replace("{{ domain }}", "lab.{{ domain }}"))
+        assert inv.reload(inventory=inventory).changed_hosts == {"h1", "h2"}
+        assert h1.hostname == "h1.lab.example.com"
+
+    def test_render_templates_no_jinja2(self, monkeypatch):
+        monkeypatch.setattr(templating, "HAS_JINJA2", False)
+        with pytest.raises(ImportError, match="requires jinja2"):
+            ansible.AnsibleInventory(
+                hostsfile=os.path.join(BASE_PATH, "yaml5", "source", "hosts"),
+                render_templates=True,
+            )
+
+    def test_registry(self, tmp_path):
+        self.write(tmp_path / "a.yml", "all:\n  hosts:\n    h1:\n      x: 1\n      nested: [1]\n")
+        self.write(tmp_path / "b.yml", "all:\n  hosts:\n    h2:\n      x: 2\n")
+        registry = InventoryRegistry()
+
+        inv = registry.get(str(tmp_path / "a.yml"))
+        assert registry.get(str(tmp_path / "subdir" / ".." / "a.yml")) is inv
+        assert registry.get(str(tmp_path / "a.yml"), flatten_vars=True) is not inv
+        assert len(registry) == 2
+
+        # every nornir inventory gets its own elements and top level vars
+        threads_inventories = []
+        threads = [
+            threading.Thread(
+                target=lambda: threads_inventories.append(registry.load(str(tmp_path / "a.yml")))
+            )
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        first, second = threads_inventories[:2]
+        assert registry.get(str(tmp_path / "a.yml")) is inv
+        assert first.hosts["h1"] is not second.hosts["h1"]
+        first.hosts["h1"].data["x"] = 3
+        assert second.hosts["h1"]["x"] == 1
+        assert inv.hosts["h1"]["data"]["x"] == 1
+        assert first.hosts["h1"]["nested"] is second.hosts["h1"]["nested"]
+
+        # changed sources are reloaded, nornir inventories loaded before keep their vars
+        self.write(tmp_path / "a.yml", "all:\n  hosts:\n    h1:\n      x: 4\n")
+        assert registry.load(str(tmp_path / "a.yml")).hosts["h1"]["x"] == 4
+        assert registry.get(str(tmp_path / "a.yml")) is inv
+        assert second.hosts["h1"]["x"] == 1
+        # an inventory failing to reload is dropped
+        self.write(tmp_path / "a.yml", "all:\n  hosts: [\n")
+        with pytest.raises(NornirNoValidInventoryError):
+            registry.get(str(tmp_path / "a.yml"))
+        self.write(tmp_path / "a.yml", "all:\n  hosts:\n    h1:\n      x: 5\n")
+        assert registry.get(str(tmp_path / "a.yml")) is not inv
+
+        # least recently used inventories are evicted
+        registry = InventoryRegistry(max_entries=2)
+        a, b = registry.get(str(tmp_path / "a.yml")), registry.get(str(tmp_path / "b.yml"))
+        assert registry.get(str(tmp_path / "a.yml")) is a
+        registry.get(str(tmp_path / "a.yml"), flatten_vars=True)
+        assert registry.get(str(tmp_path / "a.yml")) is a
+        assert registry.get(str(tmp_path / "b.yml")) is not b
+        registry = InventoryRegistry(max_entries=None, max_bytes=1)
+        registry.get(str(tmp_path / "a.yml"))
+        registry.get(str(tmp_path / "b.yml"))
+        assert len(registry) == 1
+        assert registry.size > 1
+
+        assert registry.invalidate(str(tmp_path / "a.yml")) == 0
+        assert registry.invalidate(str(tmp_path / "b.yml")) == 1
+        assert len(registry) == 0
+        with pytest.raises(ValueError, match="unhashable"):
+            registry.get(str(tmp_path / "a.yml"), limit={"h1"})
+
+    def test_registry_size(self, tmp_path):
+        (tmp_path / "group_vars").mkdir()
+        (tmp_path / "host_vars").mkdir()
+        (tmp_path / "hosts").write_text("all:\n  hosts:\n    h1:\n")
+        (tmp_path / "group_vars" / "all.yml").write_text(
+            "".join(f"k{i}: value{i}\n" for i in range(2000))
+        )
+        (tmp_path / "host_vars" / "h1.yml").write_text(
+            "".join(f"h{i}: [{i}]\n" for i in range(2000))
+        )
+        hostsfile = str(tmp_path / "hosts")
+        inv = InventoryRegistry().get(hostsfile)
+        records_size = registry_module.get_size(
+            (inv.hosts, inv.groups, inv.defaults, inv.host_ranges)
+        )
+
+        # the vars files data kept by the parsers counts as well
+        registry = InventoryRegistry(max_entries=None, max_bytes=int(records_size * 2.5))
+        registry.get(hostsfile)
+        assert registry.size > records_size * 1.25
+        registry.get(hostsfile, stats=True)
+        assert len(registry) == 1
+
+        # only the vars files that changed are read again, the size is estimated again
+        registry = InventoryRegistry()
+        inv = registry.get(hostsfile, stats=True)
+        size = registry.size
+        self.write(tmp_path / "host_vars" / "h1.yml", "h0: [0]\n")
+        files_parsed = inv.stats.counters["files_parsed"]
+        assert registry.get(hostsfile, stats=True) is inv
+        assert inv.stats.counters["files_parsed"] == files_parsed + 1
+        assert inv.hosts["h1"]["data"] == {"h0": [0]}
+        assert registry.size < size
+
+    @pytest.mark.parametrize("fail", [True, False])
+    def test_registry_concurrent(self, tmp_path, monkeypatch, fail):
+        self.write(tmp_path / "hosts", "all:\n  hosts:\n    h1:\n")
+        registry = InventoryRegistry(max_entries=1)
+        constructing, constructed = [], []
+
+        def construct(hostsfile, **options):
+            # the inventory of a key is only parsed by one thread at a time
+            assert not constructing
+            constructing.append(hostsfile)
+            time.sleep(0.05)
+            constructing.pop()
+            constructed.append(hostsfile)
+            if fail:
+                raise NornirNoValidInventoryError("AnsibleInventory: boom")
+            return ansible.AnsibleInventory(hostsfile, **options)
+
+        monkeypatch.setattr(registry_module, "AnsibleInventory", construct)
+        start = threading.Barrier(4, timeout=5)
+        results = []
+
+        def get():
+            start.wait()
+            try:
+                results.append(registry.get(str(tmp_path / "hosts")))
+            except NornirNoValidInventoryError as exc:
+                results.append(exc)
+
+        threads = [threading.Thread(target=get) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if fail:
+            # every waiting thread tries again once the parse failed
+            assert len(constructed) == 4
+            assert all(isinstance(result, NornirNoValidInventoryError) for result in results)
+            assert len(registry) == 0
+        else:
+            assert len(constructed) == 1
+            assert len({id(result) for result in results}) == 1
+        # locks are dropped once no thread uses them, whatever the outcome
+        assert registry._key_locks == {}
+
+    def test_shared_inventory(self, monkeypatch):
+        monkeypatch.setattr(registry_module, "INVENTORY_REGISTRY", InventoryRegistry())
+        hostsfile = os.path.join(BASE_PATH, "yaml5", "source", "hosts")
+        expected = ansible.AnsibleInventory(hostsfile=hostsfile).load().dict()
+        first = SharedAnsibleInventory(hostsfile=hostsfile, flatten_vars=False).load()
+        second = SharedAnsibleInventory(hostsfile=hostsfile, flatten_vars=False).load()
+        assert first.dict() == second.dict() == expected
+        assert len(registry_module.INVENTORY_REGISTRY) == 1
+
+    @pytest.mark.parametrize("vars_executor", [None, "process"])
+    @pytest.mark.parametrize("password_option", ["file", "callback", "script"])
+    def test_vault(self, tmp_path, vars_executor, password_option):
+        pytest.importorskip("cryptography")
+        vault.clear_vault_caches()
+        base_path = os.path.join(BASE_PATH, "vault")
+        options = {}
+        if password_option == "file":
+            options["vault_password_file"] = os.path.join(base_path, "vault_password")
+        elif password_option == "callback":
+            options["vault_password_callback"] = lambda: "secret"
+        else:
+            script = tmp_path / "vault_password.sh"
+            script.write_text("#!/bin/sh\necho secret\n")
+            script.chmod(0o755)
+            options["vault_password_file"] = str(script)
+        inv = ansible.AnsibleInventory(
+            hostsfile=os.path.join(base_path, "hosts"), vars_executor=vars_executor, **options
+        )
+        assert inv.options["vars_executor"] == (vars_executor or "thread")
+        inventory = inv.load()
+        assert inventory.hosts["h1"].password == "admin123"
+        assert inventory.hosts["h2"]["labelled"] == "labelled"
+        assert inventory.hosts["h2"]["nested"] == ["plain"]
+        assert inventory.hosts["h2"]["db_password"] == "s3cr3t"
+        assert inventory.defaults.data["list"] == [1, 2]
+
+    def test_vault_cache(self):
+        pytest.importorskip("cryptography")
+        vault.clear_vault_caches()
+        hostsfile = os.path.join(BASE_PATH, "vault", "hosts")
+        options = {"vault_password_callback": lambda: "secret", "vars_executor": "thread"}
+        ansible.AnsibleInventory(hostsfile=hostsfile, **options)
+        # three vault texts, each with its own salt
+        assert vault.derive_keys.cache_info().misses == 3
+        ansible.AnsibleInventory(hostsfile=hostsfile, **options)
+        assert vault.derive_keys.cache_info().hits == 3
+
+        ansible.AnsibleInventory(hostsfile=hostsfile, vault_cache=True, **options)
+        assert len(vault._DECRYPTED) == 3
+        vault.derive_keys.cache_clear()
+        ansible.AnsibleInventory(hostsfile=hostsfile, vault_cache=True, **options)
+        assert vault.derive_keys.cache_info().misses == 0
+        vault.clear_vault_caches()
+        assert not vault._DECRYPTED
+
+    def test_vault_cache_size(self, monkeypatch):
+        pytest.importorskip("cryptography")
+        vault.clear_vault_caches()
+        monkeypatch.setattr(vault, "VAULT_PLAINTEXT_CACHE_SIZE", 2)
+        hostsfile = os.path.join(BASE_PATH, "vault", "hosts")
+        options = {"vault_password_callback": lambda: "secret", "vault_cache": True}
+        ansible.AnsibleInventory(hostsfile=hostsfile, **options)
+        assert len(vault._DECRYPTED) == 2
+        # the least recently used plaintext is decrypted again, and another one dropped
+        vault.derive_keys.cache_clear()
+        ansible.AnsibleInventory(hostsfile=hostsfile, **options)
+        assert len(vault._DECRYPTED) == 2
+        assert vault.derive_keys.cache_info().misses >= 1
+        vault.clear_vault_caches()
+
+    @pytest.mark.parametrize(
+        "options, error",
+        [
+            ({}, "holds vault encrypted data, set vault_password_file"),
+            ({"vault_password_callback": lambda: b"wrong"}, "password does not match"),
+            ({"vault_password_file": "/nonexistent"}, "unable to read vault password file"),
+        ],
+    )
+    def test_vault_errors(self, options, error):
+        pytest.importorskip("cryptography")
+        with pytest.raises(NornirNoValidInventoryError, match=error):
+            ansible.AnsibleInventory(hostsfile=os.path.join(BASE_PATH, "vault", "hosts"), **options)
+
+    @pytest.mark.parametrize("vars_executor", [None, "process"])
+    @pytest.mark.parametrize("vault_source", ["hosts", "group_vars/all.yml", "host_vars/h2.yml"])
+    def test_vault_not_cached(self, tmp_path, vars_executor, vault_source):
+        pytest.importorskip("cryptography")
+        base_path = tmp_path / "vault"
+        shutil.copytree(os.path.join(BASE_PATH, "vault"), base_path)
+        plain = {
+            "hosts": "---\nall:\n  hosts:\n    h1:\n    h2:\n",
+            "group_vars/all.yml": "---\nlist: [1, 2]\n",
+            "host_vars/h2.yml": "---\nnested: [plain]\n",
+        }
+        for path, content in plain.items():
+            if path != vault_source:
+                (base_path / path).write_text(content)
+        cache_dir = tmp_path / "cache"
+        options = {
+            "hostsfile": str(base_path / "hosts"),
+            "cache_dir": str(cache_dir),
+            "vars_executor": vars_executor,
+        }
+        password = os.path.join(BASE_PATH, "vault", "vault_password")
+        inv = ansible.AnsibleInventory(vault_password_file=password, **options)
+        self.write(base_path / "host_vars" / "h1.yml", "---\nsite: paris\n")
+        assert inv.reload().changed_hosts == {"h1"}
+        assert not cache_dir.exists() or not list(cache_dir.iterdir())
+        with pytest.raises(NornirNoValidInventoryError, match="holds vault encrypted data"):
+            ansible.AnsibleInventory(**options)
+
+        # the inventory is cached again once it holds no vault data
+        (base_path / vault_source).write_text(plain[vault_source])
+        ansible.AnsibleInventory(**options)
+        assert len(list(cache_dir.iterdir())) == 1
+
+    def test_vault_invalid(self, monkeypatch):
+        monkeypatch.setattr(vault, "HAS_CRYPTOGRAPHY", False)
+        with pytest.raises(ImportError, match=r"requires cryptography.*nornir_ansible\[vault\]"):
+            vault.Vault(password_callback=lambda: "secret")
+        with pytest.raises(ImportError, match="requires cryptography"):
+            ansible.AnsibleInventory(
+                hostsfile=os.path.join(BASE_PATH, "vault", "hosts"),
+                vault_password_callback=lambda: "secret",
+            )
+        with pytest.raises(ValueError, match="either a vault password file or callback"):
+            vault.Vault("password", lambda: "secret")
+        with pytest.raises(vault.VaultError, match="unsupported vault header"):
+            vault.parse_vaulttext("$ANSIBLE_VAULT;2.0;AES256\n00")
+        with pytest.raises(vault.VaultError, match="malformed vault text"):
+            vault.parse_vaulttext("$ANSIBLE_VAULT;1.1;AES256\nzz")
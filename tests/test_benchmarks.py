@@ -0,0 +1,54 @@
+import json
+
+import pytest
+
+from benchmarks import generate, run
+from nornir_ansible.plugins.inventory import ansible
+
+
+@pytest.mark.parametrize("inventory_format", ["yaml", "ini"])
+@pytest.mark.parametrize("vars_layout", ["file", "dir"])
+def test_generate_inventory(tmp_path, inventory_format, vars_layout):
+    hostsfile = generate.generate_inventory(
+        str(tmp_path),
+        hosts=50,
+        depth=2,
+        fanout=2,
+        shared_groups=2,
+        vars_layout=vars_layout,
+        inventory_format=inventory_format,
+    )
+    hosts, groups, _ = ansible.parse(hostsfile)
+    assert len(hosts) == 50
+    assert sorted(groups) == ["g0", "g0_0", "g0_1", "g1", "g1_0", "g1_1", "platform0", "platform1"]
+    assert hosts["host000001"]["groups"] == ["g0_1", "platform1"]
+    assert groups["platform0"]["groups"] == ["g0_0", "g0_1", "g1_0", "g1_1"]
+
+
+def test_run_scenario(tmp_path):
+    hostsfile = generate.generate_inventory(str(tmp_path), hosts=20)
+    result = run.run_scenario(hostsfile, {}, repeat=1)
+    assert result["hosts"] == 20
+    assert set(result["phases"]) == {"hosts_file", "parse", "init", "load"}
+    assert {"parse", "load"} <= set(result["stats"]["phases"])
+    assert result["stats"]["counters"]["files_parsed"] >= 1
+    assert " parse=" in run._format_scenario("small", result).split("stats (wall/cpu):")[1]
+
+    results = {"scenarios": {"small": result}}
+    assert len(run.compare(results, json.loads(json.dumps(results)))) == 8
+
+
+def test_compact_scenario(tmp_path):
+    assert run.SCENARIOS["medium-yaml-file-compact"] == run.SCENARIOS["medium-yaml-file"]
+    hostsfile = generate.generate_inventory(str(tmp_path), hosts=100, depth=2)
+    results = {
+        "scenarios": {
+            "small": run.run_scenario(hostsfile, {}, repeat=1),
+            "small-compact": run.run_scenario(hostsfile, {"compact": True}, repeat=1),
+        }
+    }
+    changes = run.compare_compact(results)
+    assert set(changes) == {"small-compact"}
+    assert set(changes["small-compact"]) == set(run.COMPACT_METRICS)
+    # the compact plugin releases its parsers once loaded
+    assert changes["small-compact"]["alloc_plugin_retained_bytes"] < 0